@@ -0,0 +1,121 @@
+import math
+import os
+import threading
+import time
+from flask import g, jsonify, request
+import metrics
+
+# Per-client token bucket: RATE_LIMIT_RPS requests per second with bursts of RATE_LIMIT_BURST (0 disables)
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "0"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "20"))
+# Use the first X-Forwarded-For address as the client id (only behind a trusted proxy)
+RATE_LIMIT_TRUST_FORWARDED = os.getenv("RATE_LIMIT_TRUST_FORWARDED", "false").lower() == "true"
+MAX_TRACKED_CLIENTS = 100000
+
+# Maximum concurrent requests per route (0 disables), tighter on the expensive ones.
+# CONCURRENCY_LIMITS overrides them per route key, e.g. "graphql.graphql_view=2,dishes.get_dishes:unfiltered=4"
+CONCURRENCY_LIMIT_DEFAULT = int(os.getenv("CONCURRENCY_LIMIT_DEFAULT", "32"))
+CONCURRENCY_LIMITS = {
+    "graphql.graphql_view": 4,
+    "dishes.get_dishes:unfiltered": 8,
+    "dining_halls.get_all_stations:unfiltered": 8,
+    "dining_halls.get_all_menus": 8,
+}
+for entry in filter(None, os.getenv("CONCURRENCY_LIMITS", "").split(",")):
+    route, _, limit = entry.partition("=")
+    CONCURRENCY_LIMITS[route.strip()] = int(limit)
+
+# List endpoints that are much more expensive without any filter
+FILTERED_LIST_ARGS = {
+    "dishes.get_dishes": ("name", "description", "dining_hall_id", "station_id", "ids"),
+    "dining_halls.get_all_stations": ("name", "ids"),
+}
+
+# Endpoints that are never concurrency limited (long-lived streams, docs and metrics)
+UNLIMITED_ENDPOINTS = {"changes.stream_changes", "metrics.get_metrics", "profiles.list_profiles", "profiles.get_profile", "snapshots.get_all_menus_snapshot", "snapshots.get_menu_snapshot", "static", "flasgger.apidocs", "flasgger.apispec_1", "flasgger.static"}
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+metrics.describe("admission_rejected_total", "Requests rejected by admission control")
+metrics.describe("admission_in_flight", "Requests currently being handled per route")
+metrics.describe("admission_concurrency_limit", "Configured concurrency limit per route")
+metrics.set_gauge("admission_rate_limit_rps", RATE_LIMIT_RPS)
+metrics.set_gauge("admission_rate_limit_burst", RATE_LIMIT_BURST)
+for route, limit in CONCURRENCY_LIMITS.items():
+    metrics.set_gauge("admission_concurrency_limit", limit, {"route": route})
+metrics.set_gauge("admission_concurrency_limit", CONCURRENCY_LIMIT_DEFAULT, {"route": "default"})
+metrics.gauge_callback("admission_in_flight", lambda: [({"route": route}, count) for route, count in list(_in_flight.items())])
+
+def _client_id():
+    if RATE_LIMIT_TRUST_FORWARDED and request.access_route:
+        return request.access_route[0]
+    return request.remote_addr
+
+# Take a token from the client's bucket, returns the seconds to wait if it is empty
+def _take_token(client):
+    now = time.monotonic()
+    with _buckets_lock:
+        tokens, last = _buckets.get(client, (RATE_LIMIT_BURST, now))
+        tokens = min(RATE_LIMIT_BURST, tokens + (now - last) * RATE_LIMIT_RPS)
+        if tokens < 1:
+            _buckets[client] = (tokens, now)
+            return (1 - tokens) / RATE_LIMIT_RPS
+
+        if len(_buckets) >= MAX_TRACKED_CLIENTS and client not in _buckets:
+            # Forget the clients whose bucket has refilled anyway
+            for key, (old_tokens, old_last) in list(_buckets.items()):
+                if old_tokens + (now - old_last) * RATE_LIMIT_RPS >= RATE_LIMIT_BURST:
+                    del _buckets[key]
+        _buckets[client] = (tokens - 1, now)
+        return 0
+
+def _route_key():
+    endpoint = request.endpoint
+    args = FILTERED_LIST_ARGS.get(endpoint)
+    if args is not None and not any(request.args.get(arg) for arg in args):
+        return f"{endpoint}:unfiltered"
+    return endpoint
+
+def _reject(status, error, retry_after, reason):
+    metrics.inc("admission_rejected_total", {"reason": reason, "route": request.endpoint or "unknown"})
+    response = jsonify({"error": error})
+    response.status_code = status
+    response.headers["Retry-After"] = str(max(1, math.ceil(retry_after)))
+    return response
+
+# Middleware rejecting requests over the rate or concurrency limits instead of queueing them
+def before_request_admission():
+    if RATE_LIMIT_RPS > 0:
+        wait = _take_token(_client_id())
+        if wait:
+            return _reject(429, "Too many requests", wait, "rate_limit")
+
+    if request.endpoint is None or request.endpoint in UNLIMITED_ENDPOINTS:
+        return None
+
+    route = _route_key()
+    limit = CONCURRENCY_LIMITS.get(route, CONCURRENCY_LIMIT_DEFAULT)
+    if limit <= 0:
+        return None
+
+    with _in_flight_lock:
+        in_flight = _in_flight.get(route, 0)
+        if in_flight < limit:
+            _in_flight[route] = in_flight + 1
+    if in_flight >= limit:
+        return _reject(503, "Service overloaded, try again later", 1, "concurrency_limit")
+    g.admission_route = route
+
+# Release the concurrency slot once the request is done (also on errors)
+def teardown_request_admission(exception=None):
+    route = g.pop("admission_route", None)
+    if route is not None:
+        with _in_flight_lock:
+            _in_flight[route] -= 1
+
+def config_admission(app):
+    app.before_request(before_request_admission)
+    app.teardown_request(teardown_request_admission)
@@ -3,19 +3,43 @@ from flask_cors import CORS
 from flasgger import Swagger
 from flask_marshmallow import Marshmallow
 from config import config_db
+from json_provider import config_json
+from counts import reconcile_dish_counts, start_reconciler
+from jobs import config_jobs
+from catalog import config_catalog
+from autocomplete import config_autocomplete
 from middleware import before_request_logging, after_request_logging
+from admission import config_admission
+from profiling import config_profiling
+from snapshots import config_snapshots, publish_snapshots
+from tracing import config_tracing
 from routes.dish_routes import dishes_bp
 from routes.dining_hall_routes import dining_halls_bp
 from routes.redirect_routes import redirect_bp
 from routes.graphql_routes import graphql_bp
+from routes.change_routes import changes_bp
+from routes.metrics_routes import metrics_bp
+from routes.job_routes import jobs_bp
+from routes.batch_routes import batch_bp
+from routes.profile_routes import profiles_bp
+from routes.snapshot_routes import snapshots_bp
 
 # Create Flask app
 app = Flask(__name__)
 CORS(app)
 
+# Use the fast JSON provider for all responses
+config_json(app)
+
 # Connect to MySQL database
 config_db(app)
 
+# Load the in-memory catalog snapshot (if enabled)
+config_catalog(app)
+
+# Build the in-memory dish name index used by autocomplete (on startup if enabled)
+config_autocomplete(app)
+
 # Create Marshmallow instance for HATEOAS
 ma = Marshmallow(app)
 
@@ -33,15 +57,47 @@ template = {
 }
 swagger = Swagger(app, template=template)
 
+# Trace requests, SQL statements and serialization (if TRACING_EXPORTER is set)
+config_tracing(app)
+
+# Profile requests on demand (if PROFILE_DIR is set), first so the other hooks are included
+config_profiling(app)
+
 # Configure middleware logging
 app.before_request(before_request_logging)
 app.after_request(after_request_logging)
 
+# Configure admission control (rate and concurrency limits)
+config_admission(app)
+
 # Register blueprints
 app.register_blueprint(dishes_bp, url_prefix="/api/v1")
 app.register_blueprint(dining_halls_bp, url_prefix="/api/v1")
+app.register_blueprint(changes_bp, url_prefix="/api/v1")
+app.register_blueprint(jobs_bp, url_prefix="/api/v1")
+app.register_blueprint(batch_bp, url_prefix="/api/v1")
 app.register_blueprint(redirect_bp)
 app.register_blueprint(graphql_bp)
+app.register_blueprint(metrics_bp)
+app.register_blueprint(profiles_bp)
+app.register_blueprint(snapshots_bp)
+
+# Reconcile the maintained dish counts (flask --app app reconcile-dish-counts, or periodically)
+@app.cli.command("reconcile-dish-counts")
+def reconcile_dish_counts_command():
+    print(f"Fixed {reconcile_dish_counts()} dish counts")
+
+start_reconciler(app)
+
+# Register the background job handlers and fail the jobs left queued or running by a stopped worker
+config_jobs(app)
+
+# Pre-render the menus to SNAPSHOT_DIR (flask --app app publish-menu-snapshots, or after writes and periodically)
+@app.cli.command("publish-menu-snapshots")
+def publish_menu_snapshots_command():
+    print(f"Published the menu snapshots to {publish_snapshots(app)}")
+
+config_snapshots(app)
 
 if __name__ == '__main__':
    app.run(host='0.0.0.0', port=5001)
\ No newline at end of file
@@ -0,0 +1,160 @@
+import os
+import unicodedata
+from bisect import bisect_left, insort
+from models import Dish
+from changefeed import FeedFollower
+
+# Seconds between refreshes of the autocomplete index from the change feed
+AUTOCOMPLETE_REFRESH_INTERVAL = float(os.getenv("AUTOCOMPLETE_REFRESH_INTERVAL", "5"))
+# Build the autocomplete index on startup (AUTOCOMPLETE_WARM=true) instead of in the first /autocomplete request
+AUTOCOMPLETE_WARM = os.getenv("AUTOCOMPLETE_WARM", "false").lower() == "true"
+
+# Separates the normalized name from the dish id in index keys, sorts before any other character
+KEY_SEPARATOR = "\0"
+
+# Case and accent insensitive form of a name
+def normalize(name):
+    decomposed = unicodedata.normalize("NFKD", name or "")
+    return " ".join("".join(c for c in decomposed if not unicodedata.combining(c)).casefold().split())
+
+# Typos tolerated for a query of this length
+def max_distance(query):
+    if len(query) <= 2:
+        return 0
+    if len(query) <= 5:
+        return 1
+    return 2
+
+# Sorted array of "<normalized name>\0<dish id>" keys searched as an implicit trie: the keys
+# sharing a prefix form a contiguous range found by bisection, so no trie nodes are stored
+class NameIndex:
+    def __init__(self, keys=None):
+        self.keys = sorted(keys) if keys else []
+
+    def add(self, key):
+        insort(self.keys, key)
+
+    def remove(self, key):
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            del self.keys[i]
+
+    # Up to limit (distance, key) pairs whose name starts with the query, allowing up to
+    # max_distance edits anywhere in the query, the first letter included (closest first)
+    def search(self, query, max_distance, limit):
+        lo = bisect_left(self.keys, query)
+        hi = bisect_left(self.keys, query + "\U0010ffff", lo)
+        results = [(0, key) for key in self.keys[lo:min(hi, lo + limit)]]
+        seen = {key for _, key in results}
+
+        # Iterative deepening: only allow more typos while there are not enough suggestions
+        for distance in range(1, max_distance + 1):
+            if len(results) >= limit:
+                break
+            for lo, hi in self._fuzzy_ranges(query, distance, limit - len(results)):
+                # A short prefix can cover a large part of the index, only copy what is needed
+                for key in self.keys[lo:min(hi, lo + limit)]:
+                    if key not in seen:
+                        seen.add(key)
+                        results.append((distance, key))
+                if len(results) >= limit:
+                    break
+        return results[:limit]
+
+    # Walk the implicit trie from its root, keeping one row of the Levenshtein matrix per prefix,
+    # and return the (lo, hi) ranges of prefixes exactly distance edits away from the query until
+    # they hold at least limit keys. Branches more than distance edits away are pruned, so the
+    # walk stays within a few levels below the root whatever the number of names.
+    def _fuzzy_ranges(self, query, distance, limit):
+        keys = self.keys
+        ranges = []
+        found = 0
+        stack = [(0, len(keys), 0, list(range(len(query) + 1)))]
+        while stack:
+            lo, hi, depth, row = stack.pop()
+            prefix = keys[lo][:depth]
+            i = lo
+            while i < hi:
+                c = keys[i][depth]
+                if c == KEY_SEPARATOR:
+                    # Names equal to the prefix, already covered by the parent's distance
+                    i = bisect_left(keys, prefix + "\x01", i, hi)
+                    continue
+
+                j = bisect_left(keys, prefix + chr(ord(c) + 1), i, hi)
+                next_row = [row[0] + 1]
+                for col in range(1, len(query) + 1):
+                    cost = 0 if query[col - 1] == c else 1
+                    next_row.append(min(next_row[col - 1] + 1, row[col] + 1, row[col - 1] + cost))
+
+                if next_row[-1] == distance:
+                    ranges.append((i, j))
+                    found += j - i
+                    if found >= limit:
+                        return ranges
+                # Keep descending while a longer prefix could still be distance edits away
+                if min(next_row) <= distance and next_row[-1] > distance:
+                    stack.append((i, j, depth + 1, next_row))
+                i = j
+        return ranges
+
+# Autocomplete index over dish names, globally and per dining hall, kept up to date from the change feed
+class Autocomplete(FeedFollower):
+    def __init__(self):
+        super().__init__("autocomplete index", AUTOCOMPLETE_REFRESH_INTERVAL)
+        self.index = NameIndex()
+        self.by_hall = {}
+        self.entries = {}
+
+    def _put_dish(self, dish):
+        self._remove_dish(dish.id)
+        key = f"{normalize(dish.name)}{KEY_SEPARATOR}{dish.id}"
+        self.entries[dish.id] = (key, dish.name, dish.dining_hall_id)
+        self.index.add(key)
+        self.by_hall.setdefault(dish.dining_hall_id, NameIndex()).add(key)
+
+    def _remove_dish(self, id):
+        entry = self.entries.pop(id, None)
+        if entry is not None:
+            key, _, dining_hall_id = entry
+            self.index.remove(key)
+            self.by_hall[dining_hall_id].remove(key)
+
+    def _load(self, session):
+        entries, keys_by_hall = {}, {}
+        for dish in session.query(Dish.id, Dish.name, Dish.dining_hall_id).yield_per(self.page_size):
+            key = f"{normalize(dish.name)}{KEY_SEPARATOR}{dish.id}"
+            entries[dish.id] = (key, dish.name, dish.dining_hall_id)
+            keys_by_hall.setdefault(dish.dining_hall_id, []).append(key)
+
+        # Sort once instead of inserting every key
+        self.entries = entries
+        self.index = NameIndex(key for keys in keys_by_hall.values() for key in keys)
+        self.by_hall = {dining_hall_id: NameIndex(keys) for dining_hall_id, keys in keys_by_hall.items()}
+
+    # Dish names starting with the query (with typos), optionally within one dining hall
+    def suggest(self, query, dining_hall_id=None, limit=10):
+        query = normalize(query)
+        with self._lock:
+            index = self.by_hall.get(dining_hall_id) if dining_hall_id is not None else self.index
+            if index is None or not query:
+                return []
+
+            suggestions = []
+            for distance, key in index.search(query, max_distance(query), limit):
+                id = int(key.rpartition(KEY_SEPARATOR)[2])
+                _, name, hall_id = self.entries[id]
+                suggestions.append({"id": id, "name": name, "dining_hall_id": hall_id, "distance": distance})
+            return suggestions
+
+autocomplete = Autocomplete()
+
+# Build the autocomplete index on startup rather than in the first request (if enabled), and keep it
+# refreshed. Otherwise a worker only loads the dish names and starts refreshing once it is asked for suggestions.
+def config_autocomplete(app):
+    if not AUTOCOMPLETE_WARM:
+        return
+
+    with app.app_context():
+        autocomplete.refresh()
+    autocomplete.start(app)
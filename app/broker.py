@@ -0,0 +1,161 @@
+import logging
+import os
+import threading
+from collections import deque, namedtuple
+from flask import current_app
+from models import db
+from schemas import DishSchema, DiningHallSchema, StationSchema
+from changefeed import load_changes, change_to_dict, change_scope, current_change_seq
+from events import subscribe
+
+logger = logging.getLogger(__name__)
+
+# How often each worker polls the change feed (local commits trigger an immediate poll)
+POLL_INTERVAL = float(os.getenv("CHANGE_STREAM_POLL_INTERVAL", "1"))
+# Seconds between heartbeat comments sent to idle subscribers
+HEARTBEAT_INTERVAL = float(os.getenv("CHANGE_STREAM_HEARTBEAT", "15"))
+# Number of recent events kept in memory for Last-Event-ID resume
+HISTORY_SIZE = int(os.getenv("CHANGE_STREAM_HISTORY", "10000"))
+REPLAY_PAGE_SIZE = 500
+
+# A change pushed to subscribers, id is the change sequence number. scopes lists the
+# (dining_hall_id, station_id) pairs the change belongs to: a row moved to another dining hall or
+# station belongs to the old and the new one. Events that aren't broadcast only go to the
+# subscribers scoped to one of their scopes.
+StreamEvent = namedtuple('StreamEvent', ['id', 'scopes', 'broadcast', 'message'])
+
+stream_schemas = {
+    'dish': DishSchema(exclude=("message", "_links")),
+    'station': StationSchema(exclude=("message", "_links")),
+    'dining_hall': DiningHallSchema(exclude=("message", "_links")),
+}
+
+def _event(item, scopes, broadcast=True):
+    data = current_app.json.dumps(change_to_dict(item, stream_schemas))
+    return StreamEvent(item[0], scopes, broadcast, f"id: {item[0]}\nevent: change\ndata: {data}\n\n")
+
+# Events of a page of change feed items (loaded with their moves). A move is merged into the
+# update of the same row, which then also goes to the subscribers of the old scope. A move whose
+# update was superseded since (the row changed again) is sent to the old scope as a delete.
+def _to_events(items):
+    moves, updated = {}, set()
+    for item in items:
+        seq, entity, op, row = item
+        if op == 'move':
+            moves[seq, entity, row.entity_id] = item
+        elif op == 'upsert':
+            updated.add((seq, entity, row.id))
+
+    events = []
+    for item in items:
+        seq, entity, op, row = item
+        if op == 'move':
+            if (seq, entity, row.entity_id) not in updated:
+                events.append(_event((seq, entity, 'delete', row), (change_scope(item),), broadcast=False))
+            continue
+        scopes = (change_scope(item),)
+        move = moves.get((seq, entity, row.id)) if op == 'upsert' else None
+        if move is not None:
+            scopes += (change_scope(move),)
+        events.append(_event(item, scopes))
+    return events
+
+def _matches(event, dining_hall_id, station_id):
+    if dining_hall_id is None and station_id is None:
+        return event.broadcast
+    return any(
+        (dining_hall_id is None or scope_hall == dining_hall_id) and (station_id is None or scope_station == station_id)
+        for scope_hall, scope_station in event.scopes
+    )
+
+# Fans committed changes out to Server-Sent Events subscribers.
+# One poller thread per worker reads the change feed, and every subscriber shares a single
+# buffer of recent events and a single condition variable, so an idle subscriber only costs
+# the thread (or greenlet) blocked in wait().
+class Broker:
+    def __init__(self, history_size):
+        self._events = deque(maxlen=history_size)
+        self._condition = threading.Condition()
+        self._wakeup = threading.Event()
+        self._start_lock = threading.Lock()
+        self.last_id = None
+
+    def start(self, app):
+        with self._start_lock:
+            if self.last_id is not None:
+                return
+            # With a session of its own: the request's session lives as long as its stream
+            with db.session.session_factory() as session:
+                self.last_id = current_change_seq(session)
+            threading.Thread(target=self._poll, args=(app,), name="change-stream-poller", daemon=True).start()
+
+    def wake(self):
+        self._wakeup.set()
+
+    def _poll(self, app):
+        while True:
+            self._wakeup.wait(POLL_INTERVAL)
+            self._wakeup.clear()
+            with app.app_context():
+                try:
+                    has_more = True
+                    while has_more:
+                        items, next_seq, has_more = load_changes(db.session, self.last_id, REPLAY_PAGE_SIZE, moves=True)
+                        self._publish(_to_events(items), next_seq)
+                except Exception:
+                    logger.exception("Polling the change feed failed")
+
+    def _publish(self, events, last_id):
+        with self._condition:
+            self._events.extend(events)
+            self.last_id = last_id
+            if events:
+                self._condition.notify_all()
+
+    def _events_after(self, last_id, timeout):
+        with self._condition:
+            if self.last_id <= last_id:
+                self._condition.wait(timeout)
+            # New events are at the right end, so only walk back over those
+            events = []
+            for event in reversed(self._events):
+                if event.id <= last_id:
+                    break
+                events.append(event)
+            events.reverse()
+            return events
+
+    # Generator of the SSE stream for one subscriber, optionally scoped to a dining hall or station
+    def stream(self, last_id, dining_hall_id=None, station_id=None):
+        yield f"retry: {int(POLL_INTERVAL * 1000) + 1000}\n\n"
+
+        if last_id is None:
+            last_id = self.last_id
+        elif last_id < self.last_id and (not self._events or last_id < self._events[0].id):
+            # Older than what is buffered in memory, catch up from the database
+            has_more = True
+            while has_more:
+                items, last_id, has_more = load_changes(db.session, last_id, REPLAY_PAGE_SIZE, moves=True)
+                chunk = "".join(event.message for event in _to_events(items) if _matches(event, dining_hall_id, station_id))
+                if chunk:
+                    yield chunk
+            # Don't hold on to a database connection for the rest of the stream
+            db.session.close()
+
+        while True:
+            events = self._events_after(last_id, HEARTBEAT_INTERVAL)
+            if not events:
+                yield ": heartbeat\n\n"
+                continue
+
+            last_id = events[-1].id
+            chunk = "".join(event.message for event in events if _matches(event, dining_hall_id, station_id))
+            if chunk:
+                yield chunk
+
+broker = Broker(HISTORY_SIZE)
+
+# Commits made by this worker are pushed without waiting for the next poll
+@subscribe
+def wake_broker(changes):
+    broker.wake()
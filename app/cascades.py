@@ -0,0 +1,79 @@
+import os
+from datetime import datetime
+from sqlalchemy import delete, insert, literal, select
+from models import Dish, DiningHall, Station, Tombstone, db
+from changefeed import next_change_seq
+from events import Change, record
+from counts import adjust_dish_counts
+from jobs import job_handler
+
+# Number of dishes deleted per transaction when purging a dining hall asynchronously
+PURGE_BATCH_SIZE = int(os.getenv("PURGE_BATCH_SIZE", "1000"))
+
+# Record tombstones for the matching rows and delete them, one INSERT ... SELECT and one DELETE.
+# The deleted rows are read back from their tombstones (one SELECT) and recorded as changes, so
+# the subscribers (menu cache, snapshots, change stream...) see them like rows deleted one by one.
+def _delete_rows(entity, model, criteria, seq):
+    station_id = model.id if model is Station else model.station_id
+    db.session.execute(
+        insert(Tombstone).from_select(
+            ["entity", "entity_id", "dining_hall_id", "station_id", "change_seq", "deleted_at"],
+            select(literal(entity), model.id, model.dining_hall_id, station_id, literal(seq), literal(datetime.utcnow())).where(criteria),
+        )
+    )
+    result = db.session.execute(delete(model).where(criteria).execution_options(synchronize_session=False))
+
+    deleted = db.session.execute(
+        select(Tombstone.entity_id, Tombstone.dining_hall_id, Tombstone.station_id)
+        .where(Tombstone.change_seq == seq, Tombstone.entity == entity)
+    )
+    for id, dining_hall_id, station_id in deleted:
+        values = {"id": id, "dining_hall_id": dining_hall_id}
+        if model is Dish:
+            values["station_id"] = station_id
+        record(db.session, Change(entity, 'delete', id, values, {}))
+    return result.rowcount
+
+# Delete a dining hall with one DELETE per table, children first, without loading any child row
+def delete_dining_hall_cascade(dining_hall):
+    seq = next_change_seq(db.session)
+    _delete_rows('dish', Dish, Dish.dining_hall_id == dining_hall.id, seq)
+    _delete_rows('station', Station, Station.dining_hall_id == dining_hall.id, seq)
+    db.session.delete(dining_hall)
+
+# Delete a station and its dishes with one DELETE per table
+def delete_station_cascade(station):
+    seq = next_change_seq(db.session)
+    _delete_rows('dish', Dish, Dish.station_id == station.id, seq)
+    db.session.delete(station)
+
+# Delete a very large dining hall in batches of dishes, each in its own transaction so no
+# single transaction holds locks for long, then the stations and the hall itself.
+# progress(deleted) is called after every batch.
+def purge_dining_hall(id, progress=None):
+    deleted = 0
+    while True:
+        ids = db.session.scalars(select(Dish.id).where(Dish.dining_hall_id == id).limit(PURGE_BATCH_SIZE)).all()
+        if not ids:
+            break
+
+        seq = next_change_seq(db.session)
+        count = _delete_rows('dish', Dish, Dish.id.in_(ids), seq)
+        adjust_dish_counts(id, None, -count)
+        db.session.commit()
+        deleted += count
+        if progress:
+            progress(deleted)
+
+    dining_hall = DiningHall.query.get(id)
+    if dining_hall:
+        delete_dining_hall_cascade(dining_hall)
+        db.session.commit()
+    return deleted
+
+# Background job purging a dining hall
+@job_handler('purge_dining_hall')
+def purge_dining_hall_job(job, dining_hall_id):
+    total = db.session.scalar(select(DiningHall.dish_count).where(DiningHall.id == dining_hall_id))
+    deleted = purge_dining_hall(dining_hall_id, progress=lambda deleted: job.progress(deleted, total))
+    return {"dining_hall_id": dining_hall_id, "deleted_dishes": deleted}
@@ -0,0 +1,223 @@
+import os
+import sys
+from itertools import islice
+from models import Dish, DiningHall, Station
+from changefeed import FeedFollower
+from sharding import SHARDING_ENABLED
+import metrics
+
+# Serve the filterable GET endpoints from an in-memory snapshot of the catalog (CATALOG_SNAPSHOT=true)
+CATALOG_SNAPSHOT_ENABLED = os.getenv("CATALOG_SNAPSHOT", "false").lower() == "true"
+# Seconds between refreshes from the change feed, i.e. the staleness bound for writes made by
+# other workers (writes made by this worker are applied before the next read)
+CATALOG_REFRESH_INTERVAL = float(os.getenv("CATALOG_REFRESH_INTERVAL", "1"))
+
+metrics.describe("catalog_staleness_seconds", "Seconds since the catalog snapshot was last refreshed")
+metrics.describe("catalog_rows", "Rows held by the catalog snapshot")
+metrics.describe("catalog_bytes_per_row", "Approximate memory per row of the catalog snapshot")
+
+# Compact rows of the snapshot, dish_count is derived from the snapshot's own indexes
+class DishRow:
+    __slots__ = ('id', 'name', 'description', 'dining_hall_id', 'station_id')
+
+    def __init__(self, dish):
+        self.id = dish.id
+        self.name = dish.name
+        self.description = dish.description
+        self.dining_hall_id = dish.dining_hall_id
+        self.station_id = dish.station_id
+
+class StationRow:
+    __slots__ = ('id', 'name', 'dining_hall_id', 'catalog')
+
+    def __init__(self, station, catalog):
+        self.id = station.id
+        self.name = station.name
+        self.dining_hall_id = station.dining_hall_id
+        self.catalog = catalog
+
+    @property
+    def dish_count(self):
+        return len(self.catalog.dishes_by_station.get(self.id, ()))
+
+class DiningHallRow:
+    __slots__ = ('id', 'name', 'catalog')
+
+    def __init__(self, dining_hall, catalog):
+        self.id = dining_hall.id
+        self.name = dining_hall.name
+        self.catalog = catalog
+
+    @property
+    def dish_count(self):
+        return len(self.catalog.dishes_by_hall.get(self.id, ()))
+
+# Case-insensitive substring match, like the default MySQL collation does for the escaped LIKE '%...%'
+# of the SQL path (statements.contains_pattern), where % and _ are not wildcards either
+def _contains(value, pattern):
+    return pattern is None or (value is not None and pattern in value.casefold())
+
+def _index_add(index, key, id):
+    index.setdefault(key, {})[id] = None
+
+def _index_remove(index, key, id):
+    ids = index.get(key)
+    if ids is not None:
+        ids.pop(id, None)
+        if not ids:
+            del index[key]
+
+# In-memory read model of dining halls, stations and dishes with secondary indexes by
+# dining_hall_id and station_id, kept up to date from the change feed
+class Catalog(FeedFollower):
+    def __init__(self):
+        super().__init__("catalog snapshot", CATALOG_REFRESH_INTERVAL)
+        self.dishes = {}
+        self.stations = {}
+        self.dining_halls = {}
+        self.dishes_by_hall = {}
+        self.dishes_by_station = {}
+        self.stations_by_hall = {}
+
+    # Updates replace the row in place, so the primary dicts stay in id order
+    def _put_dish(self, dish):
+        old = self.dishes.get(dish.id)
+        if old is not None:
+            _index_remove(self.dishes_by_hall, old.dining_hall_id, old.id)
+            _index_remove(self.dishes_by_station, old.station_id, old.id)
+        row = self.dishes[dish.id] = DishRow(dish)
+        _index_add(self.dishes_by_hall, row.dining_hall_id, row.id)
+        _index_add(self.dishes_by_station, row.station_id, row.id)
+
+    def _remove_dish(self, id):
+        row = self.dishes.pop(id, None)
+        if row is not None:
+            _index_remove(self.dishes_by_hall, row.dining_hall_id, id)
+            _index_remove(self.dishes_by_station, row.station_id, id)
+
+    def _put_station(self, station):
+        old = self.stations.get(station.id)
+        if old is not None:
+            _index_remove(self.stations_by_hall, old.dining_hall_id, old.id)
+        self.stations[station.id] = StationRow(station, self)
+        _index_add(self.stations_by_hall, station.dining_hall_id, station.id)
+
+    def _remove_station(self, id):
+        row = self.stations.pop(id, None)
+        if row is not None:
+            _index_remove(self.stations_by_hall, row.dining_hall_id, id)
+
+    def _put_dining_hall(self, dining_hall):
+        self.dining_halls[dining_hall.id] = DiningHallRow(dining_hall, self)
+
+    def _remove_dining_hall(self, id):
+        self.dining_halls.pop(id, None)
+
+    def _load(self, session):
+        for dining_hall in session.query(DiningHall).order_by(DiningHall.id).yield_per(self.page_size):
+            self._put_dining_hall(dining_hall)
+        for station in session.query(Station).order_by(Station.id).yield_per(self.page_size):
+            self._put_station(station)
+        for dish in session.query(Dish).order_by(Dish.id).yield_per(self.page_size):
+            self._put_dish(dish)
+        if SHARDING_ENABLED:
+            # Shards are read one after the other, restore the id order of the primary dicts
+            self.dining_halls = dict(sorted(self.dining_halls.items()))
+            self.stations = dict(sorted(self.stations.items()))
+            self.dishes = dict(sorted(self.dishes.items()))
+
+    # Queries mirroring the filters of the list endpoints, results are in id order
+
+    def find_dishes(self, name=None, description=None, dining_hall_id=None, station_id=None, limit=None):
+        name = name.casefold() if name else None
+        description = description.casefold() if description else None
+        try:
+            dining_hall_id = int(dining_hall_id) if dining_hall_id else None
+            station_id = int(station_id) if station_id else None
+        except ValueError:
+            return []
+
+        with self._lock:
+            if station_id is not None:
+                ids = sorted(self.dishes_by_station.get(station_id, ()))
+            elif dining_hall_id is not None:
+                ids = sorted(self.dishes_by_hall.get(dining_hall_id, ()))
+            else:
+                ids = self.dishes
+
+            dishes = []
+            for id in ids:
+                dish = self.dishes[id]
+                if dining_hall_id is not None and dish.dining_hall_id != dining_hall_id:
+                    continue
+                if not _contains(dish.name, name) or not _contains(dish.description, description):
+                    continue
+                dishes.append(dish)
+                if limit is not None and len(dishes) >= limit:
+                    break
+            return dishes
+
+    def get_dish(self, id):
+        return self.dishes.get(id)
+
+    def get_station(self, id):
+        return self.stations.get(id)
+
+    def find_stations(self, name=None, dining_hall_id=None):
+        name = name.casefold() if name else None
+        with self._lock:
+            if dining_hall_id is not None:
+                stations = [self.stations[id] for id in sorted(self.stations_by_hall.get(dining_hall_id, ()))]
+            else:
+                stations = sorted(self.stations.values(), key=lambda station: station.id)
+            return [station for station in stations if _contains(station.name, name)]
+
+    def get_dining_hall(self, id):
+        return self.dining_halls.get(id)
+
+    def find_dining_halls(self, name=None):
+        name = name.casefold() if name else None
+        with self._lock:
+            dining_halls = sorted(self.dining_halls.values(), key=lambda dining_hall: dining_hall.id)
+            return [dining_hall for dining_hall in dining_halls if _contains(dining_hall.name, name)]
+
+    # Approximate memory per row: the row object plus the objects its slots reference
+    def bytes_per_row(self, rows, sample_size=1000):
+        with self._lock:
+            sample = list(islice(rows.values(), sample_size))
+        if not sample:
+            return 0
+        total = 0
+        for row in sample:
+            total += sys.getsizeof(row)
+            total += sum(sys.getsizeof(getattr(row, slot)) for slot in row.__slots__ if slot != 'catalog')
+        # Plus the entry in the primary dict
+        return total / len(sample) + sys.getsizeof(rows) / max(len(rows), 1)
+
+catalog = Catalog()
+
+def _catalog_metrics():
+    return [
+        ({"entity": "dish"}, len(catalog.dishes)),
+        ({"entity": "station"}, len(catalog.stations)),
+        ({"entity": "dining_hall"}, len(catalog.dining_halls)),
+    ]
+
+def _catalog_memory_metrics():
+    return [
+        ({"entity": "dish"}, catalog.bytes_per_row(catalog.dishes)),
+        ({"entity": "station"}, catalog.bytes_per_row(catalog.stations)),
+        ({"entity": "dining_hall"}, catalog.bytes_per_row(catalog.dining_halls)),
+    ]
+
+# Load the snapshot and keep it refreshed when CATALOG_SNAPSHOT is enabled
+def config_catalog(app):
+    if not CATALOG_SNAPSHOT_ENABLED:
+        return
+
+    with app.app_context():
+        catalog.refresh()
+    catalog.start(app)
+    metrics.gauge_callback("catalog_staleness_seconds", lambda: [({}, catalog.staleness())])
+    metrics.gauge_callback("catalog_rows", _catalog_metrics)
+    metrics.gauge_callback("catalog_bytes_per_row", _catalog_memory_metrics)
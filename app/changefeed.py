@@ -0,0 +1,242 @@
+import abc
+import logging
+import threading
+import time
+from sqlalchemy import event, inspect, select, update, insert
+from sqlalchemy.orm import Session
+from models import Dish, DiningHall, Station, Tombstone, ChangeSequence, db
+from events import subscribe
+from sharding import global_connection
+
+logger = logging.getLogger(__name__)
+
+# Models tracked by the change feed, in the order changes with the same sequence are listed
+FEED_MODELS = {
+    'dining_hall': DiningHall,
+    'station': Station,
+    'dish': Dish,
+}
+ENTITY_NAMES = {model: entity for entity, model in FEED_MODELS.items()}
+# Tombstone entity suffix of the records of where a row was moved from (see _move_tombstone)
+MOVED = ':moved'
+
+# Allocate the next change sequence number in the current transaction.
+# The row lock taken by the UPDATE is held until commit, so sequence numbers become
+# visible in the order their transactions commit and a reader never skips over one.
+def next_change_seq(session):
+    connection = global_connection(session)
+    table = ChangeSequence.__table__
+    result = connection.execute(update(table).where(table.c.id == 1).values(value=table.c.value + 1))
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(id=1, value=1))
+    seq = connection.execute(select(table.c.value).where(table.c.id == 1)).scalar_one()
+    session.info['change_seq'] = seq
+    return seq
+
+# Last change sequence number allocated in the current transaction, or a new one. For rows
+# changed by Core statements (e.g. the dish counts), which the flush doesn't stamp: sharing the
+# transaction's number costs no extra statement, and the row lock is held until commit all the same.
+def transaction_change_seq(session):
+    seq = session.info.get('change_seq')
+    return seq if seq is not None else next_change_seq(session)
+
+@event.listens_for(Session, 'after_transaction_end')
+def _forget_change_seq(session, transaction):
+    if transaction.parent is None:
+        session.info.pop('change_seq', None)
+
+def _tombstone(entity, obj, seq):
+    if entity == 'dining_hall':
+        return Tombstone(entity=entity, entity_id=obj.id, dining_hall_id=obj.id, change_seq=seq)
+    return Tombstone(
+        entity=entity,
+        entity_id=obj.id,
+        dining_hall_id=obj.dining_hall_id,
+        station_id=obj.id if entity == 'station' else obj.station_id,
+        change_seq=seq,
+    )
+
+def _previous(obj, key):
+    history = inspect(obj).attrs[key].history
+    return history.deleted[0] if history.deleted else getattr(obj, key)
+
+# Record of the dining hall and station a dish or station was moved out of, with the sequence
+# number of the update, or None if it didn't move. The feed lists it as a 'move' item, so change
+# stream subscribers scoped to the old dining hall or station learn that the row left.
+def _move_tombstone(entity, obj, seq):
+    if entity == 'dining_hall':
+        return None
+    dining_hall_id = _previous(obj, 'dining_hall_id')
+    station_id = obj.id if entity == 'station' else _previous(obj, 'station_id')
+    if dining_hall_id == obj.dining_hall_id and (entity == 'station' or station_id == obj.station_id):
+        return None
+    return Tombstone(entity=entity + MOVED, entity_id=obj.id, dining_hall_id=dining_hall_id, station_id=station_id, change_seq=seq)
+
+# Stamp every created/updated catalog row with a new change sequence number and
+# record a tombstone for every deleted (or moved) one
+@event.listens_for(Session, 'before_flush')
+def _stamp_changes(session, flush_context, instances):
+    changed = [obj for obj in session.new if type(obj) in ENTITY_NAMES]
+    updated = [obj for obj in session.dirty if type(obj) in ENTITY_NAMES and session.is_modified(obj)]
+    deleted = [obj for obj in session.deleted if type(obj) in ENTITY_NAMES]
+    if not changed and not updated and not deleted:
+        return
+
+    seq = next_change_seq(session)
+    for obj in changed + updated:
+        obj.change_seq = seq
+    for obj in updated:
+        moved = _move_tombstone(ENTITY_NAMES[type(obj)], obj, seq)
+        if moved is not None:
+            session.add(moved)
+    for obj in deleted:
+        session.add(_tombstone(ENTITY_NAMES[type(obj)], obj, seq))
+
+def _tombstone_item(order, row):
+    if row.entity.endswith(MOVED):
+        return (row.change_seq, order, row.id, row.entity[:-len(MOVED)], 'move', row)
+    return (row.change_seq, order, row.id, row.entity, 'delete', row)
+
+# Load one page of changes after the given sequence number.
+# Returns (items, next_seq, has_more) where items are (seq, entity, op, row) tuples. With moves,
+# the 'move' items (row being the tombstone with the old dining hall and station) are included.
+def load_changes(session, since, limit, moves=False):
+    items = []
+    for order, (entity, model) in enumerate(FEED_MODELS.items()):
+        rows = session.query(model).filter(model.change_seq > since).order_by(model.change_seq, model.id).limit(limit + 1)
+        items.extend((row.change_seq, order, row.id, entity, 'upsert', row) for row in rows)
+
+    tombstones = session.query(Tombstone).filter(Tombstone.change_seq > since).order_by(Tombstone.change_seq, Tombstone.id).limit(limit + 1)
+    items.extend(_tombstone_item(len(FEED_MODELS), row) for row in tombstones)
+
+    items.sort(key=lambda item: item[:3])
+    has_more = len(items) > limit
+    if has_more:
+        # Never split the changes of one sequence number across pages
+        last_seq = items[limit - 1][0]
+        items = [item for item in items if item[0] < last_seq] + _load_seq(session, last_seq)
+
+    next_seq = items[-1][0] if items else since
+    items = [(seq, entity, op, row) for seq, _, _, entity, op, row in items if moves or op != 'move']
+    return items, next_seq, has_more
+
+# Serialize a (seq, entity, op, row) change feed item with the given schema per entity
+def change_to_dict(item, schemas):
+    seq, entity, op, row = item
+    if op == 'delete':
+        return {"entity": entity, "op": op, "id": row.entity_id, "change_seq": seq}
+    return {
+        "entity": entity,
+        "op": op,
+        "id": row.id,
+        "change_seq": seq,
+        "updated_at": row.updated_at,
+        "data": schemas[entity].dump(row),
+    }
+
+# Dining hall and station a change feed item belongs to (used to scope subscriptions), for a
+# 'move' item the ones the row was moved out of
+def change_scope(item):
+    _, entity, op, row = item
+    if op in ('delete', 'move'):
+        return row.dining_hall_id, row.station_id
+    if entity == 'dining_hall':
+        return row.id, None
+    if entity == 'station':
+        return row.dining_hall_id, row.id
+    return row.dining_hall_id, row.station_id
+
+# Latest allocated change sequence number
+def current_change_seq(session):
+    table = ChangeSequence.__table__
+    return global_connection(session).execute(select(table.c.value).where(table.c.id == 1)).scalar() or 0
+
+def _load_seq(session, seq):
+    items = []
+    for order, (entity, model) in enumerate(FEED_MODELS.items()):
+        rows = session.query(model).filter(model.change_seq == seq).order_by(model.id)
+        items.extend((seq, order, row.id, entity, 'upsert', row) for row in rows)
+    tombstones = session.query(Tombstone).filter(Tombstone.change_seq == seq).order_by(Tombstone.id)
+    items.extend(_tombstone_item(len(FEED_MODELS), row) for row in tombstones)
+    return items
+
+
+# Base class for in-memory read models kept up to date from the change feed.
+# Subclasses implement _load(session) for the initial load, and _put_<entity>(row) /
+# _remove_<entity>(id) for the entities they follow.
+class FeedFollower(abc.ABC):
+    page_size = 1000
+
+    def __init__(self, name, refresh_interval):
+        self.name = name
+        self.refresh_interval = refresh_interval
+        self.seq = None
+        self.refreshed_at = None
+        self._dirty = False
+        self._started = False
+        self._lock = threading.RLock()
+        self._wakeup = threading.Event()
+
+    # Seconds since the read model last caught up with the database
+    def staleness(self):
+        return time.monotonic() - self.refreshed_at if self.refreshed_at else float('inf')
+
+    @abc.abstractmethod
+    def _load(self, session):
+        pass
+
+    def _apply_changes(self, session):
+        has_more = True
+        while has_more:
+            items, self.seq, has_more = load_changes(session, self.seq, self.page_size)
+            for _, entity, op, row in items:
+                if op == 'delete':
+                    apply = getattr(self, f"_remove_{entity}", None)
+                    row = row.entity_id
+                else:
+                    apply = getattr(self, f"_put_{entity}", None)
+                if apply is not None:
+                    apply(row)
+
+    # Catch up with the database (a full load the first time)
+    def refresh(self):
+        with self._lock:
+            self._dirty = False
+            if self.seq is None:
+                # Read the sequence first: changes committed during the load are applied again, which is harmless
+                seq = current_change_seq(db.session)
+                self._load(db.session)
+                self.seq = seq
+            else:
+                self._apply_changes(db.session)
+            # Release the connection and the transaction snapshot right away
+            db.session.close()
+            self.refreshed_at = time.monotonic()
+
+    def mark_dirty(self, changes=None):
+        self._dirty = True
+        self._wakeup.set()
+
+    # Refresh before serving a read if never loaded or this worker wrote since the last refresh
+    def ensure_fresh(self):
+        if self.seq is None or self._dirty:
+            self.refresh()
+
+    def _refresh_loop(self, app):
+        while True:
+            self._wakeup.wait(self.refresh_interval)
+            self._wakeup.clear()
+            with app.app_context():
+                try:
+                    self.refresh()
+                except Exception:
+                    logger.exception(f"Refreshing the {self.name} failed")
+
+    # Start refreshing in the background every refresh_interval seconds and after local commits
+    def start(self, app):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        subscribe(self.mark_dirty)
+        threading.Thread(target=self._refresh_loop, args=(app,), name=f"{self.name}-refresher", daemon=True).start()
\ No newline at end of file
@@ -4,10 +4,13 @@ import os
 
 load_dotenv()
 
-db = SQLAlchemy()
+from sharding import session_options, shard_binds, create_tables
+
+db = SQLAlchemy(session_options=session_options())
 
 def config_db(app):
-    app.config['SQLALCHEMY_DATABASE_URI'] = \
+    # DATABASE_URI overrides the DB_* settings (e.g. "sqlite:///dishes.db" for local testing)
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv("DATABASE_URI") or \
     '{engine}://{user}:{password}@{host}:{port}/{database}'.format(
         engine=os.getenv("DB_ENGINE"),
         user=os.getenv("DB_USER"),
@@ -17,7 +20,8 @@ def config_db(app):
         database=os.getenv("DB_NAME"),
     )
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SQLALCHEMY_BINDS'] = shard_binds()
 
     db.init_app(app)
     with app.app_context():
-        db.create_all()
\ No newline at end of file
+        create_tables(db)
@@ -0,0 +1,73 @@
+import logging
+import os
+import threading
+import time
+from sqlalchemy import func, select, update
+from models import Dish, DiningHall, Station, db
+from changefeed import next_change_seq, transaction_change_seq
+from jobs import job_handler
+
+logger = logging.getLogger(__name__)
+
+# Apply a change in the number of dishes to a station and its dining hall (in the current transaction).
+# The rows get the transaction's change sequence number, so the change feed reports the new counts.
+def adjust_dish_counts(dining_hall_id, station_id, delta):
+    if dining_hall_id is None and station_id is None:
+        return
+    # Flush the pending dish write first (the UPDATE would autoflush it anyway), so the counts
+    # share the sequence number its flush allocates
+    db.session.flush()
+    seq = transaction_change_seq(db.session)
+    if dining_hall_id is not None:
+        db.session.execute(
+            update(DiningHall)
+            .where(DiningHall.id == dining_hall_id)
+            .values(dish_count=DiningHall.dish_count + delta, change_seq=seq)
+        )
+    if station_id is not None:
+        db.session.execute(
+            update(Station)
+            .where(Station.id == station_id)
+            .values(dish_count=Station.dish_count + delta, change_seq=seq)
+        )
+
+# Recompute the counts that drifted from the dishes table, returns the number of rows fixed
+def reconcile_dish_counts():
+    station_count = select(func.count(Dish.id)).where(Dish.station_id == Station.id).scalar_subquery()
+    hall_count = select(func.count(Dish.id)).where(Dish.dining_hall_id == DiningHall.id).scalar_subquery()
+
+    seq = next_change_seq(db.session)
+    fixed_stations = db.session.execute(
+        update(Station).where(Station.dish_count != station_count).values(dish_count=station_count, change_seq=seq)
+    ).rowcount
+    fixed_halls = db.session.execute(
+        update(DiningHall).where(DiningHall.dish_count != hall_count).values(dish_count=hall_count, change_seq=seq)
+    ).rowcount
+    db.session.commit()
+
+    if fixed_stations or fixed_halls:
+        logger.warning(f"Reconciled dish counts of {fixed_stations} stations and {fixed_halls} dining halls")
+    return fixed_stations + fixed_halls
+
+# Background job reconciling dish counts
+@job_handler('reconcile_dish_counts')
+def reconcile_dish_counts_job(job):
+    return {"fixed": reconcile_dish_counts()}
+
+# Periodically reconcile dish counts when DISH_COUNT_RECONCILE_INTERVAL (seconds) is set
+def start_reconciler(app):
+    interval = float(os.getenv("DISH_COUNT_RECONCILE_INTERVAL", "0"))
+    if interval <= 0:
+        return
+
+    def run():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    reconcile_dish_counts()
+                except Exception:
+                    logger.exception("Dish count reconciliation failed")
+                    db.session.rollback()
+
+    threading.Thread(target=run, name="dish-count-reconciler", daemon=True).start()
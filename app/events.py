@@ -0,0 +1,82 @@
+import logging
+from collections import namedtuple
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+# A committed change to a catalog row
+#   entity:   "dish", "station" or "dining_hall"
+#   op:       "create", "update" or "delete"
+#   values:   column values after the change (before it, for deletes)
+#   previous: old values of the columns an update changed
+Change = namedtuple('Change', ['entity', 'op', 'id', 'values', 'previous'])
+
+ENTITIES = {
+    'Dish': 'dish',
+    'Station': 'station',
+    'DiningHall': 'dining_hall',
+}
+
+_subscribers = []
+
+# Register a function called with the list of changes after every commit
+def subscribe(fn):
+    _subscribers.append(fn)
+    return fn
+
+# Record a change that did not go through the ORM unit of work (e.g. bulk deletes)
+def record(session, change):
+    session.info.setdefault('catalog_changes', []).append(change)
+
+def _build_change(obj, op):
+    entity = ENTITIES.get(type(obj).__name__)
+    if entity is None:
+        return None
+
+    state = inspect(obj)
+    # Only read loaded attributes so collecting changes never emits SQL
+    values = {attr.key: state.dict[attr.key] for attr in state.mapper.column_attrs if attr.key in state.dict}
+    previous = {}
+    if op == 'update':
+        for attr in state.mapper.column_attrs:
+            history = state.attrs[attr.key].history
+            if history.has_changes() and history.deleted:
+                previous[attr.key] = history.deleted[0]
+        if not previous:
+            return None
+
+    return Change(entity, op, state.identity[0] if state.identity else values.get('id'), values, previous)
+
+@event.listens_for(Session, 'after_flush')
+def _collect_changes(session, flush_context):
+    for objects, op in ((session.new, 'create'), (session.dirty, 'update'), (session.deleted, 'delete')):
+        for obj in objects:
+            change = _build_change(obj, op)
+            if change is not None:
+                record(session, change)
+
+@event.listens_for(Session, 'after_commit')
+def _dispatch_changes(session):
+    changes = session.info.pop('catalog_changes', None)
+    if not changes:
+        return
+
+    for fn in _subscribers:
+        try:
+            fn(changes)
+        except Exception:
+            logger.exception(f"Change subscriber {fn.__name__} failed")
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_changes(session):
+    session.info.pop('catalog_changes', None)
+
+# Dining hall ids affected by a change, including the hall a row was moved out of
+def affected_dining_halls(change):
+    if change.entity == 'dining_hall':
+        return {change.id}
+
+    hall_ids = {change.values.get('dining_hall_id'), change.previous.get('dining_hall_id')}
+    hall_ids.discard(None)
+    return hall_ids
@@ -0,0 +1,55 @@
+from functools import lru_cache
+from flask import request
+from sqlalchemy.orm import load_only
+
+# Fields that can never be requested through ?fields=
+HIDDEN_FIELDS = ("message", "_links")
+
+# Columns the HATEOAS links of each schema are built from
+LINK_COLUMNS = {
+    "DishSchema": ("id",),
+    "DiningHallSchema": ("id",),
+    "StationSchema": ("dining_hall_id",),
+}
+
+class FieldsetError(ValueError):
+    pass
+
+# Parse ?fields=id,name and ?links=none for a list endpoint
+def parse_fieldset(schema_cls):
+    fields = None
+    fields_arg = request.args.get('fields')
+    if fields_arg:
+        available = [name for name in schema_cls._declared_fields if name not in HIDDEN_FIELDS]
+        fields = tuple(dict.fromkeys(name.strip() for name in fields_arg.split(',') if name.strip()))
+        invalid = [name for name in fields if name not in available]
+        if invalid:
+            raise FieldsetError(f"Invalid fields: {', '.join(invalid)}")
+
+    links_arg = request.args.get('links', 'all')
+    if links_arg not in ('all', 'none'):
+        raise FieldsetError("links must be 'all' or 'none'")
+
+    return fields, links_arg == 'all'
+
+# Restrict the SELECT column list (of a Query or select()) to the requested fields (plus the columns the links need),
+# leaving everything else (e.g. the TEXT description) deferred
+def apply_fieldset(query, model, schema_cls, fields, links):
+    if not fields:
+        return query
+
+    columns = list(fields)
+    if links:
+        columns.extend(LINK_COLUMNS[schema_cls.__name__])
+    columns = [getattr(model, name) for name in dict.fromkeys(columns)]
+    return query.options(load_only(*columns))
+
+# Schemas are cached per field selection so they are only built once
+@lru_cache(maxsize=128)
+def get_list_schema(schema_cls, fields, links):
+    if fields:
+        only = fields + ("_links",) if links else fields
+        return schema_cls(many=True, only=only)
+    if not links:
+        return schema_cls(many=True, exclude=("_links",))
+    return schema_cls(many=True)
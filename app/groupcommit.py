@@ -0,0 +1,150 @@
+import logging
+import os
+import queue
+import threading
+import time
+from functools import wraps
+from flask import copy_current_request_context, current_app
+from models import db
+from tracing import current_span, use_span
+from transactions import commits_deferred, deferred_commits
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Commit concurrent create requests together, one transaction (and one fsync) per group
+# instead of one per request (GROUP_COMMIT=true enables it)
+GROUP_COMMIT_ENABLED = os.getenv("GROUP_COMMIT", "false").lower() == "true"
+# Seconds a group stays open for more requests after the first one, and maximum requests per group
+GROUP_COMMIT_WINDOW = float(os.getenv("GROUP_COMMIT_WINDOW", "0.002"))
+GROUP_COMMIT_MAX_SIZE = int(os.getenv("GROUP_COMMIT_MAX_SIZE", "100"))
+# Seconds a request waits for its group to be committed before giving up
+GROUP_COMMIT_TIMEOUT = float(os.getenv("GROUP_COMMIT_TIMEOUT", "30"))
+
+metrics.describe("group_commit_groups_total", "Transactions committed by the group committer")
+metrics.describe("group_commit_requests_total", "Write requests run by the group committer")
+metrics.describe("group_commit_retries_total", "Groups whose commit failed and whose requests were retried one by one")
+
+class GroupCommitTimeout(Exception):
+    pass
+
+# A write request handed to the committer, run with a copy of its request context
+class _Unit:
+    __slots__ = ("run", "response", "error", "done")
+
+    def __init__(self, run):
+        self.run = run
+        self.response = None
+        self.error = None
+        self.done = threading.Event()
+
+# Runs the views of concurrent write requests on a single thread and session, each one in a
+# savepoint so a failing request only rolls back its own writes, and commits them together.
+# A request only gets its response once the transaction holding its writes has committed.
+class GroupCommitter:
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._start_lock = threading.Lock()
+        self._started = False
+
+    def start(self, app):
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+            threading.Thread(target=self._loop, args=(app,), name="group-committer", daemon=True).start()
+
+    def submit(self, unit):
+        self._queue.put(unit)
+
+    def _next_group(self):
+        units = [self._queue.get()]
+        deadline = time.monotonic() + GROUP_COMMIT_WINDOW
+        while len(units) < GROUP_COMMIT_MAX_SIZE:
+            try:
+                # Take whatever queued up while the previous group was committing, then wait out the window
+                units.append(self._queue.get(timeout=max(0, deadline - time.monotonic())))
+            except queue.Empty:
+                break
+        return units
+
+    def _loop(self, app):
+        while True:
+            units = self._next_group()
+            try:
+                with app.app_context():
+                    self._commit(units)
+            except Exception as e:
+                logger.exception("Group commit failed")
+                for unit in units:
+                    unit.error = unit.error or e
+            for unit in units:
+                unit.done.set()
+
+    # Run the units in savepoints of one transaction and commit it. If the commit fails, nothing
+    # of the group was written, so every unit that succeeded is retried in a transaction of its own.
+    def _commit(self, units):
+        with deferred_commits():
+            for unit in units:
+                # Not a context manager: the request may roll its savepoint back itself and go on
+                # querying (see referencedata.commit_validated)
+                savepoint = db.session.begin_nested()
+                try:
+                    unit.response = unit.run()
+                    if savepoint.is_active:
+                        savepoint.commit()
+                except Exception as e:
+                    if savepoint.is_active:
+                        savepoint.rollback()
+                    unit.response, unit.error = None, e
+
+        try:
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            succeeded = [unit for unit in units if unit.error is None]
+            if len(succeeded) <= 1:
+                for unit in succeeded:
+                    unit.response, unit.error = None, e
+                return
+
+            logger.warning(f"Committing a group of {len(succeeded)} requests failed, retrying them one by one")
+            metrics.inc("group_commit_retries_total")
+            for unit in succeeded:
+                self._commit([unit])
+            return
+
+        metrics.inc("group_commit_groups_total")
+        metrics.inc("group_commit_requests_total", value=len(units))
+
+committer = GroupCommitter()
+
+# Decorator running a write view through the group committer when GROUP_COMMIT is enabled.
+# The view must commit with transactions.commit() and must not roll the session back itself.
+def group_commit(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Inside an atomic batch the caller owns the transaction already
+        if not GROUP_COMMIT_ENABLED or commits_deferred():
+            return view(*args, **kwargs)
+
+        app = current_app._get_current_object()
+        committer.start(app)
+        # The statements run by the committer thread are traced as part of this request
+        parent = current_span()
+
+        @copy_current_request_context
+        def run():
+            with use_span(parent):
+                return app.make_response(view(*args, **kwargs))
+
+        unit = _Unit(run)
+        committer.submit(unit)
+        if not unit.done.wait(GROUP_COMMIT_TIMEOUT):
+            # The group may still commit later, so the outcome of the request is unknown
+            raise GroupCommitTimeout(f"Group commit did not finish within {GROUP_COMMIT_TIMEOUT} seconds")
+        if unit.error is not None:
+            raise unit.error
+        return unit.response
+
+    return wrapper
@@ -0,0 +1,57 @@
+import os
+from sqlalchemy import select
+from models import Dish, Station, db
+from counts import adjust_dish_counts
+from jobs import job_handler
+
+# Number of dishes inserted per transaction by a bulk import
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "500"))
+
+IMPORT_FIELDS = ('name', 'description', 'dining_hall_id', 'station_id')
+
+# Validate one imported dish, returns an error message or None
+def _validate(data, station_halls, seen):
+    if not isinstance(data, dict):
+        return "Dish must be an object"
+    if not data.get('name'):
+        return "Name is required"
+    if station_halls.get(data.get('station_id')) != data.get('dining_hall_id'):
+        return "Invalid station_id for this dining hall"
+    if (data['name'], data['station_id']) in seen:
+        return "Dish with the same name already exists for this dining hall and station"
+    return None
+
+# Background job creating many dishes, in batches of IMPORT_BATCH_SIZE per transaction.
+# Invalid dishes are skipped and reported by their index in the result.
+@job_handler('import_dishes')
+def import_dishes(job, dishes):
+    station_halls = dict(db.session.execute(select(Station.id, Station.dining_hall_id)).all())
+    created = 0
+    errors = []
+
+    for start in range(0, len(dishes), IMPORT_BATCH_SIZE):
+        batch = dishes[start:start + IMPORT_BATCH_SIZE]
+
+        # Names that already exist at the stations of this batch
+        names = [data.get('name') for data in batch if isinstance(data, dict)]
+        seen = set(db.session.execute(select(Dish.name, Dish.station_id).where(Dish.name.in_(names))).all())
+
+        deltas = {}
+        for index, data in enumerate(batch, start):
+            error = _validate(data, station_halls, seen)
+            if error:
+                errors.append({"index": index, "error": error})
+                continue
+
+            seen.add((data['name'], data['station_id']))
+            db.session.add(Dish(**{field: data.get(field) for field in IMPORT_FIELDS}))
+            key = (data['dining_hall_id'], data['station_id'])
+            deltas[key] = deltas.get(key, 0) + 1
+
+        for (dining_hall_id, station_id), delta in deltas.items():
+            adjust_dish_counts(dining_hall_id, station_id, delta)
+        db.session.commit()
+        created += sum(deltas.values())
+        job.progress(start + len(batch), len(dishes))
+
+    return {"created": created, "errors": errors}
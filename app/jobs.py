@@ -0,0 +1,165 @@
+import importlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import case, func, select, update
+from models import Job, db
+from sharding import global_connection
+
+logger = logging.getLogger(__name__)
+
+# Number of jobs run at the same time and number of jobs that may wait for a worker
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+# Seconds between the heartbeats a worker writes for its queued and running jobs, and age of the
+# heartbeat after which a queued or running job is considered lost with its worker (stopped or crashed)
+JOB_HEARTBEAT_INTERVAL = float(os.getenv("JOB_HEARTBEAT_INTERVAL", "30"))
+JOB_STALE_AFTER = float(os.getenv("JOB_STALE_AFTER", "120"))
+
+FINISHED_STATUSES = ('succeeded', 'failed', 'cancelled')
+# Modules defining the job handlers (with @job_handler), imported by config_jobs
+JOB_MODULES = ('imports', 'counts', 'cascades')
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_pending = threading.BoundedSemaphore(JOB_WORKERS + JOB_QUEUE_SIZE)
+_handlers = {}
+# Ids of the jobs queued or running in this worker
+_active = set()
+
+class JobQueueFull(Exception):
+    pass
+
+class JobCancelled(Exception):
+    pass
+
+# Register the function running a kind of job, called as fn(job_context, **params)
+def job_handler(kind):
+    def register(fn):
+        _handlers[kind] = fn
+        return fn
+    return register
+
+# Handle given to a running job to report progress and notice cancellation.
+# Job rows are updated on their own connection so progress is visible before the job's work commits.
+class JobContext:
+    def __init__(self, job_id):
+        self.job_id = job_id
+
+    def _update(self, **values):
+        table = Job.__table__
+        with db.engine.begin() as connection:
+            connection.execute(update(table).where(table.c.id == self.job_id).values(**values))
+
+    def cancelled(self):
+        table = Job.__table__
+        with db.engine.connect() as connection:
+            return connection.execute(select(table.c.cancel_requested).where(table.c.id == self.job_id)).scalar()
+
+    # Report progress, raises JobCancelled if the job was cancelled in the meantime
+    def progress(self, done, total=None):
+        values = {"progress": done}
+        if total is not None:
+            values["total"] = total
+        self._update(**values)
+        if self.cancelled():
+            raise JobCancelled()
+
+def _run(app, job_id, kind, params):
+    context = JobContext(job_id)
+    try:
+        with app.app_context():
+            if context.cancelled():
+                context._update(status='cancelled', finished_at=datetime.utcnow())
+                return
+
+            context._update(status='running', started_at=datetime.utcnow())
+            try:
+                result = _handlers[kind](context, **params)
+            except JobCancelled:
+                db.session.rollback()
+                context._update(status='cancelled', finished_at=datetime.utcnow())
+            except Exception as e:
+                logger.exception(f"Job {job_id} ({kind}) failed")
+                db.session.rollback()
+                context._update(status='failed', error=str(e), finished_at=datetime.utcnow())
+            else:
+                context._update(status='succeeded', result=json.dumps(result), finished_at=datetime.utcnow())
+    finally:
+        _active.discard(job_id)
+        _pending.release()
+
+# Create a job and queue it on the worker pool, raises JobQueueFull if too many jobs are waiting
+def submit(app, kind, **params):
+    if not _pending.acquire(blocking=False):
+        raise JobQueueFull()
+
+    try:
+        job = Job(kind=kind, heartbeat_at=datetime.utcnow())
+        db.session.add(job)
+        db.session.commit()
+        _active.add(job.id)
+        _executor.submit(_run, app, job.id, kind, params)
+    except Exception:
+        _pending.release()
+        raise
+    return job
+
+# Ask a job to stop, queued jobs are cancelled right away and running ones at their next progress report.
+# The status is checked in the UPDATE itself, so a job finishing meanwhile keeps its outcome. Returns
+# False if the job was already finished.
+def cancel(job):
+    table = Job.__table__
+    queued = table.c.status == 'queued'
+    result = global_connection(db.session).execute(
+        update(table)
+        .where(table.c.id == job.id, table.c.status.in_(('queued', 'running')))
+        .values(
+            cancel_requested=True,
+            status=case((queued, 'cancelled'), else_=table.c.status),
+            finished_at=case((queued, datetime.utcnow()), else_=table.c.finished_at),
+        )
+    )
+    db.session.commit()
+    return result.rowcount > 0
+
+# Write the heartbeat of this worker's jobs, and mark failed the queued and running jobs whose
+# worker stopped without finishing them (their parameters are not stored, they can't be requeued).
+# Returns the number of jobs marked failed.
+def recover_jobs():
+    now = datetime.utcnow()
+    table = Job.__table__
+    with db.engine.begin() as connection:
+        active = list(_active)
+        if active:
+            connection.execute(update(table).where(table.c.id.in_(active)).values(heartbeat_at=now))
+        failed = connection.execute(
+            update(table)
+            .where(
+                table.c.status.in_(('queued', 'running')),
+                func.coalesce(table.c.heartbeat_at, table.c.created_at) < now - timedelta(seconds=JOB_STALE_AFTER),
+            )
+            .values(status='failed', error="Interrupted, the worker running the job stopped", finished_at=now)
+        ).rowcount
+    if failed:
+        logger.warning(f"Marked {failed} interrupted jobs as failed")
+    return failed
+
+def _monitor(app):
+    while True:
+        with app.app_context():
+            try:
+                recover_jobs()
+            except Exception:
+                logger.exception("Recovering the interrupted jobs failed")
+        time.sleep(JOB_HEARTBEAT_INTERVAL)
+
+# Register the job handlers, and recover the jobs left queued or running by stopped workers on
+# startup and every JOB_HEARTBEAT_INTERVAL
+def config_jobs(app):
+    for module in JOB_MODULES:
+        importlib.import_module(module)
+    threading.Thread(target=_monitor, args=(app,), name="job-monitor", daemon=True).start()
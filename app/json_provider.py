@@ -0,0 +1,48 @@
+import os
+from flask.json.provider import DefaultJSONProvider
+
+# orjson is optional, fall back to the stdlib encoder when it is not installed
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+class FastJSONProvider(DefaultJSONProvider):
+    # Match Flask's defaults: sorted keys, and let Flask's default() format dates the same way
+    # (http_date) instead of orjson's RFC 3339 output
+    if orjson is not None:
+        orjson_options = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+    def dumps_bytes(self, obj):
+        try:
+            return orjson.dumps(obj, default=self.default, option=self.orjson_options)
+        except TypeError:
+            # e.g. integers larger than 64 bits, which the stdlib encoder can handle
+            return super().dumps(obj, separators=(",", ":")).encode("utf-8")
+
+    def dumps(self, obj, **kwargs):
+        # Anything that needs custom formatting (indent, separators, cls...) goes to the stdlib
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Pretty printing in debug mode keeps the stdlib path
+        if (self.compact is None and self._app.debug) or self.compact is False:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b"\n", mimetype=self.mimetype)
+
+# Select the JSON provider used by jsonify and Schema.jsonify (JSON_PROVIDER=orjson|stdlib)
+def config_json(app):
+    provider = os.getenv("JSON_PROVIDER", "orjson")
+    if provider == "orjson" and orjson is not None:
+        app.json = FastJSONProvider(app)
+    else:
+        app.json = DefaultJSONProvider(app)
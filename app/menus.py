@@ -0,0 +1,105 @@
+import os
+import threading
+import time
+from flask import url_for
+from sqlalchemy.orm import selectinload
+from models import DiningHall, Dish, Station
+from events import subscribe, affected_dining_halls
+from sharding import merge_by_id
+from negotiation import JSON_MIMETYPE, encode
+
+# Serialized menus are cached until a write touches the dining hall, or for at most
+# MENU_CACHE_TTL seconds so writes made by other workers are picked up as well
+MENU_CACHE_TTL = float(os.getenv("MENU_CACHE_TTL", "30"))
+
+ALL_HALLS = "all"
+
+_cache = {}
+_generation = 0
+_lock = threading.Lock()
+
+def _serialize_dish(dish, compact):
+    if compact:
+        return {"id": dish.id, "name": dish.name}
+    return {"id": dish.id, "name": dish.name, "description": dish.description}
+
+def _serialize_station(station, compact):
+    dishes = sorted(station.dishes, key=lambda dish: dish.id)
+    return {
+        "id": station.id,
+        "name": station.name,
+        "dishes": [_serialize_dish(dish, compact) for dish in dishes],
+    }
+
+def _load_stations(query, compact):
+    # One query for the stations and one (selectinload) for all of their dishes
+    dishes_loader = selectinload(Station.dishes)
+    if compact:
+        dishes_loader = dishes_loader.load_only(Dish.id, Dish.name, Dish.station_id)
+    return query.options(dishes_loader).order_by(Station.id).all()
+
+# Menu of one dining hall (also rendered to disk by snapshots.py), None if it doesn't exist
+def build_menu(id):
+    dining_hall = DiningHall.query.get(id)
+    if not dining_hall:
+        return None
+
+    stations = _load_stations(Station.query.filter_by(dining_hall_id=id), compact=False)
+    return {
+        "id": dining_hall.id,
+        "name": dining_hall.name,
+        "stations": [_serialize_station(station, compact=False) for station in stations],
+        "_links": {
+            "self": {"href": url_for("dining_halls.get_menu", id=id), "method": "GET"},
+            "get_stations": {"href": url_for("dining_halls.get_stations", id=id), "method": "GET"},
+        },
+    }
+
+# Compact menu of every dining hall
+def build_all_menus():
+    dining_halls = merge_by_id(DiningHall.query.order_by(DiningHall.id), DiningHall)
+    stations_by_hall = {}
+    for station in _load_stations(Station.query, compact=True):
+        stations_by_hall.setdefault(station.dining_hall_id, []).append(_serialize_station(station, compact=True))
+
+    return [
+        {"id": dining_hall.id, "name": dining_hall.name, "stations": stations_by_hall.get(dining_hall.id, [])}
+        for dining_hall in dining_halls
+    ]
+
+# Each menu is cached once per response format: {key: {mimetype: (built_at, body)}}
+def _cached(key, build, mimetype):
+    now = time.monotonic()
+    entry = _cache.get(key, {}).get(mimetype)
+    if entry and now - entry[0] < MENU_CACHE_TTL:
+        return entry[1]
+
+    generation = _generation
+    menu = build()
+    if menu is None:
+        return None
+    body = encode(menu, mimetype)
+
+    # Don't store a menu that a concurrent write has already made stale
+    with _lock:
+        if generation == _generation:
+            _cache.setdefault(key, {})[mimetype] = (now, body)
+    return body
+
+# Serialized menu of one dining hall (JSON or a negotiated binary format), or None if it doesn't exist
+def get_menu(id, mimetype=JSON_MIMETYPE):
+    return _cached(id, lambda: build_menu(id), mimetype)
+
+# Serialized compact menu of every dining hall
+def get_all_menus(mimetype=JSON_MIMETYPE):
+    return _cached(ALL_HALLS, build_all_menus, mimetype)
+
+@subscribe
+def invalidate_menus(changes):
+    global _generation
+    with _lock:
+        _generation += 1
+        for change in changes:
+            for hall_id in affected_dining_halls(change):
+                _cache.pop(hall_id, None)
+        _cache.pop(ALL_HALLS, None)
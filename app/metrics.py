@@ -0,0 +1,50 @@
+import threading
+
+# Minimal in-process metrics registry rendered in the Prometheus text format at /metrics
+_lock = threading.Lock()
+_counters = {}
+_gauges = {}
+_gauge_callbacks = {}
+_help = {}
+
+def _key(name, labels):
+    return name, tuple(sorted((labels or {}).items()))
+
+def describe(name, help_text):
+    _help[name] = help_text
+
+def inc(name, labels=None, value=1):
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def set_gauge(name, value, labels=None):
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+# Register a function returning {labels_tuple: value} that is evaluated when metrics are rendered
+def gauge_callback(name, fn):
+    _gauge_callbacks[name] = fn
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+def render():
+    with _lock:
+        samples = [(name, labels, value, "counter") for (name, labels), value in _counters.items()]
+        samples += [(name, labels, value, "gauge") for (name, labels), value in _gauges.items()]
+    for name, fn in list(_gauge_callbacks.items()):
+        samples += [(name, tuple(sorted(labels.items())), value, "gauge") for labels, value in fn()]
+
+    lines = []
+    described = set()
+    for name, labels, value, kind in sorted(samples, key=lambda sample: (sample[0], sample[1])):
+        if name not in described:
+            described.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+    return "\n".join(lines) + "\n"
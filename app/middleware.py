@@ -1,18 +1,74 @@
+import json
 import logging
+import os
+import queue
+import random
+import threading
+import time
 from datetime import datetime
 from flask import g, request
+from tracing import TRACING_ENABLED, end_request_span, start_request_span
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Traffic capture for load testing (see replay.py): a sample of the requests is appended as
+# JSON lines to CAPTURE_FILE (unset disables it), CAPTURE_SAMPLE_RATE is the sampled fraction
+CAPTURE_FILE = os.getenv("CAPTURE_FILE")
+CAPTURE_SAMPLE_RATE = float(os.getenv("CAPTURE_SAMPLE_RATE", "1"))
+# Also capture JSON request bodies (they may hold personal data)
+CAPTURE_BODIES = os.getenv("CAPTURE_BODIES", "true").lower() == "true"
+
+_captured = queue.SimpleQueue()
+_capture_lock = threading.Lock()
+_capture_writer = None
+
+# Append captured records from a background thread, so requests never wait on the disk
+def _write_captured():
+    with open(CAPTURE_FILE, "a", encoding="utf-8") as file:
+        while True:
+            file.write(_captured.get())
+            while not _captured.empty():
+                file.write(_captured.get())
+            file.flush()
+
+def _capture(response, duration):
+    global _capture_writer
+    if _capture_writer is None:
+        with _capture_lock:
+            if _capture_writer is None:
+                _capture_writer = threading.Thread(target=_write_captured, name="traffic-capture", daemon=True)
+                _capture_writer.start()
+
+    record = {
+        "t": round(g.capture_time, 6),
+        "method": request.method,
+        "path": request.path,
+        "args": request.query_string.decode("latin-1"),
+        "endpoint": request.endpoint,
+        "status": response.status_code,
+        "ms": round(duration.total_seconds() * 1000, 3),
+    }
+    if CAPTURE_BODIES and request.method not in ("GET", "HEAD") and request.is_json:
+        record["body"] = request.get_json(silent=True)
+    _captured.put(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+
 # Middleware logging before each request
 def before_request_logging():
     g.start_time = datetime.now()
+    if CAPTURE_FILE and random.random() < CAPTURE_SAMPLE_RATE:
+        g.capture_time = time.time()
+    if TRACING_ENABLED:
+        start_request_span()
     logger.info(f"Incoming {request.method} request to {request.path} with data: {request.args.to_dict()}")
 
 # Middleware logging after each request
 def after_request_logging(response):
     duration = datetime.now() - g.start_time
+    if "capture_time" in g:
+        _capture(response, duration)
+    if TRACING_ENABLED:
+        end_request_span(response)
     logger.info(f"Completed {request.method} request to {request.path} in {duration.total_seconds()} seconds with status code {response.status_code}")
     return response
\ No newline at end of file
@@ -1,5 +1,6 @@
+from datetime import datetime
 from config import db
-from sqlalchemy import Column, Integer, String, Text, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Text, DateTime, Boolean, ForeignKey
 from sqlalchemy.orm import relationship
 
 class Dish(db.Model):
@@ -8,8 +9,10 @@ class Dish(db.Model):
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(255), nullable=False)
     description = Column(Text)
-    dining_hall_id = Column(Integer, ForeignKey('dining_halls.id'), nullable=False)
-    station_id = Column(Integer, ForeignKey('stations.id'), nullable=False)
+    dining_hall_id = Column(Integer, ForeignKey('dining_halls.id', ondelete='CASCADE'), nullable=False)
+    station_id = Column(Integer, ForeignKey('stations.id', ondelete='CASCADE'), nullable=False)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = Column(BigInteger, nullable=False, default=0, index=True)
     
     # relationships
     dining_hall = relationship("DiningHall", back_populates="dishes")
@@ -23,10 +26,13 @@ class DiningHall(db.Model):
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(255), nullable=False, unique=True)
+    dish_count = Column(Integer, nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = Column(BigInteger, nullable=False, default=0, index=True)
     
-    # Relationship back to Dish and Station models
-    dishes = relationship("Dish", back_populates="dining_hall")
-    stations = relationship("Station", back_populates="dining_hall")
+    # Relationship back to Dish and Station models (children are deleted in bulk or by the database, never loaded for it)
+    dishes = relationship("Dish", back_populates="dining_hall", passive_deletes=True)
+    stations = relationship("Station", back_populates="dining_hall", passive_deletes=True)
 
     def __repr__(self):
         return f"<DiningHall(id={self.id}, name='{self.name}')>"
@@ -36,11 +42,69 @@ class Station(db.Model):
     
     id = Column(Integer, primary_key=True, autoincrement=True)
     name = Column(String(255), nullable=False)
-    dining_hall_id = Column(Integer, ForeignKey('dining_halls.id'), nullable=False)
+    dining_hall_id = Column(Integer, ForeignKey('dining_halls.id', ondelete='CASCADE'), nullable=False)
+    dish_count = Column(Integer, nullable=False, default=0, server_default='0')
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+    change_seq = Column(BigInteger, nullable=False, default=0, index=True)
     
     # relationships
     dining_hall = relationship("DiningHall", back_populates="stations")
-    dishes = relationship("Dish", back_populates="station")
+    dishes = relationship("Dish", back_populates="station", passive_deletes=True)
 
     def __repr__(self):
-        return f"<Station(id={self.id}, name='{self.name}', dining_hall_name='{self.dining_hall.name}')>"
\ No newline at end of file
+        return f"<Station(id={self.id}, name='{self.name}', dining_hall_name='{self.dining_hall.name}')>"
+
+class Tombstone(db.Model):
+    __tablename__ = 'tombstones'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    entity = Column(String(32), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    dining_hall_id = Column(Integer)
+    station_id = Column(Integer)
+    deleted_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    change_seq = Column(BigInteger, nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<Tombstone(entity='{self.entity}', entity_id={self.entity_id}, change_seq={self.change_seq})>"
+
+class ChangeSequence(db.Model):
+    __tablename__ = 'change_sequence'
+
+    id = Column(Integer, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ChangeSequence(value={self.value})>"
+
+# Version of the dining hall ids and station to dining hall mapping cached by every worker
+# (see referencedata.py), bumped whenever a dining hall or a station is created or deleted
+class ReferenceVersion(db.Model):
+    __tablename__ = 'reference_version'
+
+    id = Column(Integer, primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<ReferenceVersion(value={self.value})>"
+
+class Job(db.Model):
+    __tablename__ = 'jobs'
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    kind = Column(String(64), nullable=False)
+    # queued, running, succeeded, failed or cancelled
+    status = Column(String(16), nullable=False, default='queued')
+    progress = Column(Integer, nullable=False, default=0)
+    total = Column(Integer)
+    result = Column(Text)
+    error = Column(Text)
+    cancel_requested = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    started_at = Column(DateTime)
+    finished_at = Column(DateTime)
+    # Last sign of life of the worker the job is queued or running in (see jobs.recover_jobs)
+    heartbeat_at = Column(DateTime)
+
+    def __repr__(self):
+        return f"<Job(id={self.id}, kind='{self.kind}', status='{self.status}')>"
\ No newline at end of file
@@ -0,0 +1,48 @@
+import os
+from flask import request
+
+# Ids per IN query when fetching rows by id, and maximum number of ids per request
+MULTI_GET_CHUNK_SIZE = int(os.getenv("MULTI_GET_CHUNK_SIZE", "500"))
+MULTI_GET_MAX_IDS = int(os.getenv("MULTI_GET_MAX_IDS", "1000"))
+
+class MultiGetError(Exception):
+    pass
+
+# Ids of the comma-separated "ids" query parameter in request order (duplicates dropped),
+# None if the parameter is absent
+def parse_ids():
+    value = request.args.get('ids')
+    if value is None:
+        return None
+
+    try:
+        ids = [int(id) for id in value.split(',') if id.strip()]
+    except ValueError:
+        raise MultiGetError("ids must be a comma-separated list of integers")
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise MultiGetError("ids must not be empty")
+    if len(ids) > MULTI_GET_MAX_IDS:
+        raise MultiGetError(f"At most {MULTI_GET_MAX_IDS} ids can be requested at once")
+    return ids
+
+def _in_request_order(ids, found):
+    return [found[id] for id in ids if id in found], [id for id in ids if id not in found]
+
+# Rows with the given ids, fetched by fetch(chunk) with one IN query per MULTI_GET_CHUNK_SIZE ids
+# (see statements.rows_by_ids). Returns (rows in request order, ids not found).
+def get_many(fetch, ids):
+    found = {}
+    for start in range(0, len(ids), MULTI_GET_CHUNK_SIZE):
+        chunk = ids[start:start + MULTI_GET_CHUNK_SIZE]
+        found.update((row.id, row) for row in fetch(chunk))
+    return _in_request_order(ids, found)
+
+# Same as get_many, looking every id up in a per-id cache (e.g. the catalog snapshot)
+def get_many_cached(ids, lookup):
+    found = {}
+    for id in ids:
+        row = lookup(id)
+        if row is not None:
+            found[id] = row
+    return _in_request_order(ids, found)
@@ -0,0 +1,75 @@
+import os
+from flask import current_app, jsonify, request
+from werkzeug.exceptions import NotAcceptable
+from tracing import span
+
+# The binary formats are optional, a format whose library is not installed is never negotiated
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+# Binary formats offered through the Accept header, besides JSON (BINARY_FORMATS= disables them)
+BINARY_FORMATS = [name.strip() for name in os.getenv("BINARY_FORMATS", "msgpack,cbor").split(",") if name.strip()]
+
+JSON_MIMETYPE = "application/json"
+
+def _encode_json(data):
+    return current_app.json.dumps(data).encode("utf-8")
+
+# Values the schemas leave as Python objects (dates, decimals...) are converted the way the JSON provider does
+def _encode_msgpack(data):
+    return msgpack.packb(data, default=current_app.json.default)
+
+def _encode_cbor(data):
+    default = current_app.json.default
+    return cbor2.dumps(data, default=lambda encoder, value: encoder.encode(default(value)))
+
+_formats = {}
+if msgpack is not None and "msgpack" in BINARY_FORMATS:
+    _formats["application/msgpack"] = _encode_msgpack
+    _formats["application/x-msgpack"] = _encode_msgpack
+if cbor2 is not None and "cbor" in BINARY_FORMATS:
+    _formats["application/cbor"] = _encode_cbor
+
+# JSON first, so */* and requests without an Accept header keep getting JSON
+_offered = [JSON_MIMETYPE, *_formats]
+
+# Mimetype of the response format the client prefers, JSON without an Accept header.
+# Raises NotAcceptable (a 406 response) if the client accepts none of the offered formats.
+def negotiated_mimetype():
+    if not request.accept_mimetypes:
+        return JSON_MIMETYPE
+    mimetype = request.accept_mimetypes.best_match(_offered)
+    if mimetype is None:
+        description = f"Supported response formats: {', '.join(_offered)}"
+        response = jsonify({"error": description})
+        response.status_code = 406
+        raise NotAcceptable(description, response=vary_on_accept(response))
+    return mimetype
+
+# Serialize an already dumped schema output in the negotiated format
+def encode(data, mimetype):
+    if mimetype == JSON_MIMETYPE:
+        return _encode_json(data)
+    with span("encode binary", **{"http.response.mimetype": mimetype}):
+        return _formats[mimetype](data)
+
+# Response with the schema output in the format negotiated from the Accept header
+def respond(data):
+    mimetype = negotiated_mimetype()
+    if mimetype == JSON_MIMETYPE:
+        response = current_app.json.response(data)
+    else:
+        response = current_app.response_class(encode(data, mimetype), mimetype=mimetype)
+    return vary_on_accept(response)
+
+# Caches in front of the service must keep the formats apart
+def vary_on_accept(response):
+    if _formats:
+        response.vary.add("Accept")
+    return response
@@ -0,0 +1,159 @@
+import hmac
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+from flask import g, request
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Directory the request profiles are written to (unset disables profiling)
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+# Fraction of requests profiled without being asked to
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Requests with this token in the X-Profile-Token header are profiled, and it is required by the admin endpoints
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN")
+# Seconds between stack samples, and number of profiles kept on disk
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", "200"))
+
+PROFILE_ENABLED = bool(PROFILE_DIR)
+TOKEN_HEADER = "X-Profile-Token"
+PROFILE_SUFFIXES = (".collapsed", ".speedscope.json")
+
+metrics.describe("profiles_captured_total", "Request profiles written to PROFILE_DIR")
+
+def authorized():
+    token = request.headers.get(TOKEN_HEADER)
+    return bool(PROFILE_TOKEN) and token is not None and hmac.compare_digest(token, PROFILE_TOKEN)
+
+def _frame_name(code):
+    return code.co_name, code.co_filename, code.co_firstlineno
+
+# Statistical profiler of one thread: a sampler thread records the thread's stack every
+# PROFILE_INTERVAL seconds. Unlike cProfile it only slows the profiled request down by the
+# sampling itself, and the full stacks make flame graphs of handler, serialization and SQLAlchemy time.
+class StackSampler:
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        # Seconds attributed to each distinct stack
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="profile-sampler", daemon=True)
+
+    def start(self):
+        self.started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+
+    def _sample(self):
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            # The wait can be much longer than the interval while the request holds the GIL,
+            # so each sample is weighted by the time since the previous one
+            now = time.perf_counter()
+            elapsed, last = now - last, now
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                stack.append(_frame_name(frame.f_code))
+                frame = frame.f_back
+            # Root first
+            stack.reverse()
+            self.samples[tuple(stack)] += elapsed
+
+    # Brendan Gregg's collapsed stack format, one "root;...;leaf weight" line per distinct stack,
+    # the weight being in microseconds
+    def collapsed(self):
+        lines = []
+        for stack, seconds in self.samples.most_common():
+            names = ";".join(f"{name} ({os.path.basename(filename)}:{line})" for name, filename, line in stack)
+            lines.append(f"{names} {round(seconds * 1e6)}\n")
+        return "".join(lines)
+
+    # Sampled profile in the speedscope file format (https://www.speedscope.app)
+    def speedscope(self, name):
+        frames = {}
+        samples = []
+        weights = []
+        for stack, seconds in self.samples.items():
+            samples.append([frames.setdefault(frame, len(frames)) for frame in stack])
+            weights.append(seconds * 1000)
+        return {
+            "$schema": "https://www.speedscope.app/file-format-schema.json",
+            "shared": {"frames": [{"name": name, "file": filename, "line": line} for name, filename, line in frames]},
+            "profiles": [{
+                "type": "sampled",
+                "name": name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": sum(weights),
+                "samples": samples,
+                "weights": weights,
+            }],
+            "name": name,
+            "exporter": "dish-service profiling",
+        }
+
+def _prune():
+    names = sorted(name for name in os.listdir(PROFILE_DIR) if name.endswith(PROFILE_SUFFIXES))
+    excess = len(names) - PROFILE_MAX_FILES * len(PROFILE_SUFFIXES)
+    for name in names[:max(0, excess)]:
+        os.remove(os.path.join(PROFILE_DIR, name))
+
+def _write(sampler, profile_id, title):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    with open(os.path.join(PROFILE_DIR, profile_id + ".collapsed"), "w", encoding="utf-8") as file:
+        file.write(sampler.collapsed())
+    with open(os.path.join(PROFILE_DIR, profile_id + ".speedscope.json"), "w", encoding="utf-8") as file:
+        json.dump(sampler.speedscope(title), file)
+    _prune()
+    metrics.inc("profiles_captured_total")
+
+# Start profiling the request if it carries the token or is sampled
+def before_request_profiling():
+    if request.blueprint == "profiles":
+        return
+    if authorized() or (PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE):
+        g.profiler = StackSampler(threading.get_ident(), PROFILE_INTERVAL)
+        g.profiler.start()
+
+# Stop profiling and write the profile, its id is returned in the X-Profile-Id header
+def after_request_profiling(response):
+    sampler = g.pop("profiler", None)
+    if sampler is None:
+        return response
+
+    sampler.stop()
+    # Sortable by time, so the oldest profiles are pruned first
+    profile_id = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}-{(request.endpoint or 'unknown').replace('.', '-')}"
+    try:
+        _write(sampler, profile_id, f"{request.method} {request.full_path} ({sampler.duration * 1000:.1f} ms)")
+        response.headers["X-Profile-Id"] = profile_id
+    except OSError:
+        logger.exception(f"Writing profile {profile_id} failed")
+    return response
+
+# Stop the sampler of a request that failed before after_request ran
+def teardown_request_profiling(exception=None):
+    sampler = g.pop("profiler", None)
+    if sampler is not None:
+        sampler.stop()
+
+def config_profiling(app):
+    if not PROFILE_ENABLED:
+        return
+    app.before_request(before_request_profiling)
+    app.after_request(after_request_profiling)
+    app.teardown_request(teardown_request_profiling)
@@ -0,0 +1,56 @@
+from graphene.utils.str_converters import to_snake_case
+from graphql.language.ast import Field, FragmentSpread, InlineFragment
+from sqlalchemy import inspect
+from sqlalchemy.orm import ColumnProperty, RelationshipProperty, joinedload, load_only, selectinload
+
+# {field name: [selection sets of that field]} of the fields selected in the given selection sets,
+# with fragments expanded and the same field selected several times (aliases, fragments) merged
+def _selected_fields(selection_sets, fragments):
+    selected = {}
+    pending = [selection_set for selection_set in selection_sets if selection_set is not None]
+    while pending:
+        for selection in pending.pop().selections:
+            if isinstance(selection, Field):
+                name = selection.name.value
+                if not name.startswith("__"):
+                    selected.setdefault(to_snake_case(name), []).append(selection.selection_set)
+            elif isinstance(selection, FragmentSpread):
+                pending.append(fragments[selection.name.value].selection_set)
+            elif isinstance(selection, InlineFragment):
+                pending.append(selection.selection_set)
+    return selected
+
+def _column_key(mapper, column):
+    return mapper.get_property_by_column(column).key
+
+# Column keys to load and loader options for the relationships selected under a mapper: to-one
+# relationships are joined, collections are batched with one SELECT ... IN per relationship.
+# Relationships that aren't selected are left lazy, so they are never loaded.
+def _projection(mapper, selection_sets, fragments):
+    columns = {prop.key for prop in map(mapper.get_property_by_column, mapper.primary_key)}
+    options = []
+    for name, child_selection_sets in _selected_fields(selection_sets, fragments).items():
+        prop = mapper.attrs[name] if name in mapper.attrs else None
+        if isinstance(prop, ColumnProperty):
+            columns.add(name)
+        elif isinstance(prop, RelationshipProperty):
+            child_columns, child_options = _projection(prop.mapper, child_selection_sets, fragments)
+            # Both sides need the columns the relationship is matched on
+            for local, remote in prop.local_remote_pairs:
+                columns.add(_column_key(mapper, local))
+                child_columns.add(_column_key(prop.mapper, remote))
+            loader = selectinload if prop.uselist else joinedload
+            attribute = getattr(mapper.class_, name)
+            options.append(loader(attribute).options(
+                load_only(*(getattr(prop.mapper.class_, key) for key in sorted(child_columns))),
+                *child_options,
+            ))
+    return columns, options
+
+# Push the selection set of a GraphQL field resolving to `model` objects into the query: only the
+# selected columns are loaded (e.g. no TEXT description unless it is asked for), and only the
+# selected relationships are joined or batched
+def project(query, model, info):
+    mapper = inspect(model)
+    columns, options = _projection(mapper, [field.selection_set for field in info.field_asts], info.fragments)
+    return query.options(load_only(*(getattr(model, key) for key in sorted(columns))), *options)
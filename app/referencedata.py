@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+from sqlalchemy import event, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from models import DiningHall, Station, ReferenceVersion, db
+from events import subscribe
+from transactions import commit, commits_deferred
+from sharding import global_connection
+import metrics
+
+# Seconds between checks of the reference data version, i.e. how long a hall or station created or
+# deleted by another worker can go unnoticed (0 checks it on every use)
+REFERENCE_CACHE_CHECK_INTERVAL = float(os.getenv("REFERENCE_CACHE_CHECK_INTERVAL", "1"))
+
+metrics.describe("reference_cache_lookups_total", "Dining hall and station validations by outcome (hit, or miss looked up in the database)")
+metrics.describe("reference_cache_reloads_total", "Reloads of the cached dining hall ids and station to dining hall mapping")
+
+REFERENCE_MODELS = (DiningHall, Station)
+
+# Bump the reference data version in the transaction creating or deleting a dining hall or a
+# station, so every worker reloads its cache once the transaction commits. Like the change
+# sequence, the row lock serializes these (rare) transactions.
+def bump_reference_version(session):
+    connection = global_connection(session)
+    table = ReferenceVersion.__table__
+    result = connection.execute(update(table).where(table.c.id == 1).values(value=table.c.value + 1))
+    if result.rowcount == 0:
+        connection.execute(insert(table).values(id=1, value=1))
+
+@event.listens_for(Session, 'before_flush')
+def _bump_on_reference_writes(session, flush_context, instances):
+    if any(isinstance(obj, REFERENCE_MODELS) for obj in (*session.new, *session.deleted)):
+        bump_reference_version(session)
+
+def _current_version(session):
+    table = ReferenceVersion.__table__
+    return session.execute(select(table.c.value).where(table.c.id == 1)).scalar() or 0
+
+class _Snapshot:
+    __slots__ = ("version", "hall_ids", "station_halls")
+
+    def __init__(self, version, hall_ids, station_halls):
+        self.version = version
+        self.hall_ids = hall_ids
+        self.station_halls = station_halls
+
+# Valid dining hall ids and the dining hall of every station, cached in process so validating
+# the ids of a write costs no query. The cache is reloaded after this worker commits a hall or
+# station write, and when the version in the database changed (checked every
+# REFERENCE_CACHE_CHECK_INTERVAL seconds). An id missing from the cache is looked up in the
+# database before it is rejected, so a hall or station just created elsewhere is accepted.
+class ReferenceData:
+    def __init__(self):
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def invalidate(self, changes=None):
+        if changes is None or any(change.entity in ('dining_hall', 'station') and change.op != 'update' for change in changes):
+            self._dirty = True
+
+    def _load(self, version):
+        hall_ids = frozenset(db.session.scalars(select(DiningHall.id)))
+        station_halls = dict(db.session.execute(select(Station.id, Station.dining_hall_id)).all())
+        metrics.inc("reference_cache_reloads_total")
+        return _Snapshot(version, hall_ids, station_halls)
+
+    def _current(self):
+        snapshot = self._snapshot
+        if snapshot is not None and not self._dirty and time.monotonic() - self._checked_at < REFERENCE_CACHE_CHECK_INTERVAL:
+            return snapshot
+        # Never reload inside a batch or group commit, the transaction may hold uncommitted hall and station writes
+        if commits_deferred():
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and not self._dirty and time.monotonic() - self._checked_at < REFERENCE_CACHE_CHECK_INTERVAL:
+                return snapshot
+            dirty, self._dirty = self._dirty, False
+            version = _current_version(db.session)
+            if snapshot is None or dirty or version != snapshot.version:
+                snapshot = self._snapshot = self._load(version)
+            self._checked_at = time.monotonic()
+            return snapshot
+
+    def _lookup(self, cached, query):
+        snapshot = self._current()
+        result = cached(snapshot) if snapshot is not None else None
+        if result is not None:
+            metrics.inc("reference_cache_lookups_total", {"outcome": "hit"})
+            return result
+
+        # Unknown to the cache: either invalid, or created by another worker since the last version
+        # check. The database decides, and the next lookup checks the version again.
+        metrics.inc("reference_cache_lookups_total", {"outcome": "miss"})
+        self._checked_at = 0.0
+        return query()
+
+    def dining_hall_exists(self, dining_hall_id):
+        return self._lookup(
+            lambda snapshot: dining_hall_id if dining_hall_id in snapshot.hall_ids else None,
+            lambda: db.session.scalar(select(DiningHall.id).where(DiningHall.id == dining_hall_id)),
+        ) is not None
+
+    # Dining hall of a station, or None if the station doesn't exist
+    def station_dining_hall(self, station_id):
+        return self._lookup(
+            lambda snapshot: snapshot.station_halls.get(station_id),
+            lambda: db.session.scalar(select(Station.dining_hall_id).where(Station.id == station_id)),
+        )
+
+reference_data = ReferenceData()
+subscribe(reference_data.invalidate)
+
+# Commit a write whose dining hall / station ids were validated with the cache. If the database
+# rejects them anyway (deleted by another worker since the last version check), the write is
+# rolled back, the cache reloaded and False returned if still_valid() now disagrees, so the handler
+# answers as it would have with a fresh cache. Other integrity errors are raised.
+def commit_validated(still_valid):
+    try:
+        commit()
+        return True
+    except IntegrityError:
+        if not commits_deferred():
+            db.session.rollback()
+        else:
+            # In a group commit the request's writes are in a savepoint of their own, only that is
+            # rolled back. An atomic batch owns the whole transaction and handles the error.
+            savepoint = db.session().get_nested_transaction()
+            if savepoint is None:
+                raise
+            savepoint.rollback()
+        reference_data.invalidate()
+        if still_valid():
+            raise
+        return False
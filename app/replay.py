@@ -0,0 +1,113 @@
+"""
+Replay captured traffic (CAPTURE_FILE, see middleware.py) against a running instance.
+
+Requests are sent open loop: each one starts at its original offset from the first
+record divided by --speed, whether or not the earlier ones have completed, so a slow
+server builds up a backlog the way it would under real traffic. Latency is measured
+from the scheduled start, so time spent waiting for a free worker counts too.
+
+    python3 replay.py traffic.jsonl --url http://localhost:5001 --speed 2
+"""
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+def load_records(path, limit=None):
+    records = []
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                records.append(json.loads(line))
+                if limit is not None and len(records) >= limit:
+                    break
+    records.sort(key=lambda record: record["t"])
+    return records
+
+def route_of(record):
+    return record.get("endpoint") or f"{record['method']} {record['path']}"
+
+def send(base_url, record, timeout):
+    url = base_url + record["path"] + (f"?{record['args']}" if record.get("args") else "")
+    data = None
+    headers = {}
+    if "body" in record:
+        data = json.dumps(record["body"]).encode()
+        headers["Content-Type"] = "application/json"
+    request = urllib.request.Request(url, data=data, headers=headers, method=record["method"])
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except Exception:
+        return None
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+# Replay the records and return {route: [(latency_seconds, status, captured_status)]}
+def replay(records, base_url, speed, workers, timeout):
+    results = defaultdict(list)
+    lock = threading.Lock()
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    def run(record, scheduled):
+        status = send(base_url, record, timeout)
+        latency = time.perf_counter() - scheduled
+        with lock:
+            results[route_of(record)].append((latency, status, record.get("status")))
+
+    first = records[0]["t"]
+    start = time.perf_counter()
+    for record in records:
+        scheduled = start + (record["t"] - first) / speed
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        executor.submit(run, record, scheduled)
+    executor.shutdown(wait=True)
+    return results, time.perf_counter() - start
+
+def report(results, elapsed):
+    total = sum(len(samples) for samples in results.values())
+    print(f"{total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+    print(f"{'route':<45} {'count':>7} {'errors':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for route, samples in sorted(results.items(), key=lambda item: -len(item[1])):
+        latencies = sorted(latency * 1000 for latency, _, _ in samples)
+        # An error is a failed request, or a status differing from the captured one
+        errors = sum(1 for _, status, captured in samples if status is None or status >= 500 or (captured and status != captured))
+        print(
+            f"{route:<45} {len(samples):>7} {errors:>7} {percentile(latencies, 0.5):>9.1f} "
+            f"{percentile(latencies, 0.9):>9.1f} {percentile(latencies, 0.99):>9.1f} {latencies[-1]:>9.1f}"
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay captured traffic against a running instance")
+    parser.add_argument("capture_file", help="JSON lines written by the traffic capture (CAPTURE_FILE)")
+    parser.add_argument("--url", default="http://localhost:5001", help="base URL of the instance")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier (2 = twice the original rate)")
+    parser.add_argument("--workers", type=int, default=64, help="maximum requests in flight")
+    parser.add_argument("--timeout", type=float, default=30.0, help="request timeout in seconds")
+    parser.add_argument("--limit", type=int, help="only replay the first records")
+    parser.add_argument("--reads-only", action="store_true", help="skip the requests that are not GET")
+    args = parser.parse_args()
+
+    records = load_records(args.capture_file, args.limit)
+    if args.reads_only:
+        records = [record for record in records if record["method"] == "GET"]
+    if not records:
+        parser.error("no records to replay")
+
+    results, elapsed = replay(records, args.url.rstrip("/"), args.speed, args.workers, args.timeout)
+    report(results, elapsed)
+
+if __name__ == "__main__":
+    main()
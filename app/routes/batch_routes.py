@@ -0,0 +1,204 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from flask import Blueprint, current_app, jsonify, request
+from werkzeug.exceptions import HTTPException
+from models import db
+from tracing import current_span, span, use_span
+from transactions import deferred_commits
+from admission import before_request_admission, teardown_request_admission
+
+logger = logging.getLogger(__name__)
+
+# Maximum sub-requests per batch, and threads running the sub-requests of parallel batches
+BATCH_MAX_REQUESTS = int(os.getenv("BATCH_MAX_REQUESTS", "20"))
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "4"))
+
+# Blueprints whose routes can be called from a batch
+BATCH_BLUEPRINTS = ('dishes', 'dining_halls')
+READ_METHODS = ('GET', 'HEAD')
+
+batch_bp = Blueprint('batch', __name__)
+_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch")
+
+def _result(status, body, headers=None):
+    result = {"status": status, "body": body}
+    if headers:
+        result["headers"] = headers
+    return result
+
+# Run one sub-request through the route's view function, without the per-request middleware
+# except admission control: every sub-request takes a token of the client's rate limit and a slot
+# of its route's concurrency limit, like the same request sent on its own.
+# Must be called in an app context of its own: the sub-request shares its g and session.
+def _execute(app, subrequest, origin):
+    method = subrequest["method"]
+    with app.test_request_context(subrequest["path"], method=method, json=subrequest.get("body"), **origin), \
+            span("batch request", **{"http.method": method, "http.target": subrequest["path"]}):
+        if request.routing_exception is None and request.blueprint not in BATCH_BLUEPRINTS:
+            return _result(404, {"error": "Only the dish and dining hall routes can be batched"})
+        try:
+            response = before_request_admission()
+            if response is None:
+                response = app.make_response(app.dispatch_request())
+        except HTTPException as e:
+            return _result(e.code, {"error": e.description})
+        finally:
+            teardown_request_admission()
+
+        body = response.get_data(as_text=True)
+        if response.is_json:
+            body = app.json.loads(body) if body else None
+        headers = {name: value for name, value in response.headers.items() if name in ("Location", "Retry-After")}
+        return _result(response.status_code, body, headers)
+
+# Base URL and client address of the batch request, which its sub-requests are run (and admitted) with
+def _origin():
+    environ = {"REMOTE_ADDR": request.remote_addr}
+    if "X-Forwarded-For" in request.headers:
+        environ["HTTP_X_FORWARDED_FOR"] = request.headers["X-Forwarded-For"]
+    return {"base_url": request.host_url, "environ_base": environ}
+
+def _execute_in_context(app, subrequest, origin, parent):
+    with app.app_context(), use_span(parent):
+        try:
+            return _execute(app, subrequest, origin)
+        except Exception:
+            logger.exception(f"Batched {subrequest['method']} {subrequest['path']} failed")
+            return _result(500, {"error": "Internal server error"})
+
+def _run_parallel(app, subrequests, origin):
+    # The workers' spans belong to the batch request
+    parent = current_span()
+    futures = [_executor.submit(_execute_in_context, app, subrequest, origin, parent) for subrequest in subrequests]
+    return [future.result() for future in futures]
+
+# Run the sub-requests one after the other. Without atomic, each one runs in an app context (and
+# session) of its own, so a failed write doesn't leave a session needing a rollback to the next
+# ones. In an atomic batch they share one transaction, committed at the end, and the first failure
+# rolls everything back and skips the rest.
+def _run_sequential(app, subrequests, origin, atomic):
+    if not atomic:
+        parent = current_span()
+        return [_execute_in_context(app, subrequest, origin, parent) for subrequest in subrequests], None
+
+    results = []
+    with app.app_context():
+        with deferred_commits():
+            for subrequest in subrequests:
+                try:
+                    result = _execute(app, subrequest, origin)
+                except Exception:
+                    logger.exception(f"Batched {subrequest['method']} {subrequest['path']} failed")
+                    result = _result(500, {"error": "Internal server error"})
+                results.append(result)
+                if result["status"] >= 400:
+                    break
+
+        failed = len(results) < len(subrequests) or results[-1]["status"] >= 400
+        if failed:
+            db.session.rollback()
+        else:
+            try:
+                db.session.commit()
+            except Exception:
+                logger.exception("Committing an atomic batch failed")
+                db.session.rollback()
+                failed = True
+
+        skipped = _result(424, {"error": "Not run, an earlier request of the atomic batch failed"})
+        results.extend(skipped for _ in range(len(subrequests) - len(results)))
+        return results, not failed
+
+def _validate(data):
+    if not isinstance(data, dict) or not isinstance(data.get("requests"), list):
+        return "Body must be an object with a list of requests"
+    subrequests = data["requests"]
+    if not subrequests:
+        return "requests must not be empty"
+    if len(subrequests) > BATCH_MAX_REQUESTS:
+        return f"At most {BATCH_MAX_REQUESTS} requests can be batched"
+    for subrequest in subrequests:
+        if not isinstance(subrequest, dict) or not isinstance(subrequest.get("path"), str) or not subrequest["path"].startswith("/"):
+            return "Every request needs a path starting with /"
+        subrequest["method"] = str(subrequest.get("method", "GET")).upper()
+    if data.get("parallel") and data.get("atomic"):
+        return "A batch cannot be both parallel and atomic"
+    if data.get("parallel") and any(subrequest["method"] not in READ_METHODS for subrequest in subrequests):
+        return "Only GET requests can run in parallel"
+    return None
+
+# POST /api/v1/batch: Run several API requests in one round trip
+@batch_bp.route('/batch', methods=['POST'])
+def run_batch():
+    """
+    Run several dish and dining hall requests in one round trip
+    ---
+    tags:
+      - Batch
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          required:
+            - requests
+          properties:
+            requests:
+              type: array
+              description: Requests against the dish and dining hall routes, run in order
+              items:
+                properties:
+                  method:
+                    type: string
+                    example: "GET"
+                  path:
+                    type: string
+                    example: "/api/v1/dining_halls/2/stations?fields=id,name"
+                  body:
+                    type: object
+            parallel:
+              type: boolean
+              description: Run the requests concurrently (GET requests only)
+              example: false
+            atomic:
+              type: boolean
+              description: Run the requests in one transaction, rolled back if any of them fails
+              example: false
+    responses:
+      200:
+        description: The response of every request, in order
+        schema:
+          properties:
+            responses:
+              type: array
+              items:
+                properties:
+                  status:
+                    type: integer
+                    example: 200
+                  body:
+                    type: object
+                  headers:
+                    type: object
+            committed:
+              type: boolean
+              description: Whether the writes of an atomic batch were committed
+      400:
+        description: Invalid batch
+    """
+    data = request.get_json(silent=True)
+    error = _validate(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    app = current_app._get_current_object()
+    subrequests = data["requests"]
+    if data.get("parallel"):
+        return jsonify({"responses": _run_parallel(app, subrequests, _origin())}), 200
+
+    atomic = bool(data.get("atomic"))
+    results, committed = _run_sequential(app, subrequests, _origin(), atomic)
+    if not atomic:
+        return jsonify({"responses": results}), 200
+    return jsonify({"responses": results, "committed": committed}), 200
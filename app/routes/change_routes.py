@@ -0,0 +1,144 @@
+from flask import Blueprint, Response, current_app, jsonify, request, stream_with_context, url_for
+from models import db
+from schemas import DishSchema, DiningHallSchema, StationSchema
+from changefeed import load_changes, change_to_dict
+from broker import broker
+from singleflight import coalesce
+
+# register blueprint and create schemas
+changes_bp = Blueprint('changes', __name__)
+entity_schemas = {
+    'dish': DishSchema(exclude=("message",)),
+    'station': StationSchema(exclude=("message",)),
+    'dining_hall': DiningHallSchema(exclude=("message",)),
+}
+
+# GET /api/v1/changes: Retrieve the changes made to dishes, stations and dining halls since a token
+@changes_bp.route('/changes', methods=['GET'])
+@coalesce
+def get_changes():
+    """
+    Retrieve the dishes, stations and dining halls that changed since a sync token
+    ---
+    tags:
+      - Changes
+    parameters:
+      - name: since
+        in: query
+        type: string
+        description: The next token of the previous page (omit to sync everything)
+        example: "1042"
+      - name: limit
+        in: query
+        type: integer
+        description: Maximum number of changes returned (default 100, max 1000)
+        example: 100
+    responses:
+      200:
+        description: A page of changes in commit order
+        schema:
+          properties:
+            changes:
+              type: array
+              items:
+                properties:
+                  entity:
+                    type: string
+                    example: "dish"
+                  op:
+                    type: string
+                    example: "upsert"
+                  id:
+                    type: integer
+                    example: 3
+                  change_seq:
+                    type: integer
+                    example: 1043
+                  data:
+                    type: object
+            next:
+              type: string
+              example: "1050"
+            has_more:
+              type: boolean
+              example: false
+            _links:
+              type: object
+              properties:
+                next:
+                  type: object
+                  properties:
+                    href:
+                      type: string
+                      example: "/api/v1/changes?since=1050"
+                    method:
+                      type: string
+                      example: "GET"
+      400:
+        description: Invalid since token
+    """
+    since = request.args.get('since', default='-1')
+    if not since.lstrip('-').isdigit():
+        return jsonify({"error": "Invalid since token"}), 400
+    since = int(since)
+    limit = min(max(request.args.get('limit', default=100, type=int), 1), 1000)
+
+    items, next_seq, has_more = load_changes(db.session, since, limit)
+
+    return jsonify({
+        "changes": [change_to_dict(item, entity_schemas) for item in items],
+        "next": str(next_seq),
+        "has_more": has_more,
+        "_links": {
+            "next": {"href": url_for("changes.get_changes", since=next_seq), "method": "GET"}
+        }
+    }), 200
+
+
+# GET /api/v1/changes/stream: Push changes to dishes, stations and dining halls as Server-Sent Events
+@changes_bp.route('/changes/stream', methods=['GET'])
+def stream_changes():
+    """
+    Stream changes to dishes, stations and dining halls as Server-Sent Events
+    ---
+    tags:
+      - Changes
+    produces:
+      - text/event-stream
+    parameters:
+      - name: dining_hall_id
+        in: query
+        type: integer
+        description: Only push changes within this dining hall
+        example: 2
+      - name: station_id
+        in: query
+        type: integer
+        description: Only push changes within this station
+        example: 10
+      - name: Last-Event-ID
+        in: header
+        type: string
+        description: Resume after this event id (also accepted as the last_event_id query parameter)
+        example: "1042"
+    responses:
+      200:
+        description: An event stream of changes, each event's data has the same format as the items of /api/v1/changes
+      400:
+        description: Invalid Last-Event-ID
+    """
+    dining_hall_id = request.args.get('dining_hall_id', type=int)
+    station_id = request.args.get('station_id', type=int)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if last_event_id is not None:
+        if not last_event_id.lstrip('-').isdigit():
+            return jsonify({"error": "Invalid Last-Event-ID"}), 400
+        last_event_id = int(last_event_id)
+
+    broker.start(current_app._get_current_object())
+    return Response(
+        stream_with_context(broker.stream(last_event_id, dining_hall_id, station_id)),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
\ No newline at end of file
@@ -1,6 +1,20 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, current_app, jsonify, request
 from models import DiningHall, Station, db
 from schemas import DiningHallSchema, StationSchema
+from counts import adjust_dish_counts
+from cascades import delete_dining_hall_cascade, delete_station_cascade
+from routes.job_routes import start_job
+from singleflight import coalesce
+from transactions import commit
+from referencedata import commit_validated, reference_data
+from groupcommit import group_commit
+from catalog import CATALOG_SNAPSHOT_ENABLED, catalog
+from fieldsets import FieldsetError, parse_fieldset, get_list_schema
+from rows import list_serializer
+from statements import contains_pattern, find_first, list_rows, rows_by_ids
+from multiget import MultiGetError, parse_ids, get_many, get_many_cached
+from negotiation import negotiated_mimetype, respond, vary_on_accept
+from menus import get_menu as get_cached_menu, get_all_menus as get_cached_menus
 
 # register blueprint and create schemas
 dining_halls_bp = Blueprint('dining_halls', __name__)
@@ -92,30 +106,50 @@ def create_dining_hall():
         return jsonify({"error": "Name is required"}), 400
 
     # Check if a dining hall with the same name already exists
-    existing_dining_hall = DiningHall.query.filter_by(name=name).first()
+    existing_dining_hall = find_first(DiningHall, name=name)
     if existing_dining_hall:
         return jsonify({"error": "Dining hall with the same name already exists"}), 409
 
     new_dining_hall = DiningHall(name=name)
     db.session.add(new_dining_hall)
-    db.session.commit()
+    commit()
 
     return dining_hall_schema.jsonify({"id": new_dining_hall.id, "message": "Dining hall created"}), 201
 
 # GET /api/v1/dining_halls: Retrieve a list of all dining halls
 @dining_halls_bp.route('/dining_halls', methods=['GET'])
+@coalesce
 def get_dining_halls():
     """
     Retrieve a list of all dining halls
     ---
     tags:
       - Dining Halls
+    produces:
+      - application/json
+      - application/msgpack
+      - application/cbor
     parameters:
       - name: name
         in: query
         type: string
         description: Filter by dining hall name
         example: "John Jay"
+      - name: ids
+        in: query
+        type: string
+        description: Comma-separated ids to fetch instead of filtering, the response is then {"data": [...], "missing": [...]} in the requested order
+        example: "2,1"
+      - name: fields
+        in: query
+        type: string
+        description: Comma-separated list of fields to return
+        example: "id,name"
+      - name: links
+        in: query
+        type: string
+        description: Set to "none" to omit the HATEOAS links
+        example: "none"
     responses:
       200:
         description: A list of dining halls
@@ -129,6 +163,9 @@ def get_dining_halls():
               name:
                 type: string
                 example: "John Jay"
+              dish_count:
+                type: integer
+                example: 42
               _links:
                 type: object
                 properties:
@@ -168,15 +205,37 @@ def get_dining_halls():
                       method:
                         type: string
                         example: "POST"
+      400:
+        description: Invalid fields, links or ids parameter
     """
+    try:
+        fields, links = parse_fieldset(DiningHallSchema)
+        ids = parse_ids()
+    except (FieldsetError, MultiGetError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Multi-get: one IN query per chunk of ids (or the catalog snapshot), in the requested order
+    if ids is not None:
+        if CATALOG_SNAPSHOT_ENABLED:
+            catalog.ensure_fresh()
+            dining_halls, missing = get_many_cached(ids, catalog.get_dining_hall)
+            serializer = get_list_schema(DiningHallSchema, fields, links)
+        else:
+            serializer = list_serializer(DiningHallSchema, fields, links)
+            dining_halls, missing = get_many(rows_by_ids(DiningHall, DiningHallSchema, fields, links), ids)
+        return respond({"data": serializer.dump(dining_halls), "missing": missing}), 200
+
     name_filter = request.args.get('name')
 
-    query = db.session.query(DiningHall)
-    if name_filter:
-        query = query.filter(DiningHall.name.like(f"%{name_filter}%"))
+    # Serve from the in-memory catalog snapshot when it is enabled
+    if CATALOG_SNAPSHOT_ENABLED:
+        catalog.ensure_fresh()
+        dining_halls = catalog.find_dining_halls(name_filter)
+        return respond(get_list_schema(DiningHallSchema, fields, links).dump(dining_halls)), 200
 
-    dining_halls = query.all()
-    return dining_halls_schema.jsonify(dining_halls), 200
+    filters = [("name", "like", contains_pattern(name_filter))] if name_filter else []
+    dining_halls = list_rows(DiningHall, DiningHallSchema, fields, links, filters)
+    return respond(list_serializer(DiningHallSchema, fields, links).dump(dining_halls)), 200
 
 # DELETE /api/v1/dining_halls/{id}: Delete a dining hall
 @dining_halls_bp.route('/dining_halls/<int:id>', methods=['DELETE'])
@@ -192,6 +251,11 @@ def delete_dining_hall(id):
         required: true
         type: integer
         description: The ID of the dining hall to delete
+      - name: async
+        in: query
+        type: boolean
+        description: Delete the dining hall and its stations and dishes in the background
+        example: true
     responses:
       200:
         description: Dining hall deleted
@@ -203,32 +267,193 @@ def delete_dining_hall(id):
             message:
               type: string
               example: "Dining hall deleted"
+      202:
+        description: Background job deleting the dining hall queued (see /api/v1/jobs/{id})
       404:
         description: Dining hall not found
     """
-    dining_hall = DiningHall.query.get(id)
+    dining_hall = db.session.get(DiningHall, id)
     if not dining_hall:
         return jsonify({"error": "Dining hall not found"}), 404
 
-    db.session.delete(dining_hall)
-    db.session.commit()
+    # Very large dining halls can be purged in batches by a background job
+    if request.args.get('async') == 'true':
+        return start_job('purge_dining_hall', dining_hall_id=id)
+
+    # Delete the dishes and stations of the dining hall with it
+    delete_dining_hall_cascade(dining_hall)
+    commit()
 
     return dining_hall_schema.jsonify({"id": dining_hall.id, "message": "Dining hall deleted"}), 200
 
+# GET /api/v1/dining_halls/menu: Retrieve the compact menu of every dining hall
+@dining_halls_bp.route('/dining_halls/menu', methods=['GET'])
+@coalesce
+def get_all_menus():
+    """
+    Retrieve the compact menu (stations and dish names) of every dining hall
+    ---
+    tags:
+      - Dining Halls
+    produces:
+      - application/json
+      - application/msgpack
+      - application/cbor
+    responses:
+      200:
+        description: A list of dining halls with their stations and dishes
+        schema:
+          type: array
+          items:
+            properties:
+              id:
+                type: integer
+                example: 3
+              name:
+                type: string
+                example: "John Jay"
+              stations:
+                type: array
+                items:
+                  properties:
+                    id:
+                      type: integer
+                      example: 10
+                    name:
+                      type: string
+                      example: "Grill Station"
+                    dishes:
+                      type: array
+                      items:
+                        properties:
+                          id:
+                            type: integer
+                            example: 1
+                          name:
+                            type: string
+                            example: "Spaghetti Carbonara"
+    """
+    mimetype = negotiated_mimetype()
+    return vary_on_accept(current_app.response_class(get_cached_menus(mimetype), mimetype=mimetype)), 200
+
+# GET /api/v1/dining_halls/{id}/menu: Retrieve the stations of a dining hall with their dishes
+@dining_halls_bp.route('/dining_halls/<int:id>/menu', methods=['GET'])
+@coalesce
+def get_menu(id):
+    """
+    Retrieve the menu of a dining hall (its stations with their dishes) in a single call
+    ---
+    tags:
+      - Dining Halls
+    produces:
+      - application/json
+      - application/msgpack
+      - application/cbor
+    parameters:
+      - name: id
+        in: path
+        type: integer
+        required: true
+        description: ID of the dining hall
+        example: 1
+    responses:
+      200:
+        description: The dining hall with its stations and dishes
+        schema:
+          properties:
+            id:
+              type: integer
+              example: 3
+            name:
+              type: string
+              example: "John Jay"
+            stations:
+              type: array
+              items:
+                properties:
+                  id:
+                    type: integer
+                    example: 10
+                  name:
+                    type: string
+                    example: "Grill Station"
+                  dishes:
+                    type: array
+                    items:
+                      properties:
+                        id:
+                          type: integer
+                          example: 1
+                        name:
+                          type: string
+                          example: "Spaghetti Carbonara"
+                        description:
+                          type: string
+                          example: "Classic Italian pasta with egg, cheese, pancetta, and pepper."
+            _links:
+              type: object
+              properties:
+                self:
+                  type: object
+                  properties:
+                    href:
+                      type: string
+                      example: "/api/v1/dining_halls/3/menu"
+                    method:
+                      type: string
+                      example: "GET"
+                get_stations:
+                  type: object
+                  properties:
+                    href:
+                      type: string
+                      example: "/api/v1/dining_halls/3/stations"
+                    method:
+                      type: string
+                      example: "GET"
+      404:
+        description: Dining hall not found
+    """
+    mimetype = negotiated_mimetype()
+    menu = get_cached_menu(id, mimetype)
+    if menu is None:
+        return jsonify({"error": "Dining hall not found"}), 404
+    return vary_on_accept(current_app.response_class(menu, mimetype=mimetype)), 200
+
 # GET /api/v1/stations: Retrieve a list of all stations
 @dining_halls_bp.route('/stations', methods=['GET'])
+@coalesce
 def get_all_stations():
     """
     Retrieve a list of all stations
     ---
     tags:
       - Dining Halls
+    produces:
+      - application/json
+      - application/msgpack
+      - application/cbor
     parameters:
       - name: name
         in: query
         type: string
         description: Filter by station name
         example: "Grill"
+      - name: ids
+        in: query
+        type: string
+        description: Comma-separated ids to fetch instead of filtering, the response is then {"data": [...], "missing": [...]} in the requested order
+        example: "10,4"
+      - name: fields
+        in: query
+        type: string
+        description: Comma-separated list of fields to return
+        example: "id,name"
+      - name: links
+        in: query
+        type: string
+        description: Set to "none" to omit the HATEOAS links
+        example: "none"
     responses:
       200:
         description: A list of all stations
@@ -245,6 +470,9 @@ def get_all_stations():
               dining_hall_id:
                 type: integer
                 example: 2
+              dish_count:
+                type: integer
+                example: 12
               _links:
                 type: object
                 properties:
@@ -266,24 +494,51 @@ def get_all_stations():
                       method:
                         type: string
                         example: "POST"
+      400:
+        description: Invalid fields, links or ids parameter
     """
+    try:
+        fields, links = parse_fieldset(StationSchema)
+        ids = parse_ids()
+    except (FieldsetError, MultiGetError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Multi-get: one IN query per chunk of ids (or the catalog snapshot), in the requested order
+    if ids is not None:
+        if CATALOG_SNAPSHOT_ENABLED:
+            catalog.ensure_fresh()
+            stations, missing = get_many_cached(ids, catalog.get_station)
+            serializer = get_list_schema(StationSchema, fields, links)
+        else:
+            serializer = list_serializer(StationSchema, fields, links)
+            stations, missing = get_many(rows_by_ids(Station, StationSchema, fields, links), ids)
+        return respond({"data": serializer.dump(stations), "missing": missing}), 200
+
     name_filter = request.args.get('name')
 
-    query = db.session.query(Station)
-    if name_filter:
-        query = query.filter(Station.name.like(f"%{name_filter}%"))
+    # Serve from the in-memory catalog snapshot when it is enabled
+    if CATALOG_SNAPSHOT_ENABLED:
+        catalog.ensure_fresh()
+        stations = catalog.find_stations(name_filter)
+        return respond(get_list_schema(StationSchema, fields, links).dump(stations)), 200
 
-    stations = query.all()
-    return stations_schema.jsonify(stations), 200
+    filters = [("name", "like", contains_pattern(name_filter))] if name_filter else []
+    stations = list_rows(Station, StationSchema, fields, links, filters)
+    return respond(list_serializer(StationSchema, fields, links).dump(stations)), 200
 
 # GET /api/v1/dining_halls/{id}/stations: Retrieve all the stations within a specific dining hall
 @dining_halls_bp.route('/dining_halls/<int:id>/stations', methods=['GET'])
+@coalesce
 def get_stations(id):
     """
     Retrieve all stations within a specific dining hall
     ---
     tags:
       - Dining Halls
+    produces:
+      - application/json
+      - application/msgpack
+      - application/cbor
     parameters:
       - name: id
         in: path
@@ -296,6 +551,16 @@ def get_stations(id):
         type: string
         description: Filter by station name
         example: "Grill Station"
+      - name: fields
+        in: query
+        type: string
+        description: Comma-separated list of fields to return
+        example: "id,name"
+      - name: links
+        in: query
+        type: string
+        description: Set to "none" to omit the HATEOAS links
+        example: "none"
     responses:
       200:
         description: A list of stations within the specified dining hall
@@ -312,6 +577,9 @@ def get_stations(id):
               dining_hall_id:
                 type: integer
                 example: 3
+              dish_count:
+                type: integer
+                example: 12
               _links:
                 type: object
                 properties:
@@ -333,27 +601,43 @@ def get_stations(id):
                       method:
                         type: string
                         example: "POST"
+      400:
+        description: Invalid fields or links parameter
       404:
         description: Dining hall not found
     """
-    # Query for the dining hall to ensure it exists
-    dining_hall = DiningHall.query.get(id)
-    if not dining_hall:
-        return jsonify({"error": "Dining hall not found"}), 404
+    try:
+        fields, links = parse_fieldset(StationSchema)
+    except FieldsetError as e:
+        return jsonify({"error": str(e)}), 400
 
     # Get the station name filter from the query parameters
     name_filter = request.args.get('name')
 
+    # Serve from the in-memory catalog snapshot when it is enabled
+    if CATALOG_SNAPSHOT_ENABLED:
+        catalog.ensure_fresh()
+        if not catalog.get_dining_hall(id):
+            return jsonify({"error": "Dining hall not found"}), 404
+        stations = catalog.find_stations(name_filter, dining_hall_id=id)
+        return respond(get_list_schema(StationSchema, fields, links).dump(stations)), 200
+
+    # Query for the dining hall to ensure it exists
+    dining_hall = db.session.get(DiningHall, id)
+    if not dining_hall:
+        return jsonify({"error": "Dining hall not found"}), 404
+
     # Retrieve stations with optional filtering by name
-    query = Station.query.filter_by(dining_hall_id=id)
+    filters = [("dining_hall_id", "eq", id)]
     if name_filter:
-        query = query.filter(Station.name.like(f"%{name_filter}%"))
+        filters.append(("name", "like", contains_pattern(name_filter)))
 
-    stations = query.all()
-    return stations_schema.jsonify(stations), 200
+    stations = list_rows(Station, StationSchema, fields, links, filters)
+    return respond(list_serializer(StationSchema, fields, links).dump(stations)), 200
     
 # POST /api/v1/dining_halls/{id}/stations: Create a new station to a particular dining hall
 @dining_halls_bp.route('/dining_halls/<int:id>/stations', methods=['POST'])
+@group_commit
 def create_station(id):
     """
     Create a new station to a specific dining hall
@@ -417,9 +701,8 @@ def create_station(id):
       409:
         description: Station with the same name already exists for this dining hall
     """
-    # Verify if the dining hall exists
-    dining_hall = DiningHall.query.get(id)
-    if not dining_hall:
+    # Verify if the dining hall exists (with the cached reference data, no query)
+    if not reference_data.dining_hall_exists(id):
         return jsonify({"error": "Dining hall not found"}), 404
 
     # Retrieve station data from request body
@@ -427,14 +710,15 @@ def create_station(id):
     name = data.get('name')
 
     # Check if the station with the same name already exists for this dining hall
-    existing_station = Station.query.filter_by(name=name, dining_hall_id=id).first()
+    existing_station = find_first(Station, name=name, dining_hall_id=id)
     if existing_station:
         return jsonify({"error": "Station with the same name already exists for this dining hall"}), 409
 
     # Create the new station
     new_station = Station(name=name, dining_hall_id=id)
     db.session.add(new_station)
-    db.session.commit()
+    if not commit_validated(lambda: reference_data.dining_hall_exists(id)):
+        return jsonify({"error": "Dining hall not found"}), 404
     return station_schema.jsonify({"id": new_station.id, "dining_hall_id": id, "message": "Station created"}), 201
 
 # DELETE /api/v1/dining_halls/{id}/stations/{station_id}: Delete a station within a specific dining hall
@@ -474,18 +758,20 @@ def delete_station(id, station_id):
       404:
         description: Dining hall or station not found
     """
-    # Verify that the dining hall exists
-    dining_hall = DiningHall.query.get(id)
-    if not dining_hall:
+    # Verify that the dining hall exists and holds the station (with the cached reference data)
+    if not reference_data.dining_hall_exists(id):
         return jsonify({"error": "Dining hall not found"}), 404
+    if reference_data.station_dining_hall(station_id) != id:
+        return jsonify({"error": "Station not found"}), 404
 
-    # Find the station to delete within the specified dining hall
-    station = Station.query.filter_by(id=station_id, dining_hall_id=id).first()
-    if not station:
+    # Load the station to delete
+    station = db.session.get(Station, station_id)
+    if not station or station.dining_hall_id != id:
         return jsonify({"error": "Station not found"}), 404
 
-    # Delete the station
-    db.session.delete(station)
-    db.session.commit()
+    # Delete the station with its dishes and remove them from the dining hall's count
+    delete_station_cascade(station)
+    adjust_dish_counts(id, None, -station.dish_count)
+    commit()
 
     return station_schema.jsonify({"id": station_id, "dining_hall_id": id, "message": "Station deleted"}), 200
\ No newline at end of file
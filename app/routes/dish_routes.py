@@ -1,6 +1,20 @@
-from flask import Blueprint, jsonify, request
-from models import Dish, DiningHall, Station, db
+from flask import Blueprint, current_app, jsonify, request
+from models import Dish, db
 from schemas import DishSchema
+from counts import adjust_dish_counts
+from routes.job_routes import start_job
+from singleflight import coalesce
+from transactions import commit
+from referencedata import commit_validated, reference_data
+from sharding import crosses_shards
+from groupcommit import group_commit
+from catalog import CATALOG_SNAPSHOT_ENABLED, catalog
+from autocomplete import autocomplete
+from fieldsets import FieldsetError, parse_fieldset, get_list_schema
+from rows import list_serializer
+from statements import contains_pattern, find_first, list_rows, rows_by_ids
+from multiget import MultiGetError, parse_ids, get_many, get_many_cached
+from negotiation import respond
 
 # register blueprint and create schemas
 dishes_bp = Blueprint('dishes', __name__)
@@ -9,6 +23,7 @@ dishes_schema = DishSchema(many=True)
 
 # POST /api/v1/dishes: Create a new dish
 @dishes_bp.route('/dishes', methods=['POST'])
+@group_commit
 def create_dish():
     """
     Create a new dish
@@ -111,35 +126,71 @@ def create_dish():
     dining_hall_id = data.get('dining_hall_id')
     station_id = data.get('station_id')
 
-    # Validate dining hall and station
-    dining_hall = DiningHall.query.get(dining_hall_id)
-    if not dining_hall:
+    # Validate dining hall and station with the cached reference data (no query)
+    if not reference_data.dining_hall_exists(dining_hall_id):
         return jsonify({"error": "Invalid dining_hall_id"}), 400
 
-    station = Station.query.get(station_id)
-    if not station or station.dining_hall_id != dining_hall_id:
+    if reference_data.station_dining_hall(station_id) != dining_hall_id:
         return jsonify({"error": "Invalid station_id for this dining hall"}), 400
 
     # Check if a dish with the same name already exists for this dining hall and station
-    existing_dish = Dish.query.filter_by(name=name, dining_hall_id=dining_hall_id, station_id=station_id).first()
+    existing_dish = find_first(Dish, name=name, dining_hall_id=dining_hall_id, station_id=station_id)
     if existing_dish:
         return jsonify({"error": "Dish with the same name already exists for this dining hall and station"}), 409
 
     # Create the new dish
     new_dish = Dish(**data)
     db.session.add(new_dish)
-    db.session.commit()
+    adjust_dish_counts(dining_hall_id, station_id, 1)
+    if not commit_validated(lambda: reference_data.station_dining_hall(station_id) == dining_hall_id):
+        return jsonify({"error": "Invalid station_id for this dining hall"}), 400
     
     return dish_schema.jsonify({"id": new_dish.id, "message": "Dish created"}), 201
 
+# POST /api/v1/dishes/import: Create many dishes in a background job
+@dishes_bp.route('/dishes/import', methods=['POST'])
+def import_dishes():
+    """
+    Create many dishes in a background job
+    ---
+    tags:
+      - Dishes
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: array
+          items:
+            $ref: '#/definitions/Dish'
+    responses:
+      202:
+        description: Import job queued, invalid dishes are reported in the job result
+        schema:
+          $ref: '#/definitions/Job'
+      400:
+        description: Body must be a list of dishes
+      503:
+        description: Too many background jobs queued
+    """
+    dishes = request.get_json()
+    if not isinstance(dishes, list):
+        return jsonify({"error": "Body must be a list of dishes"}), 400
+    return start_job('import_dishes', dishes=dishes)
+
 # GET /api/v1/dishes: Retrieve a list of all dishes
 @dishes_bp.route('/dishes', methods=['GET'])
+@coalesce
 def get_dishes():
     """
     Retrieve a list of all dishes
     ---
     tags:
       - Dishes
+    produces:
+      - application/json
+      - application/msgpack
+      - application/cbor
     parameters:
       - name: name
         in: query
@@ -166,6 +217,21 @@ def get_dishes():
         type: integer
         description: Limit on the number of dishes returned (default 10)
         example: 5
+      - name: ids
+        in: query
+        type: string
+        description: Comma-separated ids to fetch instead of filtering, the response is then {"data": [...], "missing": [...]} in the requested order
+        example: "3,1,2"
+      - name: fields
+        in: query
+        type: string
+        description: Comma-separated list of fields to return
+        example: "id,name"
+      - name: links
+        in: query
+        type: string
+        description: Set to "none" to omit the HATEOAS links
+        example: "none"
     responses:
       200:
         description: A list of dishes
@@ -236,7 +302,26 @@ def get_dishes():
                       method:
                         type: string
                         example: "PUT"
+      400:
+        description: Invalid fields, links or ids parameter
     """
+    try:
+        fields, links = parse_fieldset(DishSchema)
+        ids = parse_ids()
+    except (FieldsetError, MultiGetError) as e:
+        return jsonify({"error": str(e)}), 400
+
+    # Multi-get: one IN query per chunk of ids (or the catalog snapshot), in the requested order
+    if ids is not None:
+        if CATALOG_SNAPSHOT_ENABLED:
+            catalog.ensure_fresh()
+            dishes, missing = get_many_cached(ids, catalog.get_dish)
+            serializer = get_list_schema(DishSchema, fields, links)
+        else:
+            serializer = list_serializer(DishSchema, fields, links)
+            dishes, missing = get_many(rows_by_ids(Dish, DishSchema, fields, links), ids)
+        return respond({"data": serializer.dump(dishes), "missing": missing}), 200
+
     name_filter = request.args.get('name')
     description_filter = request.args.get('description')
     dining_hall_filter = request.args.get('dining_hall_id')
@@ -245,27 +330,97 @@ def get_dishes():
     # set limit to 10 if not specified
     limit = request.args.get('limit', default=10, type=int)
 
-    query = db.session.query(Dish)
+    # Serve from the in-memory catalog snapshot when it is enabled
+    if CATALOG_SNAPSHOT_ENABLED:
+        catalog.ensure_fresh()
+        dishes = catalog.find_dishes(name_filter, description_filter, dining_hall_filter, station_filter, limit)
+        return respond(get_list_schema(DishSchema, fields, links).dump(dishes)), 200
+
+    # The statement is prebuilt once per combination of filters, only their values change
+    filters = []
     if name_filter:
-        query = query.filter(Dish.name.like(f"%{name_filter}%"))
+        filters.append(("name", "like", contains_pattern(name_filter)))
     if description_filter:
-        query = query.filter(Dish.description.like(f"%{description_filter}%"))  
+        filters.append(("description", "like", contains_pattern(description_filter)))
     if dining_hall_filter:
-        query = query.filter(Dish.dining_hall_id == dining_hall_filter)
+        filters.append(("dining_hall_id", "eq", dining_hall_filter))
     if station_filter:
-        query = query.filter(Dish.station_id == station_filter)
-    
-    dishes = query.limit(limit).all()
-    return dishes_schema.jsonify(dishes), 200
+        filters.append(("station_id", "eq", station_filter))
+
+    dishes = list_rows(Dish, DishSchema, fields, links, filters, limit)
+    return respond(list_serializer(DishSchema, fields, links).dump(dishes)), 200
+
+# GET /api/v1/dishes/autocomplete: Suggest dish names for a partially typed query
+@dishes_bp.route('/dishes/autocomplete', methods=['GET'])
+def autocomplete_dishes():
+    """
+    Suggest dish names starting with a partially typed query, tolerating typos
+    ---
+    tags:
+      - Dishes
+    parameters:
+      - name: q
+        in: query
+        type: string
+        required: true
+        description: The start of the dish name, up to 1 typo for 3-5 characters and 2 beyond
+        example: "spagh"
+      - name: dining_hall_id
+        in: query
+        type: integer
+        description: Only suggest dishes of this dining hall
+        example: 2
+      - name: limit
+        in: query
+        type: integer
+        description: Maximum number of suggestions (default 10, at most 50)
+        example: 5
+    responses:
+      200:
+        description: Suggestions, exact prefix matches first
+        schema:
+          type: array
+          items:
+            properties:
+              id:
+                type: integer
+                example: 3
+              name:
+                type: string
+                example: "Spaghetti Carbonara"
+              dining_hall_id:
+                type: integer
+                example: 2
+              distance:
+                type: integer
+                description: Number of typos corrected
+                example: 0
+      400:
+        description: Missing q parameter
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({"error": "Missing q parameter"}), 400
+    dining_hall_id = request.args.get('dining_hall_id', type=int)
+    limit = min(max(request.args.get('limit', default=10, type=int), 1), 50)
+
+    autocomplete.start(current_app._get_current_object())
+    autocomplete.ensure_fresh()
+    return jsonify(autocomplete.suggest(query, dining_hall_id, limit)), 200
 
 # GET /api/v1/dishes/{id}: Retrieve dish details
 @dishes_bp.route('/dishes/<int:id>', methods=['GET'])
+@coalesce
 def get_dish(id):
     """
     Retrieve detailed information about a specific dish
     ---
     tags:
       - Dishes
+    produces:
+      - application/json
+      - application/msgpack
+      - application/cbor
     parameters:
       - name: id
         in: path
@@ -344,10 +499,14 @@ def get_dish(id):
       404:
         description: Dish not found
     """
-    dish = db.session.query(Dish).get(id)
+    if CATALOG_SNAPSHOT_ENABLED:
+        catalog.ensure_fresh()
+        dish = catalog.get_dish(id)
+    else:
+        dish = db.session.get(Dish, id)
     if not dish:
         return jsonify({"error": "Dish not found"}), 404
-    return dish_schema.jsonify(dish), 200
+    return respond(dish_schema.dump(dish)), 200
 
 # PUT /api/v1/dishes/{id}: Update dish details
 @dishes_bp.route('/dishes/<int:id>', methods=['PUT'])
@@ -442,13 +601,17 @@ def update_dish(id):
                     method:
                       type: string
                       example: "PUT"
+      400:
+        description: Invalid station_id for this dining hall, or a dining hall on another shard
       404:
         description: Dish not found
     """
     updated_data = request.json
-    dish = db.session.query(Dish).get(id)
+    dish = db.session.get(Dish, id)
     if not dish:
         return jsonify({"error": "Dish not found"}), 404
+
+    old_dining_hall_id, old_station_id = dish.dining_hall_id, dish.station_id
     if 'name' in updated_data:
         dish.name = updated_data['name']
     if 'description' in updated_data:
@@ -459,7 +622,23 @@ def update_dish(id):
         dish.dietary_info = updated_data['dietary_info']
     if 'dining_hall_id' in updated_data:
         dish.dining_hall_id = updated_data['dining_hall_id']
-    db.session.commit()
+    if 'station_id' in updated_data:
+        dish.station_id = updated_data['station_id']
+
+    # Move the dish from the counts of its old station and dining hall to the new ones
+    moved_hall = dish.dining_hall_id != old_dining_hall_id
+    moved_station = dish.station_id != old_station_id
+    if moved_hall or moved_station:
+        if reference_data.station_dining_hall(dish.station_id) != dish.dining_hall_id:
+            db.session.rollback()
+            return jsonify({"error": "Invalid station_id for this dining hall"}), 400
+        if moved_hall and crosses_shards(db.session(), old_dining_hall_id, dish.dining_hall_id):
+            db.session.rollback()
+            return jsonify({"error": "Cannot move a dish to a dining hall on another shard"}), 400
+
+        adjust_dish_counts(old_dining_hall_id if moved_hall else None, old_station_id if moved_station else None, -1)
+        adjust_dish_counts(dish.dining_hall_id if moved_hall else None, dish.station_id if moved_station else None, 1)
+    commit()
     return dish_schema.jsonify({"id": dish.id, "message": "Dish updated"}), 200
 
 # DELETE /api/v1/dishes/{id}: Delete a dish
@@ -539,9 +718,10 @@ def delete_dish(id):
       404:
         description: Dish not found
     """
-    dish = db.session.query(Dish).get(id)
+    dish = db.session.get(Dish, id)
     if not dish:
         return jsonify({"error": "Dish not found"}), 404
     db.session.delete(dish)
-    db.session.commit()
+    adjust_dish_counts(dish.dining_hall_id, dish.station_id, -1)
+    commit()
     return dish_schema.jsonify({"id": dish.id, "message": "Dish deleted"}), 200
\ No newline at end of file
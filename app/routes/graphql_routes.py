@@ -2,7 +2,9 @@ from flask import Blueprint
 import graphene
 from graphene_sqlalchemy import SQLAlchemyObjectType
 from flask_graphql import GraphQLView
-from models import Dish
+from models import Dish, DiningHall, Station
+from tracing import graphql_middleware, span
+from projection import project
 
 # register blueprint and create schemas
 graphql_bp = Blueprint('graphql', __name__)
@@ -11,19 +13,50 @@ class DishType(SQLAlchemyObjectType):
     class Meta:
         model = Dish
 
+class StationType(SQLAlchemyObjectType):
+    class Meta:
+        model = Station
+
+class DiningHallType(SQLAlchemyObjectType):
+    class Meta:
+        model = DiningHall
+
 class Query(graphene.ObjectType):
     all_dishes = graphene.List(DishType, name=graphene.String())
+    all_stations = graphene.List(StationType, name=graphene.String(), dining_hall_id=graphene.Int())
+    all_dining_halls = graphene.List(DiningHallType, name=graphene.String())
 
     def resolve_all_dishes(self, info, name=None):
-        # Query all dishes
-        query = DishType.get_query(info)
+        # Query all dishes, loading only the selected columns and relationships
+        query = project(DishType.get_query(info), Dish, info)
+
+        if name:
+            query = query.filter(Dish.name.contains(name, autoescape=True))
+
+        return query.all()
+
+    def resolve_all_stations(self, info, name=None, dining_hall_id=None):
+        # Query all stations (dishCount is read from the maintained aggregate)
+        query = project(StationType.get_query(info), Station, info)
+
+        if name:
+            query = query.filter(Station.name.contains(name, autoescape=True))
+        if dining_hall_id:
+            query = query.filter(Station.dining_hall_id == dining_hall_id)
+
+        return query.all()
+
+    def resolve_all_dining_halls(self, info, name=None):
+        # Query all dining halls (dishCount is read from the maintained aggregate)
+        query = project(DiningHallType.get_query(info), DiningHall, info)
 
         if name:
-            query = query.filter(Dish.name.like(f"%{name}%"))
+            query = query.filter(DiningHall.name.contains(name, autoescape=True))
 
         return query.all()
 
 # GraphQL endpoint for dishes
 @graphql_bp.route('/api/v1/graphql', methods=['GET', 'POST'])
 def graphql_view():
-    return GraphQLView.as_view('graphql', schema=graphene.Schema(query=Query), graphiql=True)()
\ No newline at end of file
+    with span("graphql execute"):
+        return GraphQLView.as_view('graphql', schema=graphene.Schema(query=Query), graphiql=True, middleware=graphql_middleware())()
\ No newline at end of file
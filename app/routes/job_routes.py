@@ -0,0 +1,147 @@
+from flask import Blueprint, current_app, jsonify, url_for
+from models import Job
+from schemas import JobSchema
+from jobs import JobQueueFull, submit, cancel
+from transactions import commits_deferred
+
+# register blueprint and create schemas
+jobs_bp = Blueprint('jobs', __name__)
+job_schema = JobSchema()
+
+# Queue a background job and return 202 with its status resource
+def start_job(kind, **params):
+    if commits_deferred():
+        # Queuing a job commits its row, which would commit the caller's transaction early
+        return jsonify({"error": "Background jobs cannot be started inside an atomic batch"}), 400
+    try:
+        job = submit(current_app._get_current_object(), kind, **params)
+    except JobQueueFull:
+        return jsonify({"error": "Too many background jobs queued"}), 503, {"Retry-After": "30"}
+    return job_schema.jsonify(job), 202, {"Location": url_for("jobs.get_job", id=job.id)}
+
+# GET /api/v1/jobs/{id}: Retrieve the status of a background job
+@jobs_bp.route('/jobs/<int:id>', methods=['GET'])
+def get_job(id):
+    """
+    Retrieve the status and progress of a background job
+    ---
+    tags:
+      - Jobs
+    parameters:
+      - name: id
+        in: path
+        required: true
+        type: integer
+        description: ID of the job
+        example: 7
+    responses:
+      200:
+        description: A job
+        schema:
+          id: Job
+          properties:
+            id:
+              type: integer
+              example: 7
+            kind:
+              type: string
+              example: "import_dishes"
+            status:
+              type: string
+              example: "running"
+            progress:
+              type: integer
+              example: 500
+            total:
+              type: integer
+              example: 2000
+            result:
+              type: object
+            error:
+              type: string
+            created_at:
+              type: string
+              example: "2024-11-20T18:03:12"
+            started_at:
+              type: string
+              example: "2024-11-20T18:03:12"
+            finished_at:
+              type: string
+            _links:
+              type: object
+              properties:
+                self:
+                  type: object
+                  properties:
+                    href:
+                      type: string
+                      example: "/api/v1/jobs/7"
+                    method:
+                      type: string
+                      example: "GET"
+                cancel:
+                  type: object
+                  properties:
+                    href:
+                      type: string
+                      example: "/api/v1/jobs/7"
+                    method:
+                      type: string
+                      example: "DELETE"
+      404:
+        description: Job not found
+    """
+    job = Job.query.get(id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return job_schema.jsonify(job), 200
+
+# DELETE /api/v1/jobs/{id}: Cancel a background job
+@jobs_bp.route('/jobs/<int:id>', methods=['DELETE'])
+def cancel_job(id):
+    """
+    Cancel a queued or running background job
+    ---
+    tags:
+      - Jobs
+    parameters:
+      - name: id
+        in: path
+        required: true
+        type: integer
+        description: ID of the job
+        example: 7
+    responses:
+      200:
+        description: Cancellation requested, running jobs stop at their next progress report
+        schema:
+          $ref: '#/definitions/Job'
+      404:
+        description: Job not found
+      409:
+        description: Job already finished
+    """
+    job = Job.query.get(id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    if not cancel(job):
+        return jsonify({"error": "Job already finished"}), 409
+    return job_schema.jsonify(job), 200
+
+# POST /api/v1/jobs/reconcile_dish_counts: Recompute the dish counts of every station and dining hall
+@jobs_bp.route('/jobs/reconcile_dish_counts', methods=['POST'])
+def reconcile_dish_counts():
+    """
+    Recompute the dish counts of every station and dining hall in the background
+    ---
+    tags:
+      - Jobs
+    responses:
+      202:
+        description: Job queued
+        schema:
+          $ref: '#/definitions/Job'
+      503:
+        description: Too many background jobs queued
+    """
+    return start_job('reconcile_dish_counts')
\ No newline at end of file
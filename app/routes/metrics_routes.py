@@ -0,0 +1,21 @@
+from flask import Blueprint, current_app
+from metrics import render
+
+# register blueprint
+metrics_bp = Blueprint('metrics', __name__)
+
+# GET /metrics: Export service metrics in the Prometheus text format
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Export service metrics in the Prometheus text format
+    ---
+    tags:
+      - Metrics
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Metrics in the Prometheus text exposition format
+    """
+    return current_app.response_class(render(), mimetype="text/plain; version=0.0.4"), 200
\ No newline at end of file
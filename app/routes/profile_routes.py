@@ -0,0 +1,79 @@
+import os
+from datetime import datetime
+from flask import Blueprint, jsonify, send_from_directory, url_for
+from profiling import PROFILE_DIR, PROFILE_ENABLED, PROFILE_SUFFIXES, TOKEN_HEADER, authorized
+
+# register blueprint
+profiles_bp = Blueprint('profiles', __name__)
+
+@profiles_bp.before_request
+def require_token():
+    if not PROFILE_ENABLED:
+        return jsonify({"error": "Profiling is disabled"}), 404
+    if not authorized():
+        return jsonify({"error": f"A valid {TOKEN_HEADER} header is required"}), 403
+
+# GET /admin/profiles: List the captured request profiles
+@profiles_bp.route('/admin/profiles', methods=['GET'])
+def list_profiles():
+    """
+    List the captured request profiles, newest first
+    ---
+    tags:
+      - Admin
+    parameters:
+      - name: X-Profile-Token
+        in: header
+        type: string
+        required: true
+    responses:
+      200:
+        description: Profile files with their download links
+      403:
+        description: Missing or invalid token
+      404:
+        description: Profiling is disabled
+    """
+    names = [name for name in os.listdir(PROFILE_DIR) if name.endswith(PROFILE_SUFFIXES)] if os.path.isdir(PROFILE_DIR) else []
+    profiles = []
+    for name in sorted(names, reverse=True):
+        stat = os.stat(os.path.join(PROFILE_DIR, name))
+        profiles.append({
+            "name": name,
+            "size": stat.st_size,
+            "created_at": datetime.utcfromtimestamp(stat.st_mtime),
+            "_links": {"download": {"href": url_for("profiles.get_profile", name=name), "method": "GET"}},
+        })
+    return jsonify(profiles), 200
+
+# GET /admin/profiles/{name}: Download a profile (collapsed stacks or speedscope JSON)
+@profiles_bp.route('/admin/profiles/<name>', methods=['GET'])
+def get_profile(name):
+    """
+    Download a captured profile, open .speedscope.json files in https://www.speedscope.app
+    and render .collapsed files with flamegraph.pl
+    ---
+    tags:
+      - Admin
+    parameters:
+      - name: X-Profile-Token
+        in: header
+        type: string
+        required: true
+      - name: name
+        in: path
+        type: string
+        required: true
+        example: "20241120T180312123456-dishes-get_dishes.speedscope.json"
+    responses:
+      200:
+        description: The profile file
+      403:
+        description: Missing or invalid token
+      404:
+        description: Profile not found
+    """
+    if not name.endswith(PROFILE_SUFFIXES):
+        return jsonify({"error": "Profile not found"}), 404
+    # send_from_directory rejects names escaping the directory
+    return send_from_directory(os.path.abspath(PROFILE_DIR), name, as_attachment=True)
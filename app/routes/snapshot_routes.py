@@ -0,0 +1,77 @@
+from flask import Blueprint, jsonify
+from snapshots import ALL_MENUS, SNAPSHOT_ENABLED, send_snapshot
+
+# register blueprint
+snapshots_bp = Blueprint('snapshots', __name__)
+
+@snapshots_bp.before_request
+def require_snapshots():
+    if not SNAPSHOT_ENABLED:
+        return jsonify({"error": "Menu snapshots are disabled"}), 404
+
+# GET /menus/all.json: Pre-rendered compact menu of every dining hall
+@snapshots_bp.route('/menus/all.json', methods=['GET'])
+def get_all_menus_snapshot():
+    """
+    Retrieve the pre-rendered compact menu of every dining hall, served from disk without a database query
+    ---
+    tags:
+      - Snapshots
+    parameters:
+      - name: If-None-Match
+        in: header
+        type: string
+        required: false
+      - name: Accept-Encoding
+        in: header
+        type: string
+        required: false
+        example: "gzip"
+    responses:
+      200:
+        description: Same document as /api/v1/dining_halls/menu, as of the last publication
+      304:
+        description: Not modified (strong ETag match)
+      404:
+        description: Snapshots are disabled or not published yet
+    """
+    response = send_snapshot(ALL_MENUS)
+    if response is None:
+        return jsonify({"error": "Menu snapshot not found"}), 404
+    return response
+
+# GET /menus/{id}.json: Pre-rendered menu of a dining hall
+@snapshots_bp.route('/menus/<int:id>.json', methods=['GET'])
+def get_menu_snapshot(id):
+    """
+    Retrieve the pre-rendered menu of a dining hall, served from disk without a database query
+    ---
+    tags:
+      - Snapshots
+    parameters:
+      - name: id
+        in: path
+        type: integer
+        required: true
+        example: 2
+      - name: If-None-Match
+        in: header
+        type: string
+        required: false
+      - name: Accept-Encoding
+        in: header
+        type: string
+        required: false
+        example: "gzip"
+    responses:
+      200:
+        description: Same document as /api/v1/dining_halls/{id}/menu, as of the last publication
+      304:
+        description: Not modified (strong ETag match)
+      404:
+        description: Dining hall not found, or snapshots are disabled
+    """
+    response = send_snapshot(str(id))
+    if response is None:
+        return jsonify({"error": "Menu snapshot not found"}), 404
+    return response
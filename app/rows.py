@@ -0,0 +1,88 @@
+import os
+import re
+from functools import lru_cache
+from operator import attrgetter
+from flask import url_for
+from sqlalchemy import select
+from fieldsets import HIDDEN_FIELDS, LINK_COLUMNS, apply_fieldset, get_list_schema
+
+# Serve the list endpoints from plain row tuples instead of ORM instances (ROW_FAST_PATH=false disables it)
+ROW_FAST_PATH_ENABLED = os.getenv("ROW_FAST_PATH", "true").lower() == "true"
+
+# Rendered in place of each "<attribute>" of a link so the rest of the URL can be built once
+_SENTINEL = 987654321000
+
+# Select only the columns the response needs as plain row tuples: no identity map, no
+# attribute instrumentation. The id is always selected, rows are merged across shards by it.
+def select_rows(model, schema_cls, fields, links):
+    names = list(fields) if fields else [name for name in schema_cls._declared_fields if name not in HIDDEN_FIELDS]
+    if links:
+        names.extend(LINK_COLUMNS[schema_cls.__name__])
+    names.append("id")
+    return select(*(getattr(model, name) for name in dict.fromkeys(names)))
+
+# A URL of the schema's Hyperlinks split into literal parts and row attribute getters
+def _link_template(url_field):
+    values = {}
+    placeholders = {}
+    for i, (key, value) in enumerate(url_field.values.items()):
+        match = re.fullmatch(r"<(\w+)>", str(value))
+        if match:
+            values[key] = _SENTINEL + i
+            placeholders[str(_SENTINEL + i)] = attrgetter(match.group(1))
+        else:
+            values[key] = value
+    url = url_for(url_field.endpoint, **values)
+    if not placeholders:
+        return [url]
+    parts = re.split("(" + "|".join(placeholders) + ")", url)
+    return [placeholders.get(part, part) for part in parts if part]
+
+def _render(template, row):
+    return "".join(part if isinstance(part, str) else str(part(row)) for part in template)
+
+# Hand-built equivalent of get_list_schema(schema_cls, fields, links).dump for row tuples
+class RowSerializer:
+    def __init__(self, schema_cls, fields, links):
+        names = fields or [name for name in schema_cls._declared_fields if name not in HIDDEN_FIELDS]
+        self.getters = [(name, attrgetter(name)) for name in names]
+        self.links = None
+        if links:
+            hyperlinks = schema_cls._declared_fields["_links"].schema
+            self.links = [
+                (name, _link_template(link["href"]), link["method"])
+                for name, link in hyperlinks.items()
+            ]
+
+    def dump(self, rows):
+        getters = self.getters
+        if self.links is None:
+            return [{name: get(row) for name, get in getters} for row in rows]
+
+        items = []
+        for row in rows:
+            item = {name: get(row) for name, get in getters}
+            item["_links"] = {
+                name: {"href": _render(template, row), "method": method}
+                for name, template, method in self.links
+            }
+            items.append(item)
+        return items
+
+# Serializers are cached per field selection, the URL templates need an app context to be built
+@lru_cache(maxsize=128)
+def get_row_serializer(schema_cls, fields, links):
+    return RowSerializer(schema_cls, fields, links)
+
+# SELECT of a list endpoint: the columns as row tuples on the fast path, ORM instances restricted
+# to the requested fields otherwise (their results are read with .scalars())
+def list_select(model, schema_cls, fields, links):
+    if ROW_FAST_PATH_ENABLED:
+        return select_rows(model, schema_cls, fields, links)
+    return apply_fieldset(select(model), model, schema_cls, fields, links)
+
+# Serializer of the rows of list_select: a RowSerializer on the fast path, the marshmallow list schema otherwise
+def list_serializer(schema_cls, fields, links):
+    if ROW_FAST_PATH_ENABLED:
+        return get_row_serializer(schema_cls, fields, links)
+    return get_list_schema(schema_cls, fields, links)
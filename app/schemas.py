@@ -1,6 +1,7 @@
 from flask_marshmallow import Marshmallow
+import json
 from marshmallow import fields
-from models import Dish, DiningHall, Station
+from models import Dish, DiningHall, Station, Job
 
 ma = Marshmallow()
 
@@ -47,6 +48,7 @@ class DiningHallSchema(ma.SQLAlchemySchema):
 
     id = ma.auto_field()
     name = ma.auto_field()
+    dish_count = ma.auto_field(dump_only=True)
 
     # message field for non-GET requests
     message = fields.String(allow_none=True)
@@ -81,6 +83,7 @@ class StationSchema(ma.SQLAlchemySchema):
     id = ma.auto_field()
     name = ma.auto_field()
     dining_hall_id = ma.auto_field()
+    dish_count = ma.auto_field(dump_only=True)
 
     # message field for non-GET requests
     message = fields.String(allow_none=True)
@@ -99,4 +102,34 @@ class StationSchema(ma.SQLAlchemySchema):
             "href": ma.URLFor("dining_halls.create_station", values=dict(id="<dining_hall_id>")),
             "method": "POST"
         }
-    })
\ No newline at end of file
+    })
+
+class JobSchema(ma.SQLAlchemySchema):
+    class Meta:
+        model = Job
+
+    id = ma.auto_field()
+    kind = ma.auto_field()
+    status = ma.auto_field()
+    progress = ma.auto_field()
+    total = ma.auto_field()
+    result = fields.Method("get_result")
+    error = ma.auto_field()
+    created_at = ma.auto_field()
+    started_at = ma.auto_field()
+    finished_at = ma.auto_field()
+
+    # HATEOAS links
+    _links = ma.Hyperlinks({
+        "self": {
+            "href": ma.URLFor("jobs.get_job", values=dict(id="<id>")),
+            "method": "GET"
+        },
+        "cancel": {
+            "href": ma.URLFor("jobs.cancel_job", values=dict(id="<id>")),
+            "method": "DELETE"
+        }
+    })
+
+    def get_result(self, job):
+        return json.loads(job.result) if job.result else None
\ No newline at end of file
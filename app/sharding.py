@@ -0,0 +1,285 @@
+import os
+import threading
+from operator import attrgetter
+from flask_sqlalchemy.session import Session as FlaskSession
+from sqlalchemy import Column, Integer, BigInteger, String, MetaData, Table, event, func, insert, select, update
+from sqlalchemy.sql.dml import Insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+from sqlalchemy.sql.util import find_tables
+
+# Shard the catalog by dining hall: SHARD_URIS lists the shard databases as "name=uri" pairs, e.g.
+# "a=sqlite:///shard_a.db,b=sqlite:///shard_b.db". The main database (DB_* settings) stays the global
+# database holding the tables that are not per dining hall. Unset, everything lives in the main database.
+SHARD_URIS = {}
+for entry in filter(None, os.getenv("SHARD_URIS", "").split(",")):
+    name, _, uri = entry.partition("=")
+    SHARD_URIS[name.strip()] = uri.strip()
+SHARDING_ENABLED = bool(SHARD_URIS)
+SHARD_NAMES = sorted(SHARD_URIS)
+GLOBAL_SHARD = "global"
+
+# Number of ids a worker reserves at a time from the global id sequences
+ID_BLOCK_SIZE = int(os.getenv("SHARD_ID_BLOCK_SIZE", "100"))
+
+# Tables living in the global database, every other table is partitioned by dining hall
+GLOBAL_TABLES = {"change_sequence", "reference_version", "jobs", "id_sequences", "shard_assignments"}
+SHARDED_TABLES = {"dining_halls", "stations", "dishes", "tombstones"}
+# Tables whose ids are allocated globally, so a row can be found by id alone on any shard
+GLOBAL_ID_TABLES = {"dining_halls", "stations", "dishes"}
+
+# Bookkeeping tables of the sharding layer in the global database
+metadata = MetaData()
+id_sequences = Table(
+    "id_sequences", metadata,
+    Column("name", String(64), primary_key=True),
+    Column("value", BigInteger, nullable=False),
+)
+shard_assignments = Table(
+    "shard_assignments", metadata,
+    Column("dining_hall_id", Integer, primary_key=True),
+    Column("shard", String(64), nullable=False),
+)
+
+_assignments = {}
+_id_blocks = {}
+_lock = threading.Lock()
+
+# Where a new dining hall is placed. The choice is recorded in shard_assignments,
+# so adding a shard later does not move the existing dining halls.
+def _placement(dining_hall_id):
+    return SHARD_NAMES[dining_hall_id % len(SHARD_NAMES)]
+
+def _is_hall_key(column):
+    table = getattr(column, "table", None)
+    if table is None or getattr(table, "name", None) not in SHARDED_TABLES:
+        return False
+    return column.name == "dining_hall_id" or (table.name == "dining_halls" and column.name == "id")
+
+def _conjuncts(clause):
+    if isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+        for child in clause.clauses:
+            yield from _conjuncts(child)
+    elif clause is not None:
+        yield clause
+
+# Value of a bind parameter, given with the statement or (for a named bindparam()) at execution
+def _bound_value(bind, parameters):
+    if bind.value is None and isinstance(parameters, dict) and bind.key in parameters:
+        return parameters[bind.key]
+    return bind.effective_value
+
+# Dining hall ids a statement is restricted to by a top-level "dining_hall_id = x" or "IN (...)"
+# criterion, or None if it may touch any dining hall
+def _dining_hall_ids(statement, parameters=None):
+    if isinstance(statement, Insert):
+        # INSERT ... SELECT is restricted by its SELECT
+        statement = statement.select
+    whereclause = getattr(statement, "whereclause", None)
+    for clause in _conjuncts(whereclause):
+        if not isinstance(clause, BinaryExpression):
+            continue
+        column, value = clause.left, clause.right
+        if not _is_hall_key(column) or not isinstance(value, BindParameter):
+            continue
+        if clause.operator is operators.eq:
+            values = [_bound_value(value, parameters)]
+        elif clause.operator is operators.in_op:
+            values = _bound_value(value, parameters)
+        else:
+            continue
+        try:
+            return {int(v) for v in values}
+        except (TypeError, ValueError):
+            return None
+    return None
+
+# Flask-SQLAlchemy session routing each statement to the global database or to the shards.
+# Catalog rows go to the shard of their dining hall. Statements filtering on one or a few dining
+# halls run on their shards only, any other statement runs on every shard and the results are
+# concatenated (see merge_by_id for ordering and limiting them).
+class ShardedFlaskSession(ShardedSession, FlaskSession):
+    def __init__(self, db, **kwargs):
+        engines = db.engines
+        shards = {name: engines[name] for name in SHARD_NAMES}
+        shards[GLOBAL_SHARD] = engines[None]
+        super().__init__(
+            shard_chooser=self._choose_shard,
+            identity_chooser=self._choose_identity_shards,
+            execute_chooser=self._choose_execute_shards,
+            shards=shards,
+            db=db,
+            **kwargs,
+        )
+
+    def _global_engine(self):
+        return self.get_bind(shard_id=GLOBAL_SHARD)
+
+    # Shard of a dining hall, as recorded in shard_assignments (cached, assignments never change)
+    def shard_for(self, dining_hall_id):
+        shard = _assignments.get(dining_hall_id)
+        if shard is None:
+            with self._global_engine().connect() as connection:
+                shard = connection.execute(
+                    select(shard_assignments.c.shard).where(shard_assignments.c.dining_hall_id == dining_hall_id)
+                ).scalar()
+            if shard is None:
+                # Unknown dining hall, its queries find nothing wherever they run
+                return _placement(dining_hall_id)
+            _assignments[dining_hall_id] = shard
+        return shard
+
+    # Reserve the next id of a table, ID_BLOCK_SIZE at a time from the global id_sequences table
+    def next_id(self, table_name):
+        with _lock:
+            next_id, end = _id_blocks.get(table_name, (0, 0))
+            if next_id >= end:
+                end = self._reserve_ids(table_name)
+                next_id = end - ID_BLOCK_SIZE
+            _id_blocks[table_name] = (next_id + 1, end)
+            return next_id + 1
+
+    def _reserve_ids(self, table_name):
+        while True:
+            with self._global_engine().begin() as connection:
+                result = connection.execute(
+                    update(id_sequences)
+                    .where(id_sequences.c.name == table_name)
+                    .values(value=id_sequences.c.value + ID_BLOCK_SIZE)
+                )
+                if result.rowcount:
+                    return connection.execute(select(id_sequences.c.value).where(id_sequences.c.name == table_name)).scalar_one()
+            # First reservation: start after the ids already used on any shard
+            table = self._db.metadata.tables[table_name]
+            used = 0
+            for name in SHARD_NAMES:
+                with self.get_bind(shard_id=name).connect() as connection:
+                    used = max(used, connection.execute(select(func.max(table.c.id))).scalar() or 0)
+            try:
+                with self._global_engine().begin() as connection:
+                    connection.execute(insert(id_sequences).values(name=table_name, value=used + ID_BLOCK_SIZE))
+                return used + ID_BLOCK_SIZE
+            except IntegrityError:
+                # Another worker created the sequence first, reserve from it
+                continue
+
+    def assign_shard(self, dining_hall_id):
+        shard = _placement(dining_hall_id)
+        with self._global_engine().begin() as connection:
+            connection.execute(insert(shard_assignments).values(dining_hall_id=dining_hall_id, shard=shard))
+        _assignments[dining_hall_id] = shard
+
+    # Shard of a new row. Statements on the global tables run through session.connection() have
+    # no mapper to route by, they ask for the global database explicitly (see global_connection).
+    def _choose_shard(self, mapper, instance, clause=None):
+        if mapper.local_table.name in GLOBAL_TABLES:
+            return GLOBAL_SHARD
+        dining_hall_id = None
+        if instance is not None:
+            dining_hall_id = instance.id if mapper.local_table.name == "dining_halls" else instance.dining_hall_id
+        elif clause is not None:
+            dining_hall_ids = _dining_hall_ids(clause)
+            if dining_hall_ids and len(dining_hall_ids) == 1:
+                dining_hall_id = dining_hall_ids.pop()
+        if dining_hall_id is None:
+            raise ValueError(f"Cannot choose the shard of a {mapper.class_.__name__} without its dining hall")
+        return self.shard_for(dining_hall_id)
+
+    def _choose_identity_shards(self, mapper, primary_key, *, lazy_loaded_from, **kw):
+        if mapper.local_table.name in GLOBAL_TABLES:
+            return [GLOBAL_SHARD]
+        if lazy_loaded_from is not None and lazy_loaded_from.identity_token is not None:
+            # Related rows live on the shard of the row they are loaded from
+            return [lazy_loaded_from.identity_token]
+        if mapper.local_table.name == "dining_halls":
+            return [self.shard_for(primary_key[0])]
+        # Ids are globally unique, so the row is on at most one shard
+        return SHARD_NAMES
+
+    def _choose_execute_shards(self, context):
+        statement = context.statement
+        tables = {mapper.local_table.name for mapper in context.all_mappers}
+        if not tables:
+            tables = {table.name for table in find_tables(statement, include_crud=True) if hasattr(table, "name")}
+        if tables and tables <= GLOBAL_TABLES:
+            return [GLOBAL_SHARD]
+
+        dining_hall_ids = _dining_hall_ids(statement, context.parameters)
+        if dining_hall_ids:
+            return sorted({self.shard_for(dining_hall_id) for dining_hall_id in dining_hall_ids})
+        return SHARD_NAMES
+
+    # Commit the shards before the global database. The change sequence row lock (see
+    # changefeed.next_change_seq) is then only released once the changes stamped with the
+    # sequence number are visible on their shard, so the change feed never skips one.
+    # The session commits its connections in no particular order, so the shard transactions are
+    # committed here first and left out of its own commit.
+    def commit(self):
+        transaction = self.get_transaction()
+        if transaction is not None and not self.in_nested_transaction():
+            self.flush()
+            global_engine = self._global_engine()
+            connections = transaction._connections
+            for key, (connection, trans, should_commit, autoclose) in list(connections.items()):
+                if should_commit and connection.engine is not global_engine:
+                    if trans.is_active:
+                        trans.commit()
+                    connections[key] = (connection, trans, False, autoclose)
+        super().commit()
+
+# Give new catalog rows a globally unique id, and new dining halls a shard
+@event.listens_for(ShardedFlaskSession, "before_flush")
+def _assign_ids(session, flush_context, instances):
+    for obj in session.new:
+        table_name = obj.__table__.name
+        if table_name in GLOBAL_ID_TABLES and obj.id is None:
+            obj.id = session.next_id(table_name)
+            if table_name == "dining_halls":
+                session.assign_shard(obj.id)
+
+# Whether two dining halls live on different shards. Rows are never relocated between shards, so
+# a dish can't be moved to a dining hall on another shard.
+def crosses_shards(session, dining_hall_id, other_dining_hall_id):
+    return SHARDING_ENABLED and session.shard_for(dining_hall_id) != session.shard_for(other_dining_hall_id)
+
+# Connection of the session's transaction to the database holding the global tables, for Core
+# statements on them (a connection asked for without a mapper can't be routed when sharded)
+def global_connection(session):
+    return session.connection(bind_arguments={"shard_id": GLOBAL_SHARD})
+
+# Options for the Flask-SQLAlchemy session (the sharded session when SHARD_URIS is set)
+def session_options():
+    return {"class_": ShardedFlaskSession} if SHARDING_ENABLED else {}
+
+# Binds of the shard databases, keyed by shard name
+def shard_binds():
+    return dict(SHARD_URIS)
+
+# Create the tables: sharded, the global tables and the sharding tables in the global database and
+# the per dining hall tables in every shard, otherwise all of them in the main database
+def create_tables(db):
+    if not SHARDING_ENABLED:
+        db.create_all()
+        return
+    global_engine = db.engines[None]
+    metadata.create_all(global_engine)
+    db.metadata.create_all(global_engine, tables=[table for table in db.metadata.sorted_tables if table.name in GLOBAL_TABLES])
+    tables = [table for table in db.metadata.sorted_tables if table.name not in GLOBAL_TABLES]
+    for name in SHARD_NAMES:
+        db.metadata.create_all(db.engines[name], tables=tables)
+
+# Run a list query ordered by id (by the caller) with an optional limit. Sharded, every shard
+# returns its own first rows and they are merged back into id order before applying the limit again.
+def merge_by_id(query, model, limit=None):
+    if limit is not None:
+        # Every shard's first rows by id
+        query = query.order_by(model.id).limit(limit)
+    return merge_rows(query.all(), limit)
+
+# Rows of all shards, each shard's ordered by id (and limited), merged into the first `limit` rows by id
+def merge_rows(rows, limit=None):
+    if SHARDING_ENABLED and len(SHARD_NAMES) > 1:
+        rows = sorted(rows, key=attrgetter("id"))[:limit]
+    return rows
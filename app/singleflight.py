@@ -0,0 +1,88 @@
+import copy
+import os
+import threading
+from functools import wraps
+from flask import current_app, make_response, request
+import metrics
+from transactions import commits_deferred
+
+# Coalesce identical concurrent GET requests (SINGLE_FLIGHT=false disables it)
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT", "true").lower() == "true"
+# Seconds a request waits on an in-flight identical request before computing its own response
+SINGLE_FLIGHT_TIMEOUT = float(os.getenv("SINGLE_FLIGHT_TIMEOUT", "5"))
+
+metrics.describe("single_flight_requests_total", "GET requests by single-flight outcome")
+
+# One in-flight computation shared by every identical request that arrives while it runs
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+_calls = {}
+_lock = threading.Lock()
+
+# Headers describing the shared representation, the only ones the followers copy from the leader's
+# response (per-request headers such as X-Profile-Id or traceresponse are their own)
+SHARED_HEADERS = ("Content-Type", "Content-Encoding", "Content-Language", "Vary", "ETag", "Last-Modified", "Cache-Control")
+
+# Each follower raises its own copy of the leader's exception, an exception object (and its
+# traceback) must not be raised in several threads at once
+def _follower_error(error):
+    try:
+        return copy.copy(error)
+    except Exception:
+        return RuntimeError(f"The shared request failed: {error!r}")
+
+# Requests are identical if they have the same path, query args (in any order) and Accept header
+def _request_key():
+    return request.path, tuple(sorted(request.args.items(multi=True))), request.headers.get("Accept", "")
+
+# Decorator sharing the serialized response of a GET view between identical concurrent requests
+def coalesce(view):
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # Reads inside an atomic batch must see the batch's own uncommitted writes
+        if not SINGLE_FLIGHT_ENABLED or commits_deferred():
+            return view(*args, **kwargs)
+
+        key = _request_key()
+        with _lock:
+            call = _calls.get(key)
+            leader = call is None
+            if leader:
+                call = _calls[key] = _Call()
+
+        if leader:
+            metrics.inc("single_flight_requests_total", {"outcome": "leader"})
+            try:
+                response = make_response(view(*args, **kwargs))
+                call.result = (response.get_data(), response.status_code, list(response.headers.items()))
+                return response
+            except Exception as e:
+                call.error = e
+                raise
+            finally:
+                # Later requests start a new computation, they must not see this result
+                with _lock:
+                    del _calls[key]
+                call.done.set()
+
+        if not call.done.wait(SINGLE_FLIGHT_TIMEOUT):
+            metrics.inc("single_flight_requests_total", {"outcome": "timeout"})
+            return view(*args, **kwargs)
+
+        if call.error is not None:
+            # The followers fail the same way instead of piling onto a failing query
+            metrics.inc("single_flight_requests_total", {"outcome": "error"})
+            raise _follower_error(call.error) from call.error
+
+        metrics.inc("single_flight_requests_total", {"outcome": "shared"})
+        # A fresh response per follower, the after_request hooks add its own headers to it
+        body, status, headers = call.result
+        return current_app.response_class(body, status=status, headers=[(name, value) for name, value in headers if name in SHARED_HEADERS])
+
+    return wrapper
@@ -0,0 +1,199 @@
+import gzip
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from flask import request, send_file
+from sqlalchemy import select
+from models import DiningHall, db
+from events import subscribe, affected_dining_halls
+from menus import build_all_menus, build_menu
+import metrics
+
+logger = logging.getLogger(__name__)
+
+# Directory the menus are pre-rendered to as static files (unset disables the publisher). A web
+# server in front of the service can serve SNAPSHOT_DIR/menus/ directly, see the README.
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR")
+# Seconds between full republications, which pick up writes made by other workers
+SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "60"))
+# Cache-Control max-age in seconds of the served snapshots
+SNAPSHOT_MAX_AGE = int(os.getenv("SNAPSHOT_MAX_AGE", "30"))
+
+SNAPSHOT_ENABLED = bool(SNAPSHOT_DIR)
+ALL_MENUS = "all"
+
+metrics.describe("snapshot_files_written_total", "Menu snapshot files (JSON and gzip) written because their content changed")
+metrics.describe("snapshot_age_seconds", "Seconds since the menu snapshots were last fully republished")
+
+def _menus_dir():
+    return os.path.join(SNAPSHOT_DIR, "menus")
+
+def snapshot_path(name):
+    return os.path.join(_menus_dir(), f"{name}.json")
+
+# Write to a temporary file in the same directory and rename it over the old one, so a reader
+# (this service or a web server) sees either the old or the new file, never a partial one
+def _write_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+def _remove(path):
+    for name in (path, path + ".gz"):
+        try:
+            os.remove(name)
+        except FileNotFoundError:
+            pass
+
+# Renders the menu of every dining hall and the compact menu of all of them to SNAPSHOT_DIR/menus/
+# as <id>.json and all.json, each with a .json.gz variant. The menus touched by a commit of this
+# worker are republished right after it, and everything every SNAPSHOT_INTERVAL seconds.
+class SnapshotPublisher:
+    def __init__(self):
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._started = False
+        # Digest of the content last written per file, unchanged menus are not rewritten
+        self._digests = {}
+        self.published_at = None
+
+    def _publish(self, name, menu, json_dumps):
+        path = snapshot_path(name)
+        if menu is None:
+            self._digests.pop(path, None)
+            _remove(path)
+            return
+
+        body = json_dumps(menu).encode("utf-8")
+        digest = hashlib.sha256(body).digest()
+        if self._digests.get(path) == digest and os.path.exists(path):
+            return
+        # mtime=0 makes the compressed file depend on the content only
+        _write_atomic(path + ".gz", gzip.compress(body, compresslevel=9, mtime=0))
+        _write_atomic(path, body)
+        self._digests[path] = digest
+        metrics.inc("snapshot_files_written_total", value=2)
+
+    # Republish the given dining halls (all of them if None) and the compact menu of every hall.
+    # Needs a request context for the links of the menus.
+    def publish(self, app, dining_hall_ids=None):
+        os.makedirs(_menus_dir(), exist_ok=True)
+        full = dining_hall_ids is None
+        if full:
+            dining_hall_ids = set(db.session.scalars(select(DiningHall.id)))
+            # Remove the snapshots of deleted dining halls
+            for name in os.listdir(_menus_dir()):
+                stem = name.split(".", 1)[0]
+                if stem.isdigit() and int(stem) not in dining_hall_ids:
+                    _remove(snapshot_path(stem))
+
+        for id in sorted(dining_hall_ids):
+            self._publish(str(id), build_menu(id), app.json.dumps)
+        self._publish(ALL_MENUS, build_all_menus(), app.json.dumps)
+        if full:
+            self.published_at = time.monotonic()
+
+    def on_changes(self, changes):
+        with self._lock:
+            for change in changes:
+                self._pending.update(affected_dining_halls(change))
+        self._wakeup.set()
+
+    def _run(self, app):
+        # Publish everything on start
+        woken = False
+        while True:
+            with self._lock:
+                dining_hall_ids, self._pending = self._pending, set()
+            try:
+                with app.test_request_context():
+                    self.publish(app, dining_hall_ids if woken else None)
+            except Exception:
+                logger.exception("Publishing the menu snapshots failed")
+            woken = self._wakeup.wait(SNAPSHOT_INTERVAL)
+            self._wakeup.clear()
+
+    def start(self, app):
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        subscribe(self.on_changes)
+        metrics.gauge_callback("snapshot_age_seconds", lambda: [({}, round(time.monotonic() - self.published_at, 3))] if self.published_at else [])
+        threading.Thread(target=self._run, args=(app,), name="snapshot-publisher", daemon=True).start()
+
+publisher = SnapshotPublisher()
+
+# Strong ETags are content hashes, computed once per version of a file and the same in every worker.
+# Keyed by path, (inode, mtime, size) tells whether the file was replaced since.
+_etags = {}
+_etags_lock = threading.Lock()
+
+def _etag(path, file, stat):
+    version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    entry = _etags.get(path)
+    if entry is not None and entry[0] == version:
+        return entry[1]
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.read(1 << 16), b""):
+        digest.update(chunk)
+    file.seek(0)
+    etag = digest.hexdigest()[:32]
+    with _etags_lock:
+        _etags[path] = (version, etag)
+    return etag
+
+def _open(path):
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        return None
+
+# Response serving a snapshot file with send_file (the WSGI server's file wrapper sends it without
+# copying it through Python where supported), gzip-encoded if the client accepts it, with a strong
+# ETag and Range support. The ETag and the body come from the same open file, so a snapshot
+# replaced meanwhile can't be sent under the other version's ETag. None if the snapshot doesn't exist.
+def send_snapshot(name):
+    path = snapshot_path(name)
+    encoded = request.accept_encodings["gzip"] > 0
+    file = _open(path + ".gz") if encoded else None
+    if file is None:
+        encoded = False
+        file = _open(path)
+        if file is None:
+            return None
+
+    stat = os.fstat(file.fileno())
+    etag = _etag(file.name, file, stat)
+    response = send_file(file, mimetype="application/json", etag=etag, conditional=False, max_age=SNAPSHOT_MAX_AGE)
+    response.content_length = stat.st_size
+    if encoded:
+        response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response.make_conditional(request.environ, accept_ranges=True, complete_length=stat.st_size)
+
+# Publish every snapshot once (flask --app app publish-menu-snapshots, e.g. from a deploy hook)
+def publish_snapshots(app):
+    with app.test_request_context():
+        publisher.publish(app)
+    return _menus_dir()
+
+def config_snapshots(app):
+    if SNAPSHOT_ENABLED:
+        publisher.start(app)
@@ -0,0 +1,114 @@
+import os
+import threading
+from collections import OrderedDict
+from sqlalchemy import bindparam, select
+from models import db
+from rows import ROW_FAST_PATH_ENABLED, list_select
+from sharding import merge_rows
+import metrics
+
+# Number of prebuilt statements kept, one per endpoint, field selection and filter shape (0 disables the cache)
+STATEMENT_CACHE_SIZE = int(os.getenv("STATEMENT_CACHE_SIZE", "512"))
+
+metrics.describe("statement_cache_lookups_total", "Prebuilt statement lookups by outcome (hit or miss)")
+metrics.describe("statement_cache_hit_ratio", "Fraction of the statement lookups served from the cache")
+metrics.describe("statement_cache_size", "Prebuilt statements in the cache")
+
+# LRU cache of SELECT statements whose criteria are all named bind parameters. The same statement
+# object is executed for every request of a shape, so neither the Query/select() chain nor its
+# cache key has to be rebuilt, and SQLAlchemy finds the compiled SQL in its own cache right away.
+class StatementCache:
+    def __init__(self, size):
+        self.size = size
+        self._statements = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        if self.size <= 0:
+            return build()
+        with self._lock:
+            statement = self._statements.get(key)
+            if statement is not None:
+                self._statements.move_to_end(key)
+                self.hits += 1
+        if statement is not None:
+            metrics.inc("statement_cache_lookups_total", {"outcome": "hit"})
+            return statement
+
+        statement = build()
+        with self._lock:
+            self.misses += 1
+            self._statements[key] = statement
+            if len(self._statements) > self.size:
+                self._statements.popitem(last=False)
+        metrics.inc("statement_cache_lookups_total", {"outcome": "miss"})
+        return statement
+
+    def hit_ratio(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return self.hits / lookups if lookups else 0.0
+
+statements = StatementCache(STATEMENT_CACHE_SIZE)
+metrics.gauge_callback("statement_cache_hit_ratio", lambda: [({}, round(statements.hit_ratio(), 4))])
+metrics.gauge_callback("statement_cache_size", lambda: [({}, len(statements._statements))])
+
+# Escape character of the LIKE patterns (see contains_pattern)
+LIKE_ESCAPE = "\\"
+
+# Filter operators, applied to a column and a bind parameter named after the column
+_OPERATORS = {
+    "eq": lambda column, name: column == bindparam(name),
+    "like": lambda column, name: column.like(bindparam(name), escape=LIKE_ESCAPE),
+    "in": lambda column, name: column.in_(bindparam(name, expanding=True)),
+}
+
+# LIKE pattern matching text anywhere in a value: the % and _ typed by the client are matched
+# literally, the same as the substring match of the catalog snapshot
+def contains_pattern(text):
+    for c in (LIKE_ESCAPE, "%", "_"):
+        text = text.replace(c, LIKE_ESCAPE + c)
+    return f"%{text}%"
+
+def _build_list(model, schema_cls, fields, links, shape, limited):
+    statement = list_select(model, schema_cls, fields, links)
+    for name, op in shape:
+        statement = statement.where(_OPERATORS[op](getattr(model, name), name))
+    statement = statement.order_by(model.id)
+    if limited:
+        statement = statement.limit(bindparam("limit"))
+    return statement
+
+# Rows of a list endpoint (see rows.list_select) matching the filters, a list of
+# (column name, operator, value) with at most one filter per column, in id order.
+# The statement is built once per filter shape, the values are only bound at execution.
+def list_rows(model, schema_cls, fields, links, filters=(), limit=None):
+    shape = tuple((name, op) for name, op, _ in filters)
+    key = ("list", model.__name__, schema_cls.__name__, fields, links, shape, limit is not None)
+    statement = statements.get(key, lambda: _build_list(model, schema_cls, fields, links, shape, limit is not None))
+
+    params = {name: value for name, _, value in filters}
+    if limit is not None:
+        params["limit"] = limit
+    result = db.session.execute(statement, params)
+    rows = result.all() if ROW_FAST_PATH_ENABLED else result.scalars().all()
+    return merge_rows(rows, limit)
+
+# Rows of a multi-get chunk, for multiget.get_many
+def rows_by_ids(model, schema_cls, fields, links):
+    return lambda ids: list_rows(model, schema_cls, fields, links, [("id", "in", ids)])
+
+def _build_lookup(model, names):
+    statement = select(model)
+    for name in names:
+        statement = statement.where(getattr(model, name) == bindparam(name))
+    return statement.limit(1)
+
+# First instance of the model whose columns equal the given values (e.g. an existing row with the
+# same name), or None
+def find_first(model, **values):
+    names = tuple(sorted(values))
+    statement = statements.get(("first", model.__name__, names), lambda: _build_lookup(model, names))
+    return db.session.execute(statement, values).scalars().first()
@@ -0,0 +1,322 @@
+import contextvars
+import importlib
+import json
+import logging
+import os
+import queue
+import random
+import re
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from functools import wraps
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+# Where finished spans are exported: stdout, file (JSON lines appended to TRACING_FILE), a name given
+# to register_exporter, or "module:attribute" of a factory returning an exporter (unset disables tracing)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "").strip()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+# Fraction of the requests without a traceparent header that are traced (requests with one
+# follow the caller's sampling decision)
+TRACING_SAMPLE_RATE = float(os.getenv("TRACING_SAMPLE_RATE", "1"))
+
+TRACING_ENABLED = TRACING_EXPORTER.lower() not in ("", "none")
+# SQL statements longer than this are truncated in the span attributes
+MAX_STATEMENT_LENGTH = 2000
+
+# W3C Trace Context: version-trace_id-parent_id-flags (https://www.w3.org/TR/trace-context/)
+_TRACEPARENT = re.compile(r"([0-9a-f]{2})-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})(-.*)?")
+_SAMPLED = 0x01
+
+# Span of the code running in this context, child spans are only created under a sampled one
+_current = contextvars.ContextVar("current_span", default=None)
+_NO_SPAN = nullcontext()
+
+class Span:
+    __slots__ = ("name", "kind", "trace_id", "span_id", "parent_id", "start", "end", "attributes", "error")
+
+    def __init__(self, name, trace_id, parent_id=None, kind="internal", attributes=None):
+        self.name = name
+        self.kind = kind
+        self.trace_id = trace_id
+        self.span_id = _new_id(64)
+        self.parent_id = parent_id
+        self.start = time.time_ns()
+        self.end = None
+        self.attributes = attributes or {}
+        self.error = None
+
+    def child(self, name, kind="internal", **attributes):
+        return Span(name, self.trace_id, self.span_id, kind, attributes)
+
+    def finish(self, error=None):
+        if self.end is not None:
+            return
+        self.end = time.time_ns()
+        if error is not None:
+            self.error = error if isinstance(error, str) else f"{type(error).__name__}: {error}"
+        _exporter.submit(self)
+
+    def traceparent(self):
+        return f"00-{self.trace_id}-{self.span_id}-{_SAMPLED:02x}"
+
+    def to_dict(self):
+        span = {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_id,
+            "name": self.name,
+            "kind": self.kind,
+            "start_time_unix_nano": self.start,
+            "end_time_unix_nano": self.end,
+            "duration_ms": round((self.end - self.start) / 1e6, 3),
+            "attributes": self.attributes,
+            "status": "error" if self.error else "ok",
+        }
+        if self.error:
+            span["error"] = self.error
+        return span
+
+def _new_id(bits):
+    # All-zero ids are invalid
+    return f"{random.getrandbits(bits) or 1:0{bits // 4}x}"
+
+# (trace_id, parent_id, sampled) of a traceparent header, None if it is missing or invalid
+def parse_traceparent(header):
+    match = _TRACEPARENT.fullmatch(header.strip().lower()) if header else None
+    if match is None:
+        return None
+    version, trace_id, parent_id, flags, rest = match.groups()
+    # Version 00 has no extra fields, ff is forbidden
+    if version == "ff" or (version == "00" and rest) or set(trace_id) == {"0"} or set(parent_id) == {"0"}:
+        return None
+    return trace_id, parent_id, bool(int(flags, 16) & _SAMPLED)
+
+def current_span():
+    return _current.get()
+
+# Child span of the current one: `with span("name", key=value) as s:`, s is None when the
+# current request is not traced
+def span(name, kind="internal", **attributes):
+    parent = _current.get()
+    if parent is None:
+        return _NO_SPAN
+    return _active(parent.child(name, kind, **attributes))
+
+class _active:
+    __slots__ = ("span", "token")
+
+    def __init__(self, span):
+        self.span = span
+
+    def __enter__(self):
+        self.token = _current.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        _current.reset(self.token)
+        self.span.finish(exc)
+
+# Make a span current in another thread (e.g. the group committer or a batch worker), so the
+# spans created there belong to the request that handed the work over
+class use_span:
+    __slots__ = ("span", "token")
+
+    def __init__(self, span):
+        self.span = span
+
+    def __enter__(self):
+        self.token = _current.set(self.span) if self.span is not None else None
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.token is not None:
+            _current.reset(self.token)
+
+def traced(name, **attributes):
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _current.get() is None:
+                return fn(*args, **kwargs)
+            with span(name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+# Exporters
+
+class StdoutExporter:
+    def export(self, spans):
+        for span in spans:
+            sys.stdout.write(json.dumps(span, separators=(",", ":")) + "\n")
+        sys.stdout.flush()
+
+class FileExporter:
+    def __init__(self, path=None):
+        self.file = open(path or TRACING_FILE, "a", encoding="utf-8")
+
+    def export(self, spans):
+        self.file.writelines(json.dumps(span, separators=(",", ":")) + "\n" for span in spans)
+        self.file.flush()
+
+_exporter_factories = {
+    "stdout": StdoutExporter,
+    "file": FileExporter,
+}
+
+# Register an exporter for TRACING_EXPORTER=name. An exporter has an export(spans) method taking
+# a list of span dicts (see Span.to_dict), it is called from a single background thread.
+def register_exporter(name, factory):
+    _exporter_factories[name] = factory
+
+def _create_exporter(name):
+    if name in _exporter_factories:
+        return _exporter_factories[name]()
+    module, _, attribute = name.partition(":")
+    return getattr(importlib.import_module(module), attribute)()
+
+# Finished spans are queued and exported in batches from a background thread, so requests never
+# wait on the exporter
+class _BackgroundExporter:
+    def __init__(self):
+        self._queue = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def submit(self, span):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                    self._thread.start()
+        self._queue.put(span)
+
+    def _run(self):
+        try:
+            exporter = _create_exporter(TRACING_EXPORTER)
+        except Exception:
+            logger.exception(f"Creating the trace exporter {TRACING_EXPORTER!r} failed, spans are dropped")
+            exporter = None
+        while True:
+            spans = [self._queue.get()]
+            while not self._queue.empty() and len(spans) < 512:
+                spans.append(self._queue.get())
+            if exporter is None:
+                continue
+            try:
+                exporter.export([span.to_dict() for span in spans])
+            except Exception:
+                logger.exception(f"Exporting {len(spans)} spans failed")
+
+_exporter = _BackgroundExporter()
+
+# Request spans, started and ended by the logging middleware
+
+def start_request_span():
+    context = parse_traceparent(request.headers.get("traceparent"))
+    if context is None:
+        if random.random() >= TRACING_SAMPLE_RATE:
+            return
+        trace_id, parent_id = _new_id(128), None
+    else:
+        trace_id, parent_id, sampled = context
+        if not sampled:
+            return
+
+    rule = request.url_rule.rule if request.url_rule is not None else None
+    span = Span(f"{request.method} {rule or request.path}", trace_id, parent_id, kind="server", attributes={
+        "http.method": request.method,
+        "http.target": request.full_path if request.query_string else request.path,
+        "http.route": rule,
+        "flask.endpoint": request.endpoint,
+    })
+    g.trace_span = span
+    g.trace_token = _current.set(span)
+
+def end_request_span(response):
+    span = g.pop("trace_span", None)
+    if span is None:
+        return
+    span.attributes["http.status_code"] = response.status_code
+    # Lets the caller find this request's spans (W3C Trace Context Level 2)
+    response.headers["traceresponse"] = span.traceparent()
+    _reset_request_span()
+    span.finish(response.status if response.status_code >= 500 else None)
+
+def _reset_request_span():
+    token = g.pop("trace_token", None)
+    if token is not None:
+        _current.reset(token)
+
+# End the span of a request that failed before after_request ran
+def teardown_request_tracing(exception=None):
+    span = g.pop("trace_span", None)
+    if span is not None:
+        _reset_request_span()
+        span.finish(exception or "Request aborted")
+
+# SQL statement spans
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    parent = _current.get()
+    if parent is None or context is None:
+        return
+    context._trace_span = parent.child(
+        statement.split(None, 1)[0].upper() if statement else "SQL", kind="client", **{
+            "db.system": conn.dialect.name,
+            "db.statement": statement[:MAX_STATEMENT_LENGTH],
+            "db.executemany": executemany,
+        })
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    span = getattr(context, "_trace_span", None)
+    if span is not None:
+        if cursor.rowcount is not None and cursor.rowcount >= 0:
+            span.attributes["db.rowcount"] = cursor.rowcount
+        span.finish()
+
+def _handle_error(exception_context):
+    span = getattr(exception_context.execution_context, "_trace_span", None)
+    if span is not None:
+        span.finish(exception_context.original_exception)
+
+# Serialization spans
+
+def _instrument_serialization(app):
+    from marshmallow import Schema
+    from rows import RowSerializer
+
+    for cls, name in ((Schema, "serialize"), (RowSerializer, "serialize rows")):
+        if not getattr(cls.dump, "_traced", False):
+            cls.dump = traced(name)(cls.dump)
+            cls.dump._traced = True
+    app.json.response = traced("encode json")(app.json.response)
+
+# GraphQL middleware with a span per top-level field, the nested fields are resolved from the
+# objects it returned (their lazy loads show up as SQL spans under the request)
+class GraphQLTracingMiddleware:
+    def resolve(self, next, root, info, **args):
+        if _current.get() is None or info.parent_type is not info.schema.get_query_type():
+            return next(root, info, **args)
+        with span("graphql resolve", **{"graphql.field": info.field_name}):
+            return next(root, info, **args)
+
+def graphql_middleware():
+    return [GraphQLTracingMiddleware()] if TRACING_ENABLED else []
+
+# Nothing is instrumented when tracing is disabled: the middleware checks TRACING_ENABLED before
+# calling in, and span() only reads a context variable
+def config_tracing(app):
+    if not TRACING_ENABLED:
+        return
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+    _instrument_serialization(app)
+    app.teardown_request(teardown_request_tracing)
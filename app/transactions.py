@@ -0,0 +1,24 @@
+from contextlib import contextmanager
+from flask import g
+from models import db
+
+# Whether commit() currently only flushes (inside deferred_commits)
+def commits_deferred():
+    return g.get("defer_commits", False)
+
+# Commit the session, or only flush it while commits are deferred so that the
+# writes of several requests end up in one transaction
+def commit():
+    if commits_deferred():
+        db.session.flush()
+    else:
+        db.session.commit()
+
+# Defer the commits of the routes run inside the block (the caller commits or rolls back)
+@contextmanager
+def deferred_commits():
+    g.defer_commits = True
+    try:
+        yield
+    finally:
+        g.pop("defer_commits", None)
@@ -0,0 +1,69 @@
+"""
+Latency of autocomplete suggestions (autocomplete.NameIndex) over a large synthetic set of dish names.
+
+Names are made of random words from a fixed vocabulary, queries are prefixes of existing names
+with no typo, one typo (anywhere, the first letter included) or two typos. Prints the p50, p99
+and max latency per kind of query.
+
+    python3 bench/bench_autocomplete.py --names 1000000 --queries 2000
+"""
+import argparse
+import os
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "app"))
+
+from autocomplete import KEY_SEPARATOR, NameIndex, max_distance, normalize  # noqa: E402
+
+WORDS = (
+    "spaghetti carbonara chicken tikka masala grilled salmon teriyaki beef bulgogi tofu stir fry "
+    "margherita pizza caesar salad tomato soup mushroom risotto pad thai falafel wrap pulled pork "
+    "sandwich veggie burger shrimp tacos lentil curry roasted vegetables mac cheese fried rice "
+    "chocolate cake apple pie banana bread pancakes waffles omelette quinoa bowl sushi ramen pho"
+).split()
+
+def make_names(count, rng):
+    return [" ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 4))) for _ in range(count)]
+
+def add_typos(query, typos, rng):
+    query = list(query)
+    for n in range(typos):
+        # The first typo of every other query is on the first letter
+        i = 0 if n == 0 and rng.random() < 0.5 else rng.randrange(len(query))
+        query[i] = rng.choice([c for c in string.ascii_lowercase if c != query[i]])
+    return "".join(query)
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * p))]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--names", type=int, default=1_000_000, help="number of dish names indexed")
+    parser.add_argument("--queries", type=int, default=2000, help="number of queries per kind")
+    parser.add_argument("--limit", type=int, default=10, help="suggestions per query")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    names = make_names(args.names, rng)
+    started = time.perf_counter()
+    index = NameIndex(f"{normalize(name)}{KEY_SEPARATOR}{id}" for id, name in enumerate(names, 1))
+    print(f"indexed {len(index.keys)} names in {time.perf_counter() - started:.1f} s")
+
+    print(f"{'query':<12} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'found':>6}")
+    for kind, typos, length in (("exact", 0, 5), ("1 typo", 1, 5), ("2 typos", 2, 8)):
+        samples, found = [], 0
+        for _ in range(args.queries):
+            query = add_typos(normalize(rng.choice(names))[:length], typos, rng)
+            started = time.perf_counter()
+            results = index.search(query, max_distance(query), args.limit)
+            samples.append((time.perf_counter() - started) * 1000)
+            found += bool(results)
+        print(f"{kind:<12} {percentile(samples, 0.5):8.3f} {percentile(samples, 0.99):8.3f} {max(samples):8.3f} {found / args.queries:6.0%}")
+
+if __name__ == "__main__":
+    main()
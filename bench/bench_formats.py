@@ -0,0 +1,56 @@
+"""
+Encode time, decode time and size of the response formats negotiated by negotiation.py:
+JSON (the app's provider), MessagePack and CBOR, for the dish list and the full-catalog menu.
+
+The payloads are the schema output the endpoints encode, so the numbers are those of a client
+that decodes a response and a service that encodes it. Formats whose library is not installed
+are skipped.
+
+    python3 bench/bench_formats.py --sizes 100,1000,10000
+"""
+import argparse
+import json
+
+from common import load_app, seed, timed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma-separated numbers of dishes per payload")
+    parser.add_argument("--repeat", type=int, default=20, help="encodings and decodings timed per payload and format")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    from flask import current_app
+    from menus import build_all_menus
+    from models import Dish
+    from negotiation import JSON_MIMETYPE, _formats, cbor2, encode, msgpack
+    from schemas import DishSchema
+
+    app = load_app()
+    seed(app, max(sizes))
+
+    with app.test_request_context():
+        decoders = {JSON_MIMETYPE: current_app.json.loads}
+        if "application/msgpack" in _formats:
+            decoders["application/msgpack"] = msgpack.unpackb
+        if "application/cbor" in _formats:
+            decoders["application/cbor"] = cbor2.loads
+
+        payloads = [(f"{size} dishes", DishSchema(many=True).dump(Dish.query.order_by(Dish.id).limit(size).all())) for size in sizes]
+        payloads.append((f"menus ({max(sizes)} dishes)", build_all_menus()))
+
+        print(f"{'payload':<22} {'format':<20} {'bytes':>10} {'size':>6} {'encode ms':>10} {'decode ms':>10}")
+        for name, payload in payloads:
+            json_size = None
+            for mimetype, decode in decoders.items():
+                body = encode(payload, mimetype)
+                # Every format carries the same data (dates are strings in all of them)
+                assert decode(body) == json.loads(encode(payload, JSON_MIMETYPE))
+                json_size = json_size or len(body)
+
+                encode_time, _ = timed(lambda: encode(payload, mimetype), args.repeat)
+                decode_time, _ = timed(lambda: decode(body), args.repeat)
+                print(f"{name:<22} {mimetype:<20} {len(body):>10} {len(body) / json_size:>6.0%} {encode_time * 1000:>10.3f} {decode_time * 1000:>10.3f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+JSON serialization of dish lists: the orjson-backed provider (json_provider.FastJSONProvider)
+against Flask's stdlib provider, for payloads of increasing size.
+
+The payloads are the output of the dish list schema with its HATEOAS links, the way
+GET /api/v1/dishes serializes them. Both encodings are checked to decode to the same data.
+
+    python3 bench/bench_json.py --sizes 10,100,1000,10000
+"""
+import argparse
+import json
+
+from common import load_app, seed, timed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="10,100,1000,10000", help="comma-separated numbers of dishes per payload")
+    parser.add_argument("--repeat", type=int, default=20, help="encodings timed per payload and provider")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    from flask.json.provider import DefaultJSONProvider
+    from json_provider import FastJSONProvider, orjson
+    from models import Dish
+    from schemas import DishSchema
+
+    if orjson is None:
+        parser.exit(1, "orjson is not installed, there is nothing to compare\n")
+
+    app = load_app()
+    seed(app, max(sizes))
+    fast, stdlib = FastJSONProvider(app), DefaultJSONProvider(app)
+
+    print(f"{'dishes':>8} {'bytes':>10} {'stdlib ms':>10} {'orjson ms':>10} {'speedup':>8}")
+    with app.test_request_context():
+        for size in sizes:
+            payload = DishSchema(many=True).dump(Dish.query.order_by(Dish.id).limit(size).all())
+            encoded = fast.dumps_bytes(payload)
+            assert json.loads(encoded) == json.loads(stdlib.dumps(payload))
+
+            stdlib_time, _ = timed(lambda: stdlib.dumps(payload).encode("utf-8"), args.repeat)
+            fast_time, _ = timed(lambda: fast.dumps_bytes(payload), args.repeat)
+            print(f"{size:>8} {len(encoded):>10} {stdlib_time * 1000:>10.3f} {fast_time * 1000:>10.3f} {stdlib_time / fast_time:>7.1f}x")
+
+if __name__ == "__main__":
+    main()
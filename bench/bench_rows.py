@@ -0,0 +1,66 @@
+"""
+Memory and latency of the list endpoints' read paths: plain row tuples written out by a
+rows.RowSerializer (ROW_FAST_PATH=true) against ORM instances dumped by the marshmallow list
+schema (ROW_FAST_PATH=false), for the dish list with its links.
+
+Each run loads and serializes the dishes in a fresh session, as a request does. Latency is the
+median over the runs, memory the peak traced by tracemalloc during one run (rows, instances,
+identity map and output).
+
+    python3 bench/bench_rows.py --sizes 100,1000,10000
+"""
+import argparse
+import gc
+import tracemalloc
+
+from common import load_app, seed, timed
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="100,1000,10000", help="comma-separated numbers of dishes listed")
+    parser.add_argument("--repeat", type=int, default=10, help="runs timed per size and path")
+    args = parser.parse_args()
+    sizes = [int(size) for size in args.sizes.split(",")]
+
+    from sqlalchemy import select
+    from fieldsets import apply_fieldset, get_list_schema
+    from models import Dish, db
+    from rows import get_row_serializer, select_rows
+    from schemas import DishSchema
+
+    app = load_app()
+    seed(app, max(sizes))
+
+    def rows_path(size):
+        statement = select_rows(Dish, DishSchema, None, True).order_by(Dish.id).limit(size)
+        get_row_serializer(DishSchema, None, True).dump(db.session.execute(statement).all())
+        db.session.remove()
+
+    def orm_path(size):
+        statement = apply_fieldset(select(Dish), Dish, DishSchema, None, True).order_by(Dish.id).limit(size)
+        get_list_schema(DishSchema, None, True).dump(db.session.execute(statement).scalars().all())
+        db.session.remove()
+
+    def peak_memory(fn):
+        gc.collect()
+        tracemalloc.start()
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        return peak
+
+    print(f"{'dishes':>8} {'path':>8} {'median ms':>10} {'min ms':>8} {'peak KiB':>9}")
+    with app.test_request_context():
+        for size in sizes:
+            results = {}
+            for name, path in (("orm", orm_path), ("rows", rows_path)):
+                path(size)  # warm up the statement and serializer caches
+                median, fastest = timed(lambda: path(size), args.repeat)
+                peak = peak_memory(lambda: path(size))
+                results[name] = (median, peak)
+                print(f"{size:>8} {name:>8} {median * 1000:>10.2f} {fastest * 1000:>8.2f} {peak / 1024:>9.0f}")
+            (orm_time, orm_peak), (rows_time, rows_peak) = results["orm"], results["rows"]
+            print(f"{'':>8} {'orm/rows':>8} {orm_time / rows_time:>9.1f}x {'':>8} {orm_peak / rows_peak:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Prebuilt statement cache (statements.py) before and after: list queries of every combination of
+the dish list filters (name, description, dining_hall_id, station_id), with the cache disabled
+(the select() is rebuilt for every request, as before the cache) and enabled.
+
+Measured in-process on statements.list_rows, and end to end on GET /api/v1/dishes through the
+test client. The table is kept small so the per-request statement overhead is what is measured.
+
+    python3 bench/bench_statements.py --requests 2000
+"""
+import argparse
+import itertools
+import time
+
+from common import load_app, seed
+
+FILTERS = ("name", "description", "dining_hall_id", "station_id")
+
+# Request arguments cycling through the filter shapes, with values changing from one request to the next
+def make_requests(count):
+    shapes = [shape for n in range(len(FILTERS) + 1) for shape in itertools.combinations(FILTERS, n)]
+    requests = []
+    for i in range(count):
+        values = {"name": f"Dish {i % 9}", "description": "synthetic", "dining_hall_id": i % 10 + 1, "station_id": i % 100 + 1}
+        requests.append({name: values[name] for name in shapes[i % len(shapes)]})
+    return requests
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per run")
+    parser.add_argument("--dishes", type=int, default=200, help="dishes in the table")
+    args = parser.parse_args()
+
+    from models import Dish, db
+    from schemas import DishSchema
+    from statements import STATEMENT_CACHE_SIZE, contains_pattern, list_rows, statements
+
+    app = load_app()
+    seed(app, args.dishes)
+    client = app.test_client()
+    requests = make_requests(args.requests)
+
+    def run_list_rows():
+        for request in requests:
+            filters = [(name, "like" if name in ("name", "description") else "eq",
+                        contains_pattern(value) if name in ("name", "description") else value)
+                       for name, value in request.items()]
+            list_rows(Dish, DishSchema, None, True, filters, 10)
+            db.session.remove()
+
+    def run_endpoint():
+        for request in requests:
+            client.get("/api/v1/dishes", query_string=request)
+
+    print(f"{'measured':<22} {'cache':<8} {'us/request':>11} {'hit ratio':>10}")
+    for name, run in (("statements.list_rows", run_list_rows), ("GET /api/v1/dishes", run_endpoint)):
+        timings = {}
+        for size in (0, STATEMENT_CACHE_SIZE or 512):
+            statements.size = size
+            statements._statements.clear()
+            statements.hits = statements.misses = 0
+            with app.test_request_context():
+                run()  # warm up (SQLAlchemy's compiled cache, serializers...)
+                started = time.perf_counter()
+                run()
+                timings[size] = (time.perf_counter() - started) / len(requests)
+            label = "off" if size == 0 else f"{size}"
+            print(f"{name:<22} {label:<8} {timings[size] * 1e6:>11.1f} {statements.hit_ratio():>10.1%}")
+        before, after = timings.values()
+        print(f"{'':<22} {'speedup':<8} {before / after:>10.2f}x")
+
+if __name__ == "__main__":
+    main()
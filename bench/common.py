@@ -0,0 +1,55 @@
+"""
+Shared setup of the benchmarks: the app runs in-process against a throwaway SQLite database
+(unless DATABASE_URI is set) seeded with synthetic dining halls, stations and dishes.
+"""
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+# The app reads its settings when it is imported
+os.environ.setdefault("DATABASE_URI", f"sqlite:///{os.path.join(tempfile.mkdtemp(prefix='dish-service-bench-'), 'dishes.db')}")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "app"))
+
+STATIONS_PER_HALL = 10
+
+def load_app():
+    from app import app
+    # The request log lines would drown the numbers (and cost more than what is measured)
+    logging.disable(logging.INFO)
+    return app
+
+# Replace the catalog with halls dining halls of STATIONS_PER_HALL stations and dishes dishes in total
+def seed(app, dishes, halls=10):
+    from models import DiningHall, Dish, Station, db
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        db.session.execute(DiningHall.__table__.insert(), [{"id": h, "name": f"Dining Hall {h}"} for h in range(1, halls + 1)])
+        db.session.execute(Station.__table__.insert(), [
+            {"id": (h - 1) * STATIONS_PER_HALL + s, "name": f"Station {s}", "dining_hall_id": h}
+            for h in range(1, halls + 1) for s in range(1, STATIONS_PER_HALL + 1)
+        ])
+        rows = []
+        for i in range(1, dishes + 1):
+            station_id = i % (halls * STATIONS_PER_HALL) + 1
+            rows.append({
+                "id": i,
+                "name": f"Dish {i}",
+                "description": f"A synthetic dish number {i} with a description of typical length",
+                "station_id": station_id,
+                "dining_hall_id": (station_id - 1) // STATIONS_PER_HALL + 1,
+            })
+        db.session.execute(Dish.__table__.insert(), rows)
+        db.session.commit()
+
+# Median and minimum seconds of repeat calls of fn
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples), min(samples)
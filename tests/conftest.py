@@ -0,0 +1,54 @@
+import os
+import sys
+import tempfile
+import pytest
+
+# The app reads its settings when it is imported: point it at a throwaway SQLite database first
+# (unless DATABASE_URI is set, e.g. to run the tests against MySQL)
+TEST_DIR = tempfile.mkdtemp(prefix="dish-service-tests-")
+os.environ.setdefault("DATABASE_URI", f"sqlite:///{os.path.join(TEST_DIR, 'dishes.db')}")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "app"))
+
+# The sharded tests only run with SHARD_URIS set, see test_sharding.py
+collect_ignore = [] if os.getenv("SHARD_URIS") else ["sharded"]
+
+@pytest.fixture(scope="session")
+def app():
+    from app import app
+    app.config["TESTING"] = True
+    return app
+
+# Empty tables and caches for every test (sharded, the tables are the ones created on import)
+@pytest.fixture(autouse=True)
+def database(app):
+    from config import db
+    from referencedata import reference_data
+    from sharding import SHARDING_ENABLED
+    with app.app_context():
+        if not SHARDING_ENABLED:
+            db.drop_all()
+            db.create_all()
+        reference_data.invalidate()
+        yield db
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+# SQL statements executed by the test's thread while it runs (not by background refreshers), as sent to the database
+@pytest.fixture
+def statements():
+    import threading
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+    executed = []
+    thread = threading.get_ident()
+
+    def capture(connection, cursor, statement, parameters, context, executemany):
+        if threading.get_ident() == thread:
+            executed.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", capture)
+    yield executed
+    event.remove(Engine, "before_cursor_execute", capture)
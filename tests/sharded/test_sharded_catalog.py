@@ -0,0 +1,67 @@
+from sqlalchemy import inspect, select
+
+def _table_names(db, shard):
+    return set(inspect(db.engines[shard]).get_table_names())
+
+def _ids(db, shard, table):
+    with db.engines[shard].connect() as connection:
+        return sorted(connection.execute(select(db.metadata.tables[table].c.id)).scalars())
+
+def test_catalog_is_spread_over_the_shards(client, database):
+    db = database
+    hall_ids = [client.post("/api/v1/dining_halls", json={"name": name}).get_json()["id"] for name in ("John Jay", "Ferris")]
+    station_ids = []
+    for hall_id in hall_ids:
+        response = client.post(f"/api/v1/dining_halls/{hall_id}/stations", json={"name": "Grill"})
+        assert response.status_code == 201
+        station_ids.append(response.get_json()["id"])
+    for hall_id, station_id in zip(hall_ids, station_ids):
+        response = client.post("/api/v1/dishes", json={"name": "Burger", "dining_hall_id": hall_id, "station_id": station_id})
+        assert response.status_code == 201
+
+    # The global database only holds the global tables, each shard the rows of its dining halls
+    assert not _table_names(db, None) & {"dining_halls", "stations", "dishes", "tombstones"}
+    assert "change_sequence" not in _table_names(db, "a")
+    placed = {shard: _ids(db, shard, "dining_halls") for shard in ("a", "b")}
+    assert sorted(placed["a"] + placed["b"]) == sorted(hall_ids)
+    assert placed["a"] and placed["b"]
+    for shard in ("a", "b"):
+        with db.engines[shard].connect() as connection:
+            dishes = db.metadata.tables["dishes"]
+            assert set(connection.execute(select(dishes.c.dining_hall_id)).scalars()) == set(placed[shard])
+
+    # Reads scatter to every shard and are merged by id, or go to the dining hall's shard
+    response = client.get("/api/v1/dishes")
+    assert [dish["dining_hall_id"] for dish in response.get_json()] == hall_ids
+    response = client.get(f"/api/v1/dining_halls/{hall_ids[1]}/menu")
+    assert [station["name"] for station in response.get_json()["stations"]] == ["Grill"]
+    response = client.get("/api/v1/changes")
+    assert response.status_code == 200
+    assert len(response.get_json()["changes"]) == 6
+
+    # Deletes, with their tombstones on the shard and a new change sequence number
+    assert client.delete(f"/api/v1/dining_halls/{hall_ids[0]}/stations/{station_ids[0]}").status_code == 200
+    assert client.delete(f"/api/v1/dining_halls/{hall_ids[1]}").status_code == 200
+    assert [dish["dining_hall_id"] for dish in client.get("/api/v1/dishes").get_json()] == []
+    assert [hall["id"] for hall in client.get("/api/v1/dining_halls").get_json()] == hall_ids[:1]
+
+# A dish can move between dining halls of one shard, not to a dining hall on another shard
+def test_dish_moves_stay_on_their_shard(client, database):
+    db = database
+    halls = {}
+    for i in range(4):
+        hall_id = client.post("/api/v1/dining_halls", json={"name": f"Move Hall {i}"}).get_json()["id"]
+        station_id = client.post(f"/api/v1/dining_halls/{hall_id}/stations", json={"name": "Grill"}).get_json()["id"]
+        halls.setdefault(db.session().shard_for(hall_id), []).append((hall_id, station_id))
+    (hall_a, station_a), (other_hall_a, other_station_a) = halls["a"][:2]
+    hall_b, station_b = halls["b"][0]
+    dish_id = client.post("/api/v1/dishes", json={"name": "Taco", "dining_hall_id": hall_a, "station_id": station_a}).get_json()["id"]
+
+    response = client.put(f"/api/v1/dishes/{dish_id}", json={"dining_hall_id": hall_b, "station_id": station_b})
+    assert response.status_code == 400
+    assert dish_id in _ids(db, "a", "dishes") and dish_id not in _ids(db, "b", "dishes")
+    assert [dish["id"] for dish in client.get(f"/api/v1/dishes?dining_hall_id={hall_a}").get_json()] == [dish_id]
+
+    response = client.put(f"/api/v1/dishes/{dish_id}", json={"dining_hall_id": other_hall_a, "station_id": other_station_a})
+    assert response.status_code == 200
+    assert [dish["id"] for dish in client.get(f"/api/v1/dishes?dining_hall_id={other_hall_a}").get_json()] == [dish_id]
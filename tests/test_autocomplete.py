@@ -0,0 +1,49 @@
+import events
+import autocomplete as autocomplete_module
+import routes.dish_routes as dish_routes
+from autocomplete import KEY_SEPARATOR, Autocomplete, NameIndex, autocomplete, normalize
+
+def _index(*names):
+    return NameIndex(f"{normalize(name)}{KEY_SEPARATOR}{id}" for id, name in enumerate(names, 1))
+
+def _names(results):
+    return [(distance, key.partition(KEY_SEPARATOR)[0]) for distance, key in results]
+
+# Typos are tolerated anywhere in the query, the first letter included
+def test_typo_in_the_first_letter():
+    index = _index("Spaghetti Carbonara", "Pad Thai", "Salmon")
+    assert _names(index.search("xpagh", 1, 10)) == [(1, "spaghetti carbonara")]
+    assert _names(index.search("paghe", 1, 10)) == [(1, "spaghetti carbonara")]
+    assert _names(index.search("psaghe", 2, 10)) == [(2, "spaghetti carbonara")]
+
+def test_exact_prefix_matches_come_first():
+    index = _index("Pancakes", "Pad Thai", "Pan Pizza")
+    assert _names(index.search("pan", 1, 10)) == [(0, "pan pizza"), (0, "pancakes"), (1, "pad thai")]
+    assert len(index.search("pan", 1, 2)) == 2
+
+# The index is built (or rebuilt) on use and follows the dishes created since
+def test_autocomplete_endpoint(client, monkeypatch):
+    monkeypatch.setattr(autocomplete, "seq", None)
+    hall_id = client.post("/api/v1/dining_halls", json={"name": "John Jay"}).get_json()["id"]
+    station_id = client.post(f"/api/v1/dining_halls/{hall_id}/stations", json={"name": "Pasta"}).get_json()["id"]
+    client.post("/api/v1/dishes", json={"name": "Spaghetti Carbonara", "dining_hall_id": hall_id, "station_id": station_id})
+
+    suggestions = client.get("/api/v1/dishes/autocomplete?q=Xpagh").get_json()
+    assert [(s["name"], s["distance"]) for s in suggestions] == [("Spaghetti Carbonara", 1)]
+    assert client.get(f"/api/v1/dishes/autocomplete?q=spag&dining_hall_id={hall_id + 1}").get_json() == []
+
+# Unless AUTOCOMPLETE_WARM is set, nothing is loaded or started until the first autocomplete request
+def test_index_is_built_on_first_use(app, client, monkeypatch):
+    monkeypatch.setattr(events, "_subscribers", list(events._subscribers))
+    index = Autocomplete()
+    monkeypatch.setattr(dish_routes, "autocomplete", index)
+    hall_id = client.post("/api/v1/dining_halls", json={"name": "John Jay"}).get_json()["id"]
+    station_id = client.post(f"/api/v1/dining_halls/{hall_id}/stations", json={"name": "Pasta"}).get_json()["id"]
+    client.post("/api/v1/dishes", json={"name": "Penne", "dining_hall_id": hall_id, "station_id": station_id})
+
+    monkeypatch.setattr(autocomplete_module, "autocomplete", index)
+    autocomplete_module.config_autocomplete(app)
+    assert index.seq is None and not index._started
+
+    assert [s["name"] for s in client.get("/api/v1/dishes/autocomplete?q=pen").get_json()] == ["Penne"]
+    assert index.seq is not None and index._started
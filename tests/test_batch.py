@@ -0,0 +1,46 @@
+import pytest
+import admission
+
+@pytest.fixture
+def rate_limit(monkeypatch):
+    monkeypatch.setattr(admission, "RATE_LIMIT_RPS", 0.001)
+    monkeypatch.setattr(admission, "RATE_LIMIT_BURST", 4)
+    monkeypatch.setattr(admission, "_buckets", {})
+
+def _batch(client, count, **options):
+    requests = [{"method": "GET", "path": "/api/v1/dining_halls"} for _ in range(count)]
+    response = client.post("/api/v1/batch", json={"requests": requests, **options})
+    assert response.status_code == 200
+    return [result["status"] for result in response.get_json()["responses"]]
+
+# The batch takes one token and every sub-request one more
+@pytest.mark.parametrize("parallel", [False, True])
+def test_sub_requests_are_rate_limited(client, rate_limit, parallel):
+    statuses = _batch(client, 5, parallel=parallel)
+    assert sorted(statuses) == [200, 200, 200, 429, 429]
+    assert client.get("/api/v1/dining_halls").status_code == 429
+
+def test_sub_requests_take_a_concurrency_slot(client, monkeypatch):
+    route = "dining_halls.get_dining_halls"
+    monkeypatch.setitem(admission.CONCURRENCY_LIMITS, route, 1)
+    monkeypatch.setitem(admission._in_flight, route, 1)
+    assert _batch(client, 2) == [503, 503]
+
+    monkeypatch.setitem(admission._in_flight, route, 0)
+    assert _batch(client, 2, parallel=True) in ([200, 200], [200, 503], [503, 200])
+    assert admission._in_flight[route] == 0
+
+# In a non-atomic batch, a write failing at flush doesn't make the requests after it fail
+def test_failed_write_does_not_fail_the_next_requests(client):
+    hall_id = client.post("/api/v1/dining_halls", json={"name": "John Jay"}).get_json()["id"]
+    station_id = client.post(f"/api/v1/dining_halls/{hall_id}/stations", json={"name": "Grill"}).get_json()["id"]
+    dish_id = client.post("/api/v1/dishes", json={"name": "Burger", "dining_hall_id": hall_id, "station_id": station_id}).get_json()["id"]
+
+    requests = [
+        {"method": "PUT", "path": f"/api/v1/dishes/{dish_id}", "body": {"name": None}},
+        {"method": "GET", "path": "/api/v1/dining_halls"},
+        {"method": "POST", "path": "/api/v1/dining_halls", "body": {"name": "Ferris"}},
+    ]
+    response = client.post("/api/v1/batch", json={"requests": requests})
+    assert [result["status"] for result in response.get_json()["responses"]] == [500, 200, 201]
+    assert [hall["name"] for hall in client.get("/api/v1/dining_halls").get_json()] == ["John Jay", "Ferris"]
@@ -0,0 +1,58 @@
+import pytest
+import events
+
+def _create_hall(client, name, stations, dishes_per_station):
+    hall_id = client.post("/api/v1/dining_halls", json={"name": name}).get_json()["id"]
+    station_ids, dish_ids = [], []
+    for station in range(stations):
+        station_id = client.post(f"/api/v1/dining_halls/{hall_id}/stations", json={"name": f"Station {station}"}).get_json()["id"]
+        station_ids.append(station_id)
+        for dish in range(dishes_per_station):
+            response = client.post("/api/v1/dishes", json={"name": f"Dish {dish}", "dining_hall_id": hall_id, "station_id": station_id})
+            assert response.status_code == 201
+            dish_ids.append(response.get_json()["id"])
+    return hall_id, station_ids, dish_ids
+
+# Changes dispatched to the subscribers while the test runs
+@pytest.fixture
+def changes():
+    dispatched = []
+    events._subscribers.append(dispatched.extend)
+    yield dispatched
+    events._subscribers.remove(dispatched.extend)
+
+# Per child table one INSERT ... SELECT of the tombstones, one DELETE and one SELECT reading the
+# tombstones back, whatever the number of stations and dishes (the rest loads the hall, allocates
+# the change sequence numbers and deletes the hall itself)
+@pytest.mark.parametrize("stations, dishes_per_station", [(1, 1), (3, 10)])
+def test_dining_hall_delete_statement_count(client, statements, stations, dishes_per_station):
+    hall_id, _, _ = _create_hall(client, "John Jay", stations, dishes_per_station)
+
+    statements.clear()
+    assert client.delete(f"/api/v1/dining_halls/{hall_id}").status_code == 200
+    assert sum(statement.startswith("DELETE") for statement in statements) == 3
+    assert len(statements) == 14
+
+@pytest.mark.parametrize("dishes", [1, 10])
+def test_station_delete_statement_count(client, statements, dishes):
+    hall_id, station_ids, _ = _create_hall(client, "John Jay", 1, dishes)
+
+    statements.clear()
+    assert client.delete(f"/api/v1/dining_halls/{hall_id}/stations/{station_ids[0]}").status_code == 200
+    assert sum(statement.startswith("DELETE") for statement in statements) == 2
+    assert len(statements) == 12
+
+def test_cascade_deletes_are_dispatched(client, changes):
+    hall_id, station_ids, dish_ids = _create_hall(client, "John Jay", 2, 2)
+
+    changes.clear()
+    assert client.delete(f"/api/v1/dining_halls/{hall_id}/stations/{station_ids[0]}").status_code == 200
+    deleted = {(change.entity, change.id) for change in changes if change.op == "delete"}
+    assert deleted == {("station", station_ids[0]), ("dish", dish_ids[0]), ("dish", dish_ids[1])}
+    assert all(events.affected_dining_halls(change) == {hall_id} for change in changes)
+
+    changes.clear()
+    assert client.delete(f"/api/v1/dining_halls/{hall_id}").status_code == 200
+    deleted = {(change.entity, change.id) for change in changes if change.op == "delete"}
+    assert deleted == {("dining_hall", hall_id), ("station", station_ids[1]), ("dish", dish_ids[2]), ("dish", dish_ids[3])}
+    assert [station["id"] for station in client.get("/api/v1/stations").get_json()] == []
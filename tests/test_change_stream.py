@@ -0,0 +1,48 @@
+import json
+from broker import _matches, _to_events, broker
+from changefeed import load_changes
+
+def _setup(client):
+    halls, stations = [], []
+    for name in ("John Jay", "Ferris"):
+        hall_id = client.post("/api/v1/dining_halls", json={"name": name}).get_json()["id"]
+        halls.append(hall_id)
+        stations.append(client.post(f"/api/v1/dining_halls/{hall_id}/stations", json={"name": "Grill"}).get_json()["id"])
+    dish_id = client.post("/api/v1/dishes", json={"name": "Burger", "dining_hall_id": halls[0], "station_id": stations[0]}).get_json()["id"]
+    return halls, stations, dish_id
+
+# (op, dish id) of the dish events a subscriber scoped to the dining hall receives after since
+def _dish_events(app, database, since, dining_hall_id):
+    with app.test_request_context():
+        items, _, _ = load_changes(database.session, since, 100, moves=True)
+        events = [event for event in _to_events(items) if _matches(event, dining_hall_id, None)]
+    changes = [json.loads(event.message.split("data: ", 1)[1]) for event in events]
+    return [(change["op"], change["id"]) for change in changes if change["entity"] == "dish"]
+
+def test_moved_dish_is_pushed_to_the_old_and_new_dining_hall(app, client, database):
+    halls, stations, dish_id = _setup(client)
+    since = client.get("/api/v1/changes").get_json()["next"]
+
+    response = client.put(f"/api/v1/dishes/{dish_id}", json={"dining_hall_id": halls[1], "station_id": stations[1]})
+    assert response.status_code == 200
+    assert _dish_events(app, database, int(since), halls[0]) == [("upsert", dish_id)]
+    assert _dish_events(app, database, int(since), halls[1]) == [("upsert", dish_id)]
+    assert _dish_events(app, database, int(since), None) == [("upsert", dish_id)]
+
+    # Changed again since: the old dining hall is told the dish left
+    client.put(f"/api/v1/dishes/{dish_id}", json={"name": "Cheeseburger"})
+    assert _dish_events(app, database, int(since), halls[0]) == [("delete", dish_id)]
+    assert _dish_events(app, database, int(since), halls[1]) == [("upsert", dish_id)]
+    assert _dish_events(app, database, int(since), None) == [("upsert", dish_id)]
+
+    # The moves are not part of the public change feed
+    ops = [change["op"] for change in client.get(f"/api/v1/changes?since={since}").get_json()["changes"]]
+    assert "move" not in ops
+
+def test_start_does_not_keep_a_connection(app, database, monkeypatch):
+    monkeypatch.setattr(broker, "last_id", None)
+    monkeypatch.setattr("threading.Thread.start", lambda thread: None)
+    with app.test_request_context():
+        broker.start(app)
+        assert broker.last_id == 0
+        assert not database.session().in_transaction()
@@ -0,0 +1,11 @@
+# A dish write reports the new dish counts of its station and dining hall in the change feed
+def test_dish_count_changes_are_in_the_change_feed(client):
+    hall_id = client.post("/api/v1/dining_halls", json={"name": "John Jay"}).get_json()["id"]
+    station_id = client.post(f"/api/v1/dining_halls/{hall_id}/stations", json={"name": "Grill"}).get_json()["id"]
+    since = client.get("/api/v1/changes").get_json()["next"]
+
+    client.post("/api/v1/dishes", json={"name": "Burger", "dining_hall_id": hall_id, "station_id": station_id})
+    changes = client.get(f"/api/v1/changes?since={since}").get_json()["changes"]
+    counts = {change["entity"]: change["data"]["dish_count"] for change in changes if change["entity"] != "dish"}
+    assert counts == {"dining_hall": 1, "station": 1}
+    assert len({change["change_seq"] for change in changes}) == 1
@@ -0,0 +1,48 @@
+from collections import OrderedDict
+import pytest
+import rows
+import statements as statement_cache
+
+@pytest.fixture(params=[True, False], ids=["rows", "orm"])
+def read_path(request, monkeypatch):
+    monkeypatch.setattr(rows, "ROW_FAST_PATH_ENABLED", request.param)
+    monkeypatch.setattr(statement_cache, "ROW_FAST_PATH_ENABLED", request.param)
+    monkeypatch.setattr(statement_cache.statements, "_statements", OrderedDict())
+
+@pytest.fixture
+def dish(client):
+    hall_id = client.post("/api/v1/dining_halls", json={"name": "John Jay"}).get_json()["id"]
+    station_id = client.post(f"/api/v1/dining_halls/{hall_id}/stations", json={"name": "Grill"}).get_json()["id"]
+    body = {"name": "Burger", "description": "With fries", "dining_hall_id": hall_id, "station_id": station_id}
+    return client.post("/api/v1/dishes", json=body).get_json()["id"]
+
+def _dish_selects(statements):
+    return [statement for statement in statements if statement.startswith("SELECT") and "FROM dishes" in statement]
+
+def test_field_subset(client, read_path, dish):
+    response = client.get("/api/v1/dishes?fields=name,id")
+    assert response.status_code == 200
+    (item,) = response.get_json()
+    assert set(item) == {"id", "name", "_links"}
+    assert item["name"] == "Burger" and item["_links"]["self"]["href"] == f"/api/v1/dishes/{dish}"
+
+    (item,) = client.get("/api/v1/dishes?fields=name&links=none").get_json()
+    assert item == {"name": "Burger"}
+
+def test_unknown_fields_are_rejected(client, read_path, dish):
+    response = client.get("/api/v1/dishes?fields=name,price,_links")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "Invalid fields: price, _links"
+    assert client.get("/api/v1/dishes?links=some").status_code == 400
+
+# The TEXT description is only read from the database when it is requested
+def test_description_stays_deferred(client, read_path, dish, statements):
+    client.get("/api/v1/dishes?fields=id,name")
+    (select,) = _dish_selects(statements)
+    assert "description" not in select.split("FROM")[0]
+
+    statements.clear()
+    (item,) = client.get("/api/v1/dishes?fields=id,description").get_json()
+    assert item["description"] == "With fries"
+    (select,) = _dish_selects(statements)
+    assert "description" in select.split("FROM")[0]
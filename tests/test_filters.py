@@ -0,0 +1,23 @@
+import pytest
+from catalog import Catalog
+import routes.dish_routes as dish_routes
+
+NAMES = ["100% Juice", "1005 Juice", "Mac_Cheese", "MacXCheese", "Back\\slash"]
+
+# Name filters match % and _ literally, from the database and from the catalog snapshot alike
+@pytest.mark.parametrize("snapshot", [False, True])
+def test_name_filter_wildcards_match_literally(client, monkeypatch, snapshot):
+    hall_id = client.post("/api/v1/dining_halls", json={"name": "John Jay"}).get_json()["id"]
+    station_id = client.post(f"/api/v1/dining_halls/{hall_id}/stations", json={"name": "Grill"}).get_json()["id"]
+    for name in NAMES:
+        client.post("/api/v1/dishes", json={"name": name, "dining_hall_id": hall_id, "station_id": station_id})
+    monkeypatch.setattr(dish_routes, "CATALOG_SNAPSHOT_ENABLED", snapshot)
+    monkeypatch.setattr(dish_routes, "catalog", Catalog())
+
+    def names(filter):
+        return [dish["name"] for dish in client.get("/api/v1/dishes", query_string={"name": filter}).get_json()]
+
+    assert names("100%") == ["100% Juice"]
+    assert names("c_c") == ["Mac_Cheese"]
+    assert names("k\\s") == ["Back\\slash"]
+    assert names("juice") == ["100% Juice", "1005 Juice"]
@@ -0,0 +1,60 @@
+import pytest
+from models import Dish, DiningHall, Station
+
+@pytest.fixture
+def catalog(database):
+    db = database
+    hall = DiningHall(name="John Jay")
+    station = Station(name="Grill", dining_hall=hall)
+    db.session.add_all([hall, station, Dish(name="Burger", description="A long description", dining_hall=hall, station=station)])
+    db.session.commit()
+    return hall.id
+
+# Data of a GraphQL query and the SELECT statements it ran
+def _query(client, statements, query):
+    statements.clear()
+    response = client.post("/api/v1/graphql", json={"query": query})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert "errors" not in body, body
+    return body["data"], [statement for statement in statements if statement.lstrip().startswith("SELECT")]
+
+# Columns of the table in the SELECT list of a statement
+def _selected_columns(statement, table):
+    columns = statement.split("FROM", 1)[0][len("SELECT "):].split(",")
+    return {column.split(" AS ")[0].strip().split(".", 1)[1] for column in columns if column.strip().startswith(f"{table}.")}
+
+def test_only_selected_columns_are_loaded(client, statements, catalog):
+    data, selects = _query(client, statements, "{ allDishes { name } }")
+    assert data == {"allDishes": [{"name": "Burger"}]}
+    assert len(selects) == 1
+    assert _selected_columns(selects[0], "dishes") == {"id", "name"}
+
+def test_description_is_loaded_when_selected(client, statements, catalog):
+    data, selects = _query(client, statements, "{ allDishes { name description } }")
+    assert data == {"allDishes": [{"name": "Burger", "description": "A long description"}]}
+    assert len(selects) == 1
+    assert _selected_columns(selects[0], "dishes") == {"id", "name", "description"}
+
+def test_to_one_relationship_is_joined(client, statements, catalog):
+    data, selects = _query(client, statements, "{ allDishes { name station { name } } }")
+    assert data == {"allDishes": [{"name": "Burger", "station": {"name": "Grill"}}]}
+    assert len(selects) == 1
+    assert "JOIN stations" in selects[0]
+    assert _selected_columns(selects[0], "dishes") == {"id", "name", "station_id"}
+    assert "description" not in selects[0]
+
+def test_collections_are_loaded_with_one_select_per_level(client, statements, catalog):
+    query = "{ allDiningHalls { name stations { name dishes { name } } } }"
+    data, selects = _query(client, statements, query)
+    assert data == {"allDiningHalls": [{"name": "John Jay", "stations": [{"name": "Grill", "dishes": [{"name": "Burger"}]}]}]}
+    assert len(selects) == 3
+    assert _selected_columns(selects[0], "dining_halls") == {"id", "name"}
+    assert _selected_columns(selects[1], "stations") == {"id", "name", "dining_hall_id"}
+    assert _selected_columns(selects[2], "dishes") == {"id", "name", "station_id"}
+
+def test_fragments_are_expanded(client, statements, catalog):
+    query = "{ allDishes { ...names } } fragment names on DishType { name }"
+    data, selects = _query(client, statements, query)
+    assert data == {"allDishes": [{"name": "Burger"}]}
+    assert _selected_columns(selects[0], "dishes") == {"id", "name"}
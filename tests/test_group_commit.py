@@ -0,0 +1,122 @@
+import threading
+import pytest
+from sqlalchemy import event, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError, OperationalError
+import groupcommit
+from groupcommit import GroupCommitter, _Unit
+from models import DiningHall, Station
+from referencedata import commit_validated
+
+@pytest.fixture
+def group_commit(monkeypatch):
+    monkeypatch.setattr(groupcommit, "GROUP_COMMIT_ENABLED", True)
+    # Long enough for every concurrent request of a test to join the same group
+    monkeypatch.setattr(groupcommit, "GROUP_COMMIT_WINDOW", 0.5)
+
+# Transactions committed by the group committer's thread
+@pytest.fixture
+def group_commits():
+    commits = []
+
+    def count(connection):
+        if threading.current_thread().name == "group-committer":
+            commits.append(connection)
+
+    event.listen(Engine, "commit", count)
+    yield commits
+    event.remove(Engine, "commit", count)
+
+def _post_concurrently(app, path, bodies):
+    statuses = [None] * len(bodies)
+
+    # With TESTING set, an error raised by the view reaches the client instead of a 500
+    def post(i):
+        try:
+            statuses[i] = app.test_client().post(path, json=bodies[i]).status_code
+        except Exception:
+            statuses[i] = 500
+
+    threads = [threading.Thread(target=post, args=(i,)) for i in range(len(bodies))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+def _station_names(database):
+    return sorted(database.session.scalars(select(Station.name)))
+
+def test_concurrent_writes_share_one_commit(app, client, database, group_commit, group_commits):
+    hall_id = client.post("/api/v1/dining_halls", json={"name": "John Jay"}).get_json()["id"]
+    statuses = _post_concurrently(app, f"/api/v1/dining_halls/{hall_id}/stations", [{"name": f"Station {i}"} for i in range(4)])
+    assert statuses == [201] * 4
+    assert len(group_commits) == 1
+    assert _station_names(database) == [f"Station {i}" for i in range(4)]
+
+# A member failing at flush only rolls back its own savepoint, the rest of the group commits
+def test_failing_member_rolls_back_alone(app, client, database, group_commit, group_commits):
+    hall_id = client.post("/api/v1/dining_halls", json={"name": "John Jay"}).get_json()["id"]
+    statuses = _post_concurrently(app, f"/api/v1/dining_halls/{hall_id}/stations", [{"name": "Grill"}, {"name": None}, {"name": "Pasta"}])
+    assert statuses == [201, 500, 201]
+    assert len(group_commits) == 1
+    assert _station_names(database) == ["Grill", "Pasta"]
+
+def _hall_unit(name, still_valid):
+    def run():
+        from models import db
+        db.session.add(DiningHall(name=name))
+        return commit_validated(still_valid)
+    return _Unit(run)
+
+# A unit that writes nothing and counts its runs: with SQLite, the writes of a savepoint released
+# before the COMMIT fails are already durable, so the retry is checked on the runs and responses
+def _counting_unit(runs, name):
+    def run():
+        runs.append(name)
+        return name
+    return _Unit(run)
+
+@pytest.fixture
+def failing_commits(database, monkeypatch):
+    real_commit = database.session.commit
+    failures = []
+
+    def commit():
+        if failures:
+            failures.pop()
+            raise OperationalError("COMMIT", {}, Exception("connection lost"))
+        real_commit()
+
+    monkeypatch.setattr(database.session, "commit", commit)
+    return failures
+
+def _hall_names(database):
+    return sorted(database.session.scalars(select(DiningHall.name)))
+
+# When the group's COMMIT fails, its members are run again, one transaction each
+def test_failed_commit_is_retried_one_by_one(database, failing_commits):
+    failing_commits.append(True)
+    runs = []
+    units = [_counting_unit(runs, "a"), _counting_unit(runs, "b")]
+    GroupCommitter()._commit(units)
+    assert runs == ["a", "b", "a", "b"]
+    assert [(unit.response, unit.error) for unit in units] == [("a", None), ("b", None)]
+
+# ... and every member whose own commit fails too gets the error
+def test_failed_commit_is_reported_to_every_member(database, failing_commits):
+    failing_commits.extend([True] * 3)
+    units = [_counting_unit([], "a"), _counting_unit([], "b")]
+    GroupCommitter()._commit(units)
+    assert all(isinstance(unit.error, OperationalError) and unit.response is None for unit in units)
+
+# A write rejected by the database because the cached ids were stale answers like outside a group
+def test_stale_reference_in_a_group_is_rejected(database):
+    units = [_hall_unit("John Jay", lambda: True), _hall_unit(None, lambda: False), _hall_unit("Ferris", lambda: True)]
+    GroupCommitter()._commit(units)
+    assert [unit.response for unit in units] == [True, False, True]
+    assert _hall_names(database) == ["Ferris", "John Jay"]
+
+    units = [_hall_unit(None, lambda: True)]
+    GroupCommitter()._commit(units)
+    assert isinstance(units[0].error, IntegrityError)
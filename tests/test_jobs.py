@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+from models import Job
+import jobs
+
+# A job left queued or running by a stopped worker is marked failed, the jobs of this worker are kept alive
+def test_interrupted_jobs_are_marked_failed(database, monkeypatch):
+    long_ago = datetime.utcnow() - timedelta(hours=1)
+    lost = Job(kind="import_dishes", status="running", created_at=long_ago, heartbeat_at=long_ago)
+    queued = Job(kind="import_dishes", status="queued", created_at=long_ago)
+    active = Job(kind="import_dishes", status="running", created_at=long_ago, heartbeat_at=long_ago)
+    finished = Job(kind="import_dishes", status="succeeded", created_at=long_ago, heartbeat_at=long_ago)
+    database.session.add_all([lost, queued, active, finished])
+    database.session.commit()
+    monkeypatch.setattr(jobs, "_active", {active.id})
+
+    assert jobs.recover_jobs() == 2
+    database.session.expire_all()
+    assert [lost.status, queued.status, active.status, finished.status] == ["failed", "failed", "running", "succeeded"]
+    assert lost.finished_at is not None and lost.error
+    assert active.heartbeat_at > long_ago
+
+# Queued jobs are cancelled right away, running ones asked to stop, finished ones keep their outcome
+def test_cancel_only_changes_unfinished_jobs(database):
+    queued = Job(kind="import_dishes", status="queued")
+    running = Job(kind="import_dishes", status="running")
+    finished = Job(kind="import_dishes", status="succeeded")
+    database.session.add_all([queued, running, finished])
+    database.session.commit()
+
+    assert [jobs.cancel(job) for job in (queued, running, finished)] == [True, True, False]
+    assert [queued.status, running.status, finished.status] == ["cancelled", "running", "succeeded"]
+    assert [queued.cancel_requested, running.cancel_requested, finished.cancel_requested] == [True, True, False]
+    assert queued.finished_at is not None and running.finished_at is None
+
+# A job finishing after it was loaded is not cancelled
+def test_cancel_a_job_finished_meanwhile(client, database):
+    job = Job(kind="import_dishes", status="running")
+    database.session.add(job)
+    database.session.commit()
+    id = job.id
+    with database.engine.begin() as connection:
+        connection.execute(Job.__table__.update().where(Job.__table__.c.id == id).values(status="succeeded"))
+    assert job.status == "running"
+
+    assert jobs.cancel(job) is False
+    assert job.status == "succeeded" and not job.cancel_requested
+    assert client.delete(f"/api/v1/jobs/{id}").status_code == 409
@@ -0,0 +1,53 @@
+import pytest
+from catalog import Catalog
+import multiget
+import routes.dish_routes as dish_routes
+
+@pytest.fixture
+def dish_ids(client):
+    hall_id = client.post("/api/v1/dining_halls", json={"name": "John Jay"}).get_json()["id"]
+    station_id = client.post(f"/api/v1/dining_halls/{hall_id}/stations", json={"name": "Grill"}).get_json()["id"]
+    return [
+        client.post("/api/v1/dishes", json={"name": name, "dining_hall_id": hall_id, "station_id": station_id}).get_json()["id"]
+        for name in ("Burger", "Fries", "Salad")
+    ]
+
+# From the database and from the catalog snapshot alike
+@pytest.fixture(params=[False, True], ids=["database", "snapshot"])
+def source(request, monkeypatch):
+    monkeypatch.setattr(dish_routes, "CATALOG_SNAPSHOT_ENABLED", request.param)
+    monkeypatch.setattr(dish_routes, "catalog", Catalog())
+
+def _get(client, ids):
+    response = client.get(f"/api/v1/dishes?ids={ids}&fields=id,name&links=none")
+    assert response.status_code == 200
+    return response.get_json()
+
+def test_order_missing_and_duplicate_ids(client, source, dish_ids):
+    burger, fries, salad = dish_ids
+    result = _get(client, f"{salad},{burger},999,{fries},{salad}")
+    assert result["data"] == [{"id": salad, "name": "Salad"}, {"id": burger, "name": "Burger"}, {"id": fries, "name": "Fries"}]
+    assert result["missing"] == [999]
+
+    assert _get(client, "998,999") == {"data": [], "missing": [998, 999]}
+
+# One IN query per MULTI_GET_CHUNK_SIZE ids
+def test_ids_are_fetched_in_chunks(client, dish_ids, statements, monkeypatch):
+    monkeypatch.setattr(multiget, "MULTI_GET_CHUNK_SIZE", 2)
+    result = _get(client, ",".join(map(str, reversed(dish_ids))))
+    assert [dish["id"] for dish in result["data"]] == list(reversed(dish_ids))
+    assert len([statement for statement in statements if statement.startswith("SELECT") and "FROM dishes" in statement]) == 2
+
+def test_limit_on_the_number_of_ids(client, dish_ids, monkeypatch):
+    monkeypatch.setattr(multiget, "MULTI_GET_MAX_IDS", 2)
+    response = client.get("/api/v1/dishes?ids=1,2,3")
+    assert response.status_code == 400
+    assert response.get_json()["error"] == "At most 2 ids can be requested at once"
+    # Duplicates don't count against the limit
+    assert client.get("/api/v1/dishes?ids=1,2,1,2").status_code == 200
+
+@pytest.mark.parametrize("ids", ["a,b", "1,,x", "1.5", ",", ""])
+def test_bad_ids_are_rejected(client, ids):
+    response = client.get(f"/api/v1/dishes?ids={ids}")
+    assert response.status_code == 400
+    assert "ids must" in response.get_json()["error"]
@@ -0,0 +1,40 @@
+import pytest
+
+msgpack = pytest.importorskip("msgpack")
+cbor2 = pytest.importorskip("cbor2")
+
+DECODERS = {"application/msgpack": msgpack.unpackb, "application/cbor": cbor2.loads}
+
+@pytest.fixture
+def hall_id(client):
+    hall_id = client.post("/api/v1/dining_halls", json={"name": "John Jay"}).get_json()["id"]
+    station_id = client.post(f"/api/v1/dining_halls/{hall_id}/stations", json={"name": "Grill"}).get_json()["id"]
+    client.post("/api/v1/dishes", json={"name": "Burger", "description": "With fries", "dining_hall_id": hall_id, "station_id": station_id})
+    return hall_id
+
+# The binary formats carry the same document as the JSON response
+@pytest.mark.parametrize("mimetype", list(DECODERS))
+@pytest.mark.parametrize("path", ["/api/v1/dishes", "/api/v1/dishes/{dish}", "/api/v1/dining_halls/{hall}/menu", "/api/v1/dining_halls/menu"])
+def test_binary_round_trip(client, hall_id, mimetype, path):
+    dish_id = client.get("/api/v1/dishes").get_json()[0]["id"]
+    path = path.format(dish=dish_id, hall=hall_id)
+    response = client.get(path, headers={"Accept": mimetype})
+    assert response.status_code == 200
+    assert response.mimetype == mimetype
+    assert "Accept" in response.vary
+    assert DECODERS[mimetype](response.get_data()) == client.get(path).get_json()
+
+@pytest.mark.parametrize("accept", [None, "*/*", "application/json", "text/html,application/xhtml+xml,*/*;q=0.8", "application/msgpack;q=0.5,application/json"])
+def test_json_is_the_default(client, hall_id, accept):
+    headers = {"Accept": accept} if accept else {}
+    response = client.get("/api/v1/dishes", headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == "application/json"
+    assert "Accept" in response.vary
+
+@pytest.mark.parametrize("path", ["/api/v1/dishes", "/api/v1/dining_halls/{hall}/menu"])
+def test_unsupported_types_are_not_acceptable(client, hall_id, path):
+    response = client.get(path.format(hall=hall_id), headers={"Accept": "application/xml, text/csv"})
+    assert response.status_code == 406
+    assert response.get_json()["error"].startswith("Supported response formats: application/json")
+    assert "Accept" in response.vary
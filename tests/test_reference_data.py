@@ -0,0 +1,24 @@
+def test_create_hall_station_and_dish(client):
+    response = client.post("/api/v1/dining_halls", json={"name": "John Jay"})
+    assert response.status_code == 201
+    hall_id = response.get_json()["id"]
+
+    response = client.post(f"/api/v1/dining_halls/{hall_id}/stations", json={"name": "Grill"})
+    assert response.status_code == 201
+    station_id = response.get_json()["id"]
+
+    response = client.post("/api/v1/dishes", json={"name": "Burger", "dining_hall_id": hall_id, "station_id": station_id})
+    assert response.status_code == 201
+
+    response = client.get(f"/api/v1/dining_halls/{hall_id}/menu")
+    assert response.status_code == 200
+    assert [dish["name"] for station in response.get_json()["stations"] for dish in station["dishes"]] == ["Burger"]
+
+def test_unknown_ids_are_rejected(client):
+    hall_id = client.post("/api/v1/dining_halls", json={"name": "John Jay"}).get_json()["id"]
+    station_id = client.post(f"/api/v1/dining_halls/{hall_id}/stations", json={"name": "Grill"}).get_json()["id"]
+
+    assert client.post("/api/v1/dining_halls/999/stations", json={"name": "Grill"}).status_code == 404
+    assert client.post("/api/v1/dishes", json={"name": "Burger", "dining_hall_id": hall_id, "station_id": 999}).status_code in (400, 404)
+    assert client.delete(f"/api/v1/dining_halls/{hall_id}/stations/{station_id}").status_code == 200
+    assert client.post("/api/v1/dishes", json={"name": "Burger", "dining_hall_id": hall_id, "station_id": station_id}).status_code in (400, 404)
@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# The sharding layer is configured when the app is imported, so the sharded tests run in their own
+# process, with the global database and two shards as local SQLite files
+def test_sharded_catalog(tmp_path):
+    env = dict(
+        os.environ,
+        DATABASE_URI=f"sqlite:///{tmp_path / 'global.db'}",
+        SHARD_URIS=f"a=sqlite:///{tmp_path / 'shard_a.db'},b=sqlite:///{tmp_path / 'shard_b.db'}",
+    )
+    result = subprocess.run(
+        [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", "--rootdir", os.path.dirname(TESTS_DIR), os.path.join(TESTS_DIR, "sharded")],
+        env=env, capture_output=True, text=True,
+    )
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,38 @@
+import pytest
+import singleflight
+
+# Register a finished in-flight call for a request, as a leader would have left it for its followers
+def _in_flight(app, path, result=None, error=None):
+    with app.test_request_context(path):
+        key = singleflight._request_key()
+    call = singleflight._Call()
+    call.result, call.error = result, error
+    call.done.set()
+    singleflight._calls[key] = call
+    return key
+
+@pytest.fixture(autouse=True)
+def clear_calls():
+    yield
+    singleflight._calls.clear()
+
+def test_followers_get_a_fresh_response(app, client):
+    headers = [("Content-Type", "application/json"), ("Vary", "Accept"), ("X-Profile-Id", "leader"), ("traceresponse", "00-leader")]
+    _in_flight(app, "/api/v1/dining_halls", result=(b"[]", 200, headers))
+
+    response = client.get("/api/v1/dining_halls")
+    assert response.get_data() == b"[]"
+    assert response.mimetype == "application/json"
+    assert response.headers["Vary"] == "Accept"
+    assert "X-Profile-Id" not in response.headers
+    assert "traceresponse" not in response.headers
+
+def test_followers_raise_their_own_exception(app, client):
+    error = LookupError("database unavailable")
+    _in_flight(app, "/api/v1/dining_halls", error=error)
+
+    with pytest.raises(LookupError) as raised:
+        client.get("/api/v1/dining_halls")
+    assert raised.value is not error
+    assert raised.value.args == error.args
+    assert raised.value.__cause__ is error
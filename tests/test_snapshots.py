@@ -0,0 +1,110 @@
+import gzip
+import json
+import os
+import time
+import pytest
+import events
+import snapshots
+import routes.snapshot_routes as snapshot_routes
+
+@pytest.fixture
+def snapshot_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_DIR", str(tmp_path))
+    monkeypatch.setattr(snapshot_routes, "SNAPSHOT_ENABLED", True)
+    monkeypatch.setattr(snapshots, "_etags", {})
+    return tmp_path
+
+@pytest.fixture
+def hall_id(client):
+    hall_id = client.post("/api/v1/dining_halls", json={"name": "John Jay"}).get_json()["id"]
+    station_id = client.post(f"/api/v1/dining_halls/{hall_id}/stations", json={"name": "Grill"}).get_json()["id"]
+    client.post("/api/v1/dishes", json={"name": "Burger", "dining_hall_id": hall_id, "station_id": station_id})
+    return hall_id
+
+def _dish_names(menu):
+    return sorted(dish["name"] for station in menu["stations"] for dish in station["dishes"])
+
+def test_snapshots_match_the_live_menus(app, client, snapshot_dir, hall_id):
+    snapshots.publish_snapshots(app)
+    response = client.get(f"/menus/{hall_id}.json")
+    assert response.status_code == 200
+    assert response.get_json() == client.get(f"/api/v1/dining_halls/{hall_id}/menu").get_json()
+    assert client.get("/menus/all.json").get_json() == client.get("/api/v1/dining_halls/menu").get_json()
+    assert client.get("/menus/999.json").status_code == 404
+
+def test_disabled_snapshots_are_not_found(client, monkeypatch):
+    monkeypatch.setattr(snapshot_routes, "SNAPSHOT_ENABLED", False)
+    assert client.get("/menus/all.json").status_code == 404
+
+# The ETag is a hash of the file, the same for every request and worker until the content changes
+def test_strong_etag_and_not_modified(app, client, snapshot_dir, hall_id):
+    snapshots.publish_snapshots(app)
+    response = client.get(f"/menus/{hall_id}.json")
+    etag, weak = response.get_etag()
+    assert etag and not weak
+    assert response.headers["Cache-Control"] == f"public, max-age={snapshots.SNAPSHOT_MAX_AGE}"
+
+    snapshots._etags.clear()
+    assert client.get(f"/menus/{hall_id}.json").get_etag() == (etag, False)
+
+    response = client.get(f"/menus/{hall_id}.json", headers={"If-None-Match": f'"{etag}"'})
+    assert response.status_code == 304
+    assert response.data == b""
+    assert client.get(f"/menus/{hall_id}.json", headers={"If-None-Match": '"other"'}).status_code == 200
+
+    # Republishing an unchanged menu leaves the file (and the ETag) alone
+    mtime = os.stat(snapshots.snapshot_path(str(hall_id))).st_mtime_ns
+    snapshots.publish_snapshots(app)
+    assert os.stat(snapshots.snapshot_path(str(hall_id))).st_mtime_ns == mtime
+    assert client.get(f"/menus/{hall_id}.json", headers={"If-None-Match": f'"{etag}"'}).status_code == 304
+
+def test_gzip_variant(app, client, snapshot_dir, hall_id):
+    snapshots.publish_snapshots(app)
+    plain = client.get("/menus/all.json")
+    assert "Content-Encoding" not in plain.headers
+    assert "Accept-Encoding" in plain.headers["Vary"]
+
+    encoded = client.get("/menus/all.json", headers={"Accept-Encoding": "gzip"})
+    assert encoded.status_code == 200
+    assert encoded.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in encoded.headers["Vary"]
+    assert encoded.content_length == len(encoded.data)
+    assert gzip.decompress(encoded.data) == plain.data
+    # Each variant has an ETag of its own
+    assert encoded.get_etag() != plain.get_etag()
+
+    # Without the .gz file the plain one is served
+    os.remove(snapshots.snapshot_path(snapshots.ALL_MENUS) + ".gz")
+    response = client.get("/menus/all.json", headers={"Accept-Encoding": "gzip"})
+    assert "Content-Encoding" not in response.headers
+    assert response.data == plain.data
+
+# A write of this worker republishes the menus it touched without waiting for SNAPSHOT_INTERVAL
+def test_write_republishes(app, client, snapshot_dir, hall_id, monkeypatch):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_INTERVAL", 3600)
+    monkeypatch.setattr(events, "_subscribers", list(events._subscribers))
+    publisher = snapshots.SnapshotPublisher()
+    publisher.start(app)
+
+    path = snapshots.snapshot_path(str(hall_id))
+    def wait_for(predicate):
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            try:
+                with open(path, "rb") as file:
+                    menu = json.load(file)
+                if predicate(menu):
+                    return menu
+            except (FileNotFoundError, ValueError):
+                pass
+            time.sleep(0.02)
+        pytest.fail("The menu snapshot was not republished")
+
+    wait_for(lambda menu: _dish_names(menu) == ["Burger"])
+    etag = client.get(f"/menus/{hall_id}.json").get_etag()
+
+    station_id = client.get(f"/api/v1/dining_halls/{hall_id}/stations").get_json()[0]["id"]
+    client.post("/api/v1/dishes", json={"name": "Fries", "dining_hall_id": hall_id, "station_id": station_id})
+    wait_for(lambda menu: _dish_names(menu) == ["Burger", "Fries"])
+    assert client.get(f"/menus/{hall_id}.json").get_etag() != etag
+    assert client.get(f"/menus/{hall_id}.json", headers={"If-None-Match": f'"{etag[0]}"'}).status_code == 200